@@ -1,9 +1,16 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import pandas as pd
+from flask import Response, stream_template, send_file, g
+from flask import before_render_template, template_rendered
 import os
 import json
+import secrets
+import tempfile
+import time
 import functools
+from urllib.parse import urlencode, urlsplit
 from env_cred import app_secret_key  # Import from env_cred.py
+from pagination import DEFAULT_PAGE_SIZE, page_size
+from facet_index import selected_facets, facet_panel
 
 app = Flask(__name__)
 app.secret_key = app_secret_key  # Use environment variable instead of hardcoded value
@@ -14,6 +21,51 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Correct password - Consider moving this to environment variables as well
 CORRECT_PASSWORD = "engineerPWD"
 
+# Per-phase request timings for the Server-Timing header and /metrics
+# (see request_metrics); registered first so they finish last
+@app.before_request
+def begin_request_timing():
+    import request_metrics
+    request_metrics.begin_request()
+
+@app.after_request
+def finish_request_timing(response):
+    import request_metrics
+    header = request_metrics.finish_request(request.endpoint, response.status_code)
+    if header:
+        response.headers['Server-Timing'] = header
+    return response
+
+def _render_started(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+def _render_finished(sender, template, context, **extra):
+    from request_metrics import add_time
+    started = g.pop('render_started', None)
+    if started is not None:
+        add_time('render', time.perf_counter() - started)
+
+before_render_template.connect(_render_started, app)
+template_rendered.connect(_render_finished, app)
+
+# Read/write routing: a session that just wrote keeps reading from the
+# primary for a few seconds (see db_router), carried over in its cookie
+@app.before_request
+def begin_db_routing():
+    import db_router
+    db_router.begin_request(session.get('db_primary_until'))
+
+@app.after_request
+def finish_db_routing(response):
+    import db_router
+    until = db_router.primary_until()
+    if until > session.get('db_primary_until', 0) and until != float('inf'):
+        session['db_primary_until'] = until
+    routes = db_router.request_routes()
+    if routes:
+        response.headers['X-DB-Route'] = ', '.join(dict.fromkeys(routes))
+    return response
+
 # Login required decorator
 def login_required(func):
     @functools.wraps(func)
@@ -23,18 +75,42 @@ def login_required(func):
         return func(*args, **kwargs)
     return secure_function
 
-# Load data from AWS SQL db
-def load_inventory_data(search_query='', type_filter=''):
-    from db_equipment_inventory import search_products
-    
-    # Use the search_products function to get data from the database
-    df = search_products(search_term=search_query, category=type_filter)
-    
-    # If DataFrame is empty, return empty DataFrame with correct columns
-    if df.empty:
-        return pd.DataFrame(columns=['Code', 'Description', 'Price', 'Type'])
+# Load one page of data from the in-memory inventory snapshot (refreshed from AWS SQL db)
+def load_inventory_data(search_query='', type_filter='', cursor=None, limit=DEFAULT_PAGE_SIZE,
+                        facets=None):
+    from inventory_cache import search_products_page
     
-    return df
+    # Use the search_products_page function to get a page of matching rows
+    return search_products_page(search_term=search_query, category=type_filter,
+                                cursor=cursor, limit=limit, facets=facets)
+
+# Category dropdown entries with live counts, keeping the current choice listed
+def category_options(counts, type_filter):
+    options = list(counts.get('Category', []))
+    if type_filter and type_filter not in dict(options):
+        options.append((type_filter, 0))
+    return options
+
+# Link to another page of the current listing, keeping every other query arg
+@app.template_global()
+def page_url(cursor):
+    args = [(key, value) for key, value in request.args.items(multi=True) if key != 'cursor']
+    args.append(('cursor', cursor))
+    return f"{url_for(request.endpoint, **request.view_args)}?{urlencode(args)}"
+
+# Jinja yields many tiny strings; batch them so each write to the socket is worthwhile
+def buffered_chunks(chunks, size=16384):
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -60,27 +136,115 @@ def logout():
 def home():
     search_query = request.args.get('search', '').lower()
     type_filter = request.args.get('type', '')
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit'))
+    facets = selected_facets(request.args, include_category=False)
     
-    # Load data from database with search parameters
-    df = load_inventory_data(search_query, type_filter)
-    
-    # Get unique types for dropdown
-    unique_types = sorted(df['Type'].unique()) if not df.empty else []
+    # Live counts for the type dropdown and the facet filters
+    from inventory_cache import get_facet_counts
+    counts = get_facet_counts(search_query, type_filter, facets)
     
-    # If there's a search or filter, we already have filtered results
-    if search_query or type_filter:
-        results = df
-        # Add image URLs using S3
-        from s3_utils import get_product_image_url
-        df['ImageUrl'] = df['Code'].apply(lambda x: get_product_image_url(str(x)))        
+    # If there's a search or filter, load one page of filtered results
+    page = None
+    image_urls = {}
+    if search_query or type_filter or facets:
+        page = load_inventory_data(search_query, type_filter, cursor, limit, facets)
+        results = page.items
+        # Look up image URLs for the page (one batched, cached lookup); the
+        # records are shared with the snapshot, so URLs are passed alongside
+        from s3_utils import get_product_image_urls
+        if results:
+            image_urls = get_product_image_urls(item.Code for item in results)
     else:
         # If no search or filter, show empty results
-        results = pd.DataFrame()
+        results = []
         
     return render_template('index.html', 
-                         results=results.to_dict('records'), 
-                         types=unique_types,
-                         selected_type=type_filter)
+                         results=results, 
+                         image_urls=image_urls,
+                         types=category_options(counts, type_filter),
+                         facet_panel=facet_panel(counts, facets),
+                         selected_type=type_filter,
+                         page=page,
+                         limit=limit)
+
+# Columns of each row returned by /api/search, in order
+SEARCH_API_COLUMNS = ['Code', 'Description', 'Price', 'Type', 'ImageUrl']
+
+def search_etag():
+    """
+    Weak ETag for search responses: the inventory contents plus, when the
+    image manifest is loaded, the set of image keys. None if unavailable.
+    """
+    from inventory_cache import inventory_etag
+    from image_manifest import get_manifest
+    etag = inventory_etag()
+    if etag is None:
+        return None
+    manifest = get_manifest()
+    if manifest is not None and manifest.ready:
+        etag += f"-img-{manifest.fingerprint}"
+    return etag
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def api_search():
+    """
+    One page of search results as compact JSON rows, for as-you-type search.
+
+    Query args match the home page (search, type, facet filters, cursor,
+    limit); the response also carries live facet counts. Responses
+    carry a weak ETag, so an unchanged inventory answers If-None-Match with
+    an empty 304.
+    """
+    search_query = request.args.get('search', '').lower()
+    type_filter = request.args.get('type', '')
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit'))
+    facets = selected_facets(request.args, include_category=False)
+
+    etag = search_etag()
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        rows = []
+        next_cursor = prev_cursor = None
+        if search_query or type_filter or facets:
+            page = load_inventory_data(search_query, type_filter, cursor, limit, facets)
+            next_cursor, prev_cursor = page.next_cursor, page.prev_cursor
+            image_urls = {}
+            if page.items:
+                from s3_utils import get_product_image_urls
+                image_urls = get_product_image_urls(item.Code for item in page.items)
+            rows = [[item.Code, item.Description, item.Price, item.Type,
+                     image_urls.get(str(item.Code))] for item in page.items]
+        from inventory_cache import get_facet_counts
+        counts = get_facet_counts(search_query, type_filter, facets)
+        response = jsonify(columns=SEARCH_API_COLUMNS, rows=rows,
+                           next=next_cursor, prev=prev_cursor,
+                           types=category_options(counts, type_filter),
+                           facets=facet_panel(counts, facets))
+
+    if etag:
+        response.set_etag(etag, weak=True)
+    # Per-user (behind login) and always revalidated, which the ETag makes cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+@app.route('/api/suggest', methods=['GET'])
+@login_required
+def api_suggest():
+    """Prefix completions for the search box, most common values first."""
+    from inventory_cache import suggest
+    from suggest_index import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+    prefix = request.args.get('q', '')
+    limit = page_size(request.args.get('limit'), DEFAULT_SUGGESTIONS)
+    suggestions = suggest(prefix, min(limit, MAX_SUGGESTIONS))
+    response = jsonify(suggestions=[{'field': column, 'value': value, 'count': count}
+                                    for column, value, count in suggestions])
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
 
 @app.route('/enquiry', methods=['POST'])
 @login_required
@@ -96,50 +260,18 @@ def enquiry():
         print("No items selected")
         return redirect(url_for('home'))
     
-    # Convert selected_items from strings to integers
-    selected_items_int = []
-    try:
-        selected_items_int = [int(item) for item in selected_items]
-        print("Selected items (converted to int):", selected_items_int)
-    except ValueError as e:
-        print(f"Error converting to integers: {e}")
-        # If conversion fails, use the original strings
-        selected_items_int = selected_items
-    
-    # Load the inventory data to get details of selected items
-    df = load_inventory_data()
-    
-    # Debug the dataframe
-    print("DataFrame columns:", df.columns)
-    print("DataFrame dtypes:", df.dtypes)
-    print("First few rows:", df.head())
-    
-    # Filter the dataframe to get only selected items
-    # Try both string and integer comparison
-    try:
-        # Try with integers first
-        selected_df = df[df['Code'].isin(selected_items_int)]
-        print("Selected DataFrame using integers:", selected_df)
-        
-        # If no results, try with strings
-        if selected_df.empty:
-            print("No results with integer comparison, trying string comparison")
-            # Convert 'Code' column to string type
-            df['Code'] = df['Code'].astype(str)
-            selected_df = df[df['Code'].isin(selected_items)]
-            print("Selected DataFrame using strings:", selected_df)
-    except Exception as e:
-        print(f"Error filtering DataFrame: {e}")
-        selected_df = pd.DataFrame(columns=df.columns)
+    # Look up only the selected items (codes are normalised once, in the data layer)
+    from inventory_cache import get_items_by_codes
+    selected = get_items_by_codes(selected_items)
     
     # Create a text representation for the message field
     selected_items_text = "I would like to enquire about the following items:\n\n"
     
-    if not selected_df.empty:
-        for index, item in selected_df.iterrows():
-            selected_items_text += f"- {item['Code']}: {item['Description']} ({item['Type']})\n"
+    if selected:
+        for item in selected:
+            selected_items_text += f"- {item.Code}: {item.Description} ({item.Type})\n"
     else:
-        # Fallback if no matching items found in the DataFrame
+        # Fallback if no matching items found in the inventory
         selected_items_text += "Items selected but details not found in inventory.\n"
         selected_items_text += f"Selected IDs: {', '.join(selected_items)}\n"
     
@@ -161,17 +293,29 @@ def submit_enquiry():
 @login_required
 def all_products():
     """Display all products with edit functionality"""
-    # Load all products from the database
+    # ?all=1 streams every row straight from an unbuffered cursor into the
+    # template, so the first bytes go out before the query has finished
+    if request.args.get('all'):
+        from db_equipment_inventory import iter_all_products
+        return Response(buffered_chunks(stream_template('all_products.html',
+                                                        products=iter_all_products(),
+                                                        page=None, streaming=True)),
+                        mimetype='text/html')
+    
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit'))
+    
+    # Load one page of products from the inventory snapshot
     try:
-        from db_equipment_inventory import get_all_products
-        products = get_all_products()
-        print(len(products))
-        print(products)
+        from inventory_cache import get_all_products_page
+        page = get_all_products_page(cursor=cursor, limit=limit)
+        products = page.items
     except Exception as e:
         print(f"Error fetching products: {e}")
+        page = None
         products = []
     
-    return render_template('all_products.html', products=products.to_dict('records'))
+    return render_template('all_products.html', products=products, page=page, limit=limit)
 
 @app.route('/item_admin/<item_code>', methods=['GET'])
 @app.route('/item_admin', methods=['GET'])
@@ -198,22 +342,20 @@ def item_admin(item_code=None):
     if item_code:
         try:
             from db_equipment_inventory import get_item_by_code
-            item_df = get_item_by_code(item_code)
+            item = get_item_by_code(item_code)
             
-            if not item_df.empty:
-                # Convert the first row of the DataFrame to a dictionary
-                row = item_df.iloc[0]
+            if item:
                 item_data = {
-                    'item_code': row['Item_Code'],
-                    'category': row['Category'],
-                    'sub_category': row['Sub_Category'],
-                    'category_description': row['Category_Description'],
-                    'make': row['Make'],
-                    'model': row['Model'],
-                    'certification': row['Certification'],
-                    'specification': row['Specification'],
-                    'location': row['Location'],
-                    'price': row['Price']
+                    'item_code': item.Code,
+                    'category': item.Type,
+                    'sub_category': item.Sub_Category,
+                    'category_description': item.Description,
+                    'make': item.Make,
+                    'model': item.Model,
+                    'certification': item.Certification,
+                    'specification': item.Specification,
+                    'location': item.Location,
+                    'price': item.Price
                 }
                 form_title = "Edit Equipment"
         except Exception as e:
@@ -275,5 +417,175 @@ def submit_form():
     
     return redirect(url_for('all_products'))
 
+@app.route('/export', methods=['GET'])
+@login_required
+def export():
+    """
+    Download equipment_inventory as CSV or Parquet (?format=parquet), streamed
+    from an unbuffered cursor. search and type filter like the search page.
+    """
+    from export import EXPORT_FORMATS, iter_export
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Unknown format {fmt!r}"), 400
+    try:
+        chunks = iter_export(fmt, request.args.get('search', ''), request.args.get('type', ''))
+    except ImportError:
+        return jsonify(error="Parquet export needs pyarrow installed"), 501
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    if fmt == 'csv':
+        chunks = buffered_chunks(chunks)
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="equipment_inventory.{extension}"',
+    })
+
+# Rejected-row files from bulk imports, kept in the temp directory for download
+IMPORT_ERROR_DIR = os.path.join(tempfile.gettempdir(), 'inventory-import-errors')
+# How long a rejected-row file stays downloadable
+IMPORT_ERROR_MAX_AGE = 24 * 3600
+
+def remove_old_import_errors(max_age=IMPORT_ERROR_MAX_AGE):
+    """Delete rejected-row files older than max_age seconds."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(IMPORT_ERROR_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # Another worker removed it first
+        except OSError as e:
+            print(f"Error removing old import error file {entry.path}: {e}")
+
+@app.route('/admin/import', methods=['GET'])
+@login_required
+def bulk_import_form():
+    """Upload form for a bulk CSV import"""
+    return render_template('import.html')
+
+@app.route('/admin/import', methods=['POST'])
+@login_required
+def bulk_import_upload():
+    """Stream an uploaded CSV into equipment_inventory and show the report"""
+    upload = request.files.get('csv_file')
+    if not upload or not upload.filename:
+        return render_template('import.html', error="Choose a CSV file to import.")
+    dry_run = bool(request.form.get('dry_run'))
+
+    os.makedirs(IMPORT_ERROR_DIR, exist_ok=True)
+    remove_old_import_errors()
+    token = secrets.token_hex(8)
+    error_path = os.path.join(IMPORT_ERROR_DIR, f"{token}.csv")
+    # The importer reads from a file so the upload is never held in memory
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as tmp:
+        upload.save(tmp)
+    try:
+        from bulk_import import import_csv
+        report = import_csv(tmp.name, error_path=error_path, dry_run=dry_run)
+    except Exception as e:
+        print(f"Error importing {upload.filename}: {e}")
+        return render_template('import.html', error=f"Import failed: {e}")
+    finally:
+        os.remove(tmp.name)
+
+    return render_template('import.html', report=report.as_dict(), dry_run=dry_run,
+                           error_token=token if report.error_path else None)
+
+@app.route('/admin/import/errors/<token>')
+@login_required
+def bulk_import_errors(token):
+    """Download the rejected rows of an import"""
+    if not token.isalnum():
+        return redirect(url_for('bulk_import_form'))
+    path = os.path.join(IMPORT_ERROR_DIR, f"{token}.csv")
+    if not os.path.exists(path):
+        return render_template('import.html', error="That error file is no longer available.")
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name='import-errors.csv')
+
+@app.route('/admin/bulk_edit', methods=['POST'])
+@login_required
+def bulk_edit():
+    """
+    Apply one edit (set price, adjust price by a percentage, set location or
+    certification) to the selected items in a single transaction.
+    Answers JSON with per-row results for script callers; a plain form post
+    gets a summary message and goes back to the product list.
+    """
+    from db_equipment_inventory import bulk_update_items
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        codes = payload.get('item_codes') or []
+        action = payload.get('action', '')
+        value = str(payload.get('value', ''))
+    else:
+        codes = request.form.getlist('item_codes')
+        action = request.form.get('action', '')
+        value = request.form.get('value', '')
+
+    try:
+        results = bulk_update_items(codes, action, value)
+        error = None
+    except ValueError as e:
+        results = []
+        error = str(e)
+
+    updated = sum(1 for result in results if result['ok'])
+    failed = len(results) - updated
+    if request.is_json:
+        status = 400 if error else 200
+        return jsonify(error=error, updated=updated, failed=failed, results=results), status
+
+    if error:
+        flash(f"Bulk edit not applied: {error}")
+    else:
+        flash(f"Bulk edit: {updated} updated, {failed} failed.")
+    # Back to the product list page the form was on (same search and page);
+    # the Referer is client-supplied, so only that page of this site is followed
+    back = url_for('all_products')
+    referrer = urlsplit(request.referrer or '')
+    if referrer.netloc == request.host and referrer.path == back and referrer.query:
+        back += '?' + referrer.query
+    return redirect(back)
+
+@app.route('/admin/slow_queries')
+@login_required
+def slow_queries():
+    """
+    SQL fingerprints across all workers, heaviest first (?sort=total, max,
+    avg, count or errors), with the EXPLAIN plan of any that ran slow.
+    """
+    from query_log import query_log
+    order = request.args.get('sort', 'total')
+    queries = query_log.top(limit=page_size(request.args.get('limit')), order=order)
+    return render_template('slow_queries.html', queries=queries, order=order,
+                           threshold_ms=query_log.threshold * 1000)
+
+@app.route('/health/inventory')
+def inventory_status():
+    """Snapshot version, age and size (and the local replica, if any) for monitoring"""
+    from inventory_cache import cache_status
+    from catalogue_replica import get_catalogue_replica
+    status = cache_status()
+    replica = get_catalogue_replica()
+    if replica is not None:
+        status['replica'] = replica.status()
+    return jsonify(status)
+
+@app.route('/health/db')
+def db_routing_status():
+    """Read routing decisions and per-backend health and latency"""
+    from db_equipment_inventory import read_router
+    return jsonify(read_router.status())
+
+@app.route('/metrics')
+def metrics():
+    """Request counts and timing histograms, merged across workers, for Prometheus"""
+    from request_metrics import render_metrics
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,427 @@
+"""
+ASGI serving mode: the search routes on an event loop, so one worker can
+hold hundreds of concurrent searches while they wait on MySQL and S3.
+
+The I/O-bound routes (/, /api/search, /api/suggest, /item_admin) run
+natively under Quart, with aiomysql for database reads and aioboto3 for
+image lookups. Everything else (forms, imports, exports, health checks)
+is handed to the Flask app in app.py on a thread pool, so both modes serve
+the same routes, templates and session cookie.
+
+Needs the async extras, which the default Flask deployment does not:
+
+    pip install -r requirements-async.txt
+
+Pick the mode with SERVE_MODE (see serve.py) and compare the two with
+benchmark.py --url against each:
+
+    gunicorn -c gunicorn.conf.py serve:application                    # sync (default)
+    SERVE_MODE=async gunicorn -c gunicorn.conf.py serve:application   # async
+"""
+import time
+import asyncio
+import functools
+import contextlib
+
+from quart import Quart, request, session, redirect, url_for, render_template, jsonify
+from quart import Response, flash
+from werkzeug.exceptions import HTTPException
+from urllib.parse import urlencode
+
+import request_metrics
+from env_cred import app_secret_key, async_s3_concurrency, async_db_pool_size
+from env_cred import s3_access_key_id, s3_secret_access_key, s3_region, s3_bucket_name
+from pagination import page_size
+from facet_index import selected_facets, facet_panel
+from app import app as flask_app
+from app import load_inventory_data, category_options, search_etag, SEARCH_API_COLUMNS
+
+native = Quart(__name__)
+native.secret_key = app_secret_key  # Same key and cookie format as the Flask app
+
+#######################################################
+##### ASYNC I/O
+#######################################################
+
+# Concurrent S3 listings per worker; the aiomysql pool size (per database
+# backend) bounds MySQL the same way
+S3_CONCURRENCY = int(async_s3_concurrency) if async_s3_concurrency else 32
+DB_POOL_SIZE = int(async_db_pool_size) if async_db_pool_size else 10
+
+# aiomysql pool per read_router backend name: the primary and each replica
+_mysql_pools = {}
+_s3 = None
+_s3_slots = None
+_exit_stack = None
+
+@native.before_serving
+async def start_io():
+    """Open the per-worker pools and warm the caches."""
+    global _s3, _s3_slots, _exit_stack
+    import aiomysql
+    import aioboto3
+    from db_equipment_inventory import DB_CONFIG, REPLICA_CONFIGS
+
+    _s3_slots = asyncio.BoundedSemaphore(S3_CONCURRENCY)
+    configs = {'primary': DB_CONFIG}
+    configs.update((f'replica-{index}', config) for index, config in enumerate(REPLICA_CONFIGS))
+    for name, config in configs.items():
+        # minsize=0: the worker starts even while MySQL is unreachable
+        _mysql_pools[name] = await aiomysql.create_pool(
+            host=config['host'], port=config['port'], user=config.get('user'),
+            password=config.get('password') or '', db=config.get('database'),
+            minsize=0, maxsize=DB_POOL_SIZE, autocommit=True, pool_recycle=3600,
+        )
+    _exit_stack = contextlib.AsyncExitStack()
+    _s3 = await _exit_stack.enter_async_context(aioboto3.Session().client(
+        's3',
+        aws_access_key_id=s3_access_key_id,
+        aws_secret_access_key=s3_secret_access_key,
+        region_name=s3_region
+    ))
+    # Quick when gunicorn's post_worker_init has already warmed this worker
+    from warmup import warm_caches
+    await asyncio.to_thread(warm_caches)
+
+@native.after_serving
+async def stop_io():
+    for pool in _mysql_pools.values():
+        pool.close()
+        await pool.wait_closed()
+    _mysql_pools.clear()
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+
+async def snapshot_ready():
+    """
+    Make sure the inventory snapshot is loaded and current. A (re)load
+    queries MySQL, so it runs on a thread; otherwise this returns at once.
+    """
+    from inventory_cache import get_snapshot
+    await asyncio.to_thread(get_snapshot)
+
+async def _fetch_product_image_url(product_key):
+    """Ask S3 for the first image under the product's prefix. Returns (url, ok)."""
+    from image_manifest import IMAGE_PREFIX, s3_public_url
+    async with _s3_slots:
+        try:
+            response = await _s3.list_objects_v2(
+                Bucket=s3_bucket_name,
+                Prefix=f"{IMAGE_PREFIX}{product_key}/",
+                MaxKeys=1
+            )
+        except Exception as e:
+            print(f"Error fetching image for {product_key}: {e}")
+            return None, False
+    contents = response.get('Contents') or []
+    return (s3_public_url(contents[0]['Key']) if contents else None), True
+
+async def get_product_image_urls(product_keys):
+    """
+    Async version of s3_utils.get_product_image_urls: the manifest or the
+    URL cache first, then one listing per remaining code, all in flight at
+    once (up to S3_CONCURRENCY per worker).
+
+    Args:
+        product_keys (iterable): Product codes/IDs to look up
+
+    Returns:
+        dict: Maps each product code (as str) to its URL or None
+    """
+    from s3_utils import known_product_image_urls, remember_product_image_urls
+    urls, pending = known_product_image_urls(product_keys)
+    if pending:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_fetch_product_image_url(key) for key in pending))
+        request_metrics.add_time('s3', time.perf_counter() - started, calls=len(pending))
+        request_metrics.count('s3_calls', len(pending))
+        remember_product_image_urls(urls, pending, results)
+    return urls
+
+async def _connect_read():
+    """
+    Async version of read_router.connect_read(): the same backend order,
+    read-your-writes pinning and replica ejection, over this worker's
+    aiomysql pools. Returns (backend, pool, connection), or None if nothing
+    is reachable.
+    """
+    from db_equipment_inventory import read_router
+    for decision, backend in read_router.read_plan():
+        pool = _mysql_pools[backend.name]
+        try:
+            with request_metrics.timed('connect'):
+                conn = await pool.acquire()
+        except Exception as e:
+            print(f"Error connecting to {backend.name}: {e}")
+            conn = None
+        read_router.record_checkout(decision, backend, conn is not None)
+        if conn is not None:
+            return backend, pool, conn
+    return None
+
+async def get_item_by_code(item_code):
+    """
+    Async version of db_equipment_inventory.get_item_by_code: the local
+    replica when it is in sync, otherwise MySQL through aiomysql, routed
+    like the sync reads (see db_router).
+    Returns an EquipmentItem or None.
+    """
+    from catalogue_replica import get_catalogue_replica
+    replica = get_catalogue_replica()
+    if replica is not None and replica.ready:
+        item = replica.repository.get(item_code, view='detail')
+        if not replica.failed:
+            return item
+
+    import aiomysql
+    from db_equipment_inventory import equipment_repository
+    checkout = await _connect_read()
+    if checkout is None:
+        return None
+    backend, pool, conn = checkout
+    sql = equipment_repository.statement('detail', in_size=1, ordered=False)
+    started = time.perf_counter()
+    try:
+        with request_metrics.timed('query'):
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(sql, [item_code])
+                row = await cursor.fetchone()
+    except Exception as e:
+        print(f"Error fetching item {item_code} from {backend.name}: {e}")
+        conn.close()  # the pool drops a closed connection on release
+        return None
+    finally:
+        backend.record_latency(time.perf_counter() - started)
+        pool.release(conn)
+    request_metrics.count('queries')
+    request_metrics.count('rows', 1 if row else 0)
+    return equipment_repository.table.record.from_row(row) if row else None
+
+async def _page_with_images(search_query, type_filter, cursor, limit, facets):
+    page = load_inventory_data(search_query, type_filter, cursor, limit, facets)
+    image_urls = {}
+    if page.items:
+        image_urls = await get_product_image_urls(item.Code for item in page.items)
+    return page, image_urls
+
+async def search_with_counts(search_query, type_filter, cursor, limit, facets):
+    """
+    Facet counts (on a thread) alongside the result page and its image
+    lookups, so the counting overlaps the S3 round trips.
+
+    Returns:
+        tuple: (facet counts, page or None, image URLs by code)
+    """
+    from inventory_cache import get_facet_counts
+    await snapshot_ready()
+    counting = asyncio.to_thread(get_facet_counts, search_query, type_filter, facets)
+    if not (search_query or type_filter or facets):
+        return await counting, None, {}
+    counts, (page, image_urls) = await asyncio.gather(
+        counting, _page_with_images(search_query, type_filter, cursor, limit, facets))
+    return counts, page, image_urls
+
+#######################################################
+##### REQUEST HOOKS
+#######################################################
+
+# Registered first so it finishes last, timing the other hooks too
+@native.before_request
+async def begin_request_timing():
+    request_metrics.begin_request()
+
+@native.after_request
+async def finish_request_timing(response):
+    header = request_metrics.finish_request(request.endpoint, response.status_code)
+    if header:
+        response.headers['Server-Timing'] = header
+    return response
+
+@native.before_request
+async def begin_db_routing():
+    import db_router
+    db_router.begin_request(session.get('db_primary_until'))
+
+@native.after_request
+async def finish_db_routing(response):
+    import db_router
+    routes = db_router.request_routes()
+    if routes:
+        response.headers['X-DB-Route'] = ', '.join(dict.fromkeys(routes))
+    return response
+
+def login_required(func):
+    @functools.wraps(func)
+    async def secure_function(*args, **kwargs):
+        if "logged_in" not in session:
+            return redirect(url_for('login'))
+        return await func(*args, **kwargs)
+    return secure_function
+
+@native.template_global()
+def page_url(cursor):
+    args = [(key, value) for key, value in request.args.items(multi=True) if key != 'cursor']
+    args.append(('cursor', cursor))
+    return f"{url_for(request.endpoint, **request.view_args)}?{urlencode(args)}"
+
+#######################################################
+##### ROUTES
+#######################################################
+
+@native.route('/', methods=['GET'])
+@login_required
+async def home():
+    search_query = request.args.get('search', '').lower()
+    type_filter = request.args.get('type', '')
+    limit = page_size(request.args.get('limit'))
+    facets = selected_facets(request.args, include_category=False)
+
+    counts, page, image_urls = await search_with_counts(
+        search_query, type_filter, request.args.get('cursor'), limit, facets)
+
+    with request_metrics.timed('render'):
+        return await render_template('index.html',
+                                     results=page.items if page else [],
+                                     image_urls=image_urls,
+                                     types=category_options(counts, type_filter),
+                                     facet_panel=facet_panel(counts, facets),
+                                     selected_type=type_filter,
+                                     page=page,
+                                     limit=limit)
+
+@native.route('/api/search', methods=['GET'])
+@login_required
+async def api_search():
+    """Same contract as app.api_search."""
+    search_query = request.args.get('search', '').lower()
+    type_filter = request.args.get('type', '')
+    limit = page_size(request.args.get('limit'))
+    facets = selected_facets(request.args, include_category=False)
+
+    await snapshot_ready()
+    etag = search_etag()
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response('', status=304)
+    else:
+        counts, page, image_urls = await search_with_counts(
+            search_query, type_filter, request.args.get('cursor'), limit, facets)
+        items = page.items if page else []
+        rows = [[item.Code, item.Description, item.Price, item.Type,
+                 image_urls.get(str(item.Code))] for item in items]
+        response = jsonify(columns=SEARCH_API_COLUMNS, rows=rows,
+                           next=page.next_cursor if page else None,
+                           prev=page.prev_cursor if page else None,
+                           types=category_options(counts, type_filter),
+                           facets=facet_panel(counts, facets))
+
+    if etag:
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+@native.route('/api/suggest', methods=['GET'])
+@login_required
+async def api_suggest():
+    """Same contract as app.api_suggest; the lookup is in memory, so it runs inline."""
+    from inventory_cache import suggest
+    from suggest_index import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+    await snapshot_ready()
+    limit = page_size(request.args.get('limit'), DEFAULT_SUGGESTIONS)
+    suggestions = suggest(request.args.get('q', ''), min(limit, MAX_SUGGESTIONS))
+    response = jsonify(suggestions=[{'field': column, 'value': value, 'count': count}
+                                    for column, value, count in suggestions])
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
+
+@native.route('/item_admin/<item_code>', methods=['GET'])
+@native.route('/item_admin', methods=['GET'])
+@login_required
+async def item_admin(item_code=None):
+    """Display form to add or edit an equipment item"""
+    item_data = {
+        'item_code': '',
+        'category': '',
+        'sub_category': '',
+        'category_description': '',
+        'make': '',
+        'model': '',
+        'certification': '',
+        'specification': '',
+        'location': '',
+        'price': ''
+    }
+    form_title = "Add New Equipment"
+
+    if item_code:
+        try:
+            item = await get_item_by_code(item_code)
+            if item:
+                item_data = {
+                    'item_code': item.Code,
+                    'category': item.Type,
+                    'sub_category': item.Sub_Category,
+                    'category_description': item.Description,
+                    'make': item.Make,
+                    'model': item.Model,
+                    'certification': item.Certification,
+                    'specification': item.Specification,
+                    'location': item.Location,
+                    'price': item.Price
+                }
+                form_title = "Edit Equipment"
+        except Exception as e:
+            print(f"Error fetching item details: {e}")
+            await flash(f"Error fetching item details: {str(e)}")
+
+    with request_metrics.timed('render'):
+        return await render_template('item_admin.html', form_title=form_title, **item_data)
+
+#######################################################
+##### DISPATCH
+#######################################################
+
+class SplitApp:
+    """
+    ASGI app sending requests for routes with a native async view to the
+    Quart app and everything else to the Flask app, run on a thread pool.
+
+    The Flask routes are mirrored into the Quart URL map (without views)
+    so url_for() in native views and templates can build links to them.
+
+    Args:
+        native (Quart): App holding the async views
+        wsgi_app (Flask): App holding every route
+        wsgi_threads (int): Threads running Flask requests
+    """
+
+    def __init__(self, native, wsgi_app, wsgi_threads=16):
+        from a2wsgi import WSGIMiddleware
+        for rule in wsgi_app.url_map.iter_rules():
+            if rule.endpoint not in native.view_functions:
+                native.add_url_rule(rule.rule, rule.endpoint, methods=rule.methods)
+        self.native = native
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=wsgi_threads)
+        self._urls = native.url_map.bind('localhost')
+
+    def is_native(self, scope):
+        try:
+            endpoint, _ = self._urls.match(scope['path'], method=scope['method'])
+        except HTTPException:  # not found, wrong method or a slash redirect
+            return False
+        return endpoint in self.native.view_functions
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self.is_native(scope):
+            await self.wsgi(scope, receive, send)
+        else:
+            # Native routes, plus lifespan events (pool setup) and websockets
+            await self.native(scope, receive, send)
+
+
+application = SplitApp(native, flask_app)
+
+# Run directly for a development server on the event loop
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, port=5000)
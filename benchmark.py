@@ -0,0 +1,715 @@
+"""
+Offline benchmark of the main request paths.
+
+Runs the Flask app in-process against an embedded SQLite stand-in for
+MySQL and a stubbed S3 client with injectable latency, so it needs no
+network or credentials. Reports p50/p95/p99 latency, peak allocation,
+database queries and S3 calls per request, writes them as JSON and can
+compare them with a stored baseline.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline benchmark_baseline.json   # exit 1 on regression
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --scale 1000 10000 100000 1000000 --output scaling.json --plot scaling.png
+    python benchmark.py --check-inserts   # concurrent inserts get unique item codes
+
+With --url it instead load-tests a running server, e.g. to compare the
+sync and async serving modes (see serve.py) under the same traffic:
+
+    python benchmark.py --url http://localhost:8000 --iterations 2000 --concurrency 200
+"""
+import os
+import re
+import bisect
+import itertools
+import sys
+import json
+import time
+import random
+import sqlite3
+import platform
+import threading
+import tracemalloc
+import contextlib
+from decimal import Decimal
+from pymysql.cursors import RE_INSERT_VALUES
+from pymysql.err import IntegrityError
+
+DEFAULT_ROWS = 5000
+DEFAULT_ITERATIONS = 200
+DEFAULT_TOLERANCE = 0.25
+
+#######################################################
+##### SQLITE STAND-IN FOR PYMYSQL
+#######################################################
+
+_UPSERT_RE = re.compile(r"ON DUPLICATE KEY UPDATE (.*)$", re.S)
+_VALUES_RE = re.compile(r"VALUES\((\w+)\)")
+# The ID allocator's SET col = LAST_INSERT_ID(expr) and its read-back
+_SET_LAST_INSERT_ID_RE = re.compile(r"SET (\w+) = LAST_INSERT_ID\((.*)\)(\s+WHERE .*)$", re.S)
+_SELECT_LAST_INSERT_ID_RE = re.compile(r"\s*SELECT LAST_INSERT_ID\(\) AS (\w+)\s*$")
+
+def _to_sqlite(sql):
+    """Rewrite the MySQL dialect this app uses into SQLite."""
+    sql = sql.replace(' FOR UPDATE', '').replace('INSERT IGNORE', 'INSERT OR IGNORE')
+    match = _UPSERT_RE.search(sql)
+    if match:
+        updates = _VALUES_RE.sub(r"excluded.\1", match.group(1))
+        sql = sql[:match.start()] + "ON CONFLICT(Item_Code) DO UPDATE SET " + updates
+    match = _SET_LAST_INSERT_ID_RE.search(sql)
+    if match:
+        # RETURNING hands the new value back, for the connection to remember
+        column, value, where = match.groups()
+        sql = (sql[:match.start()] + f"SET {column} = {value.replace('GREATEST(', 'MAX(')}"
+               f"{where.rstrip()} RETURNING {column} AS last_insert_id")
+    return sql.replace('%s', '?')
+
+def _params(params):
+    return [str(p) if isinstance(p, Decimal) else p for p in (params or ())]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, count=1):
+        with self.lock:
+            self.count += count
+
+
+class SqliteCursor:
+    """DictCursor-like cursor over a shared SQLite connection."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._db = connection._db
+        self._lock = connection._lock
+        self._counter = connection._counter
+        self._rows = []
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        self._counter.add()
+        match = _SELECT_LAST_INSERT_ID_RE.match(sql)
+        if match:
+            self._rows = [{match.group(1): self._connection.last_insert_id}]
+            return 1
+        with self._lock:
+            try:
+                cursor = self._db.execute(_to_sqlite(sql), _params(params))
+            except sqlite3.IntegrityError as e:
+                # As pymysql raises it, so duplicate-key handling is exercised
+                raise IntegrityError(1062, str(e))
+            self.description = cursor.description
+            names = [d[0] for d in cursor.description] if cursor.description else []
+            self._rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+            self.rowcount = cursor.rowcount
+        if names == ['last_insert_id']:
+            # An UPDATE in MySQL: no result set, just the remembered value
+            self._connection.last_insert_id = self._rows[0]['last_insert_id'] if self._rows else 0
+            self._rows, self.description = [], None
+        return self.rowcount
+
+    def executemany(self, sql, seq):
+        seq = [_params(p) for p in seq]
+        # Count what pymysql would send: one multi-row statement for
+        # INSERT/REPLACE ... VALUES, one statement per row for anything else
+        self._counter.add(1 if RE_INSERT_VALUES.match(sql) else len(seq))
+        with self._lock:
+            cursor = self._db.executemany(_to_sqlite(sql), seq)
+            self.rowcount = cursor.rowcount
+        return self.rowcount
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        self._rows = []
+
+
+class SqliteConnection:
+    """Stands in for a pooled pymysql connection."""
+
+    def __init__(self, db, lock, counter):
+        self._db = db
+        self._lock = lock
+        self._counter = counter
+        self.last_insert_id = 0
+
+    def cursor(self, cursorclass=None):
+        return SqliteCursor(self)
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._db.rollback()
+
+    def close(self):
+        pass
+
+    def invalidate(self):
+        pass
+
+
+def build_database(rows, generator, path=':memory:'):
+    """An equipment_inventory (in memory unless path is given) filled with rows synthetic items."""
+    from synthetic_inventory import load
+    db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+    if path != ':memory:':
+        db.execute("PRAGMA journal_mode = WAL")
+    db.execute("""
+        CREATE TABLE equipment_inventory (
+            Item_Code INTEGER PRIMARY KEY, Category TEXT, Sub_Category TEXT,
+            Category_Description TEXT, Make TEXT, Model TEXT, Certification TEXT,
+            Specification TEXT, Location TEXT, Price NUMERIC
+        )
+    """)
+    db.execute("CREATE INDEX idx_category ON equipment_inventory (Category)")
+    load(lambda: SqliteConnection(db, threading.RLock(), QueryCounter()), rows, generator)
+    return db
+
+class SharedDatabase:
+    """
+    connect() for a stand-in database file that forked processes share:
+    each process opens its own SQLite connection on first use.
+    """
+
+    def __init__(self, path, counter):
+        self.path = path
+        self.counter = counter
+        self._pid = None
+
+    def connect(self):
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+            self._lock = threading.RLock()
+            self._pid = os.getpid()
+        return SqliteConnection(self._db, self._lock, self.counter)
+
+#######################################################
+##### S3 STUB
+#######################################################
+
+class StubS3Client:
+    """
+    Answers list_objects_v2 from an in-memory key list, sleeping latency
+    seconds per call to stand in for the network round trip.
+    """
+
+    def __init__(self, keys, latency=0.0):
+        self.keys = sorted(keys)
+        self.latency = latency
+        self.calls = QueryCounter()
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self.calls.add()
+        if self.latency:
+            time.sleep(self.latency)
+        start = int(ContinuationToken) if ContinuationToken else 0
+        # Keys are sorted, so the prefix matches are one contiguous run
+        first = bisect.bisect_left(self.keys, Prefix)
+        matched = list(itertools.takewhile(lambda key: key.startswith(Prefix),
+                                           self.keys[first:first + start + MaxKeys + 1]))
+        page = matched[start:start + MaxKeys]
+        response = {'Contents': [{'Key': key} for key in page],
+                    'IsTruncated': start + MaxKeys < len(matched)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+
+def image_keys(rows, generator):
+    """Fake image objects for a share of the item codes: str(code) -> keys."""
+    return generator.image_keys(range(1, rows + 1))
+
+#######################################################
+##### HARNESS
+#######################################################
+
+def _complete(result):
+    """Read a response body in full; a function scenario's result is returned as is."""
+    if hasattr(result, 'get_data'):
+        result.get_data()
+    return result
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Bench:
+    """Wires the app to the stand-ins and measures scenarios against it."""
+
+    def __init__(self, rows=DEFAULT_ROWS, s3_latency=0.005, image_mode='cache', replicas=0,
+                 warm=False):
+        # Configuration is read at import time, so set it before importing the app
+        os.environ.setdefault('APP_SECRET_KEY', 'benchmark')
+        os.environ['INVENTORY_CACHE_TTL'] = '0'
+        os.environ['IMAGE_MANIFEST_REFRESH'] = '0' if image_mode == 'cache' else '3600'
+        os.environ.pop('IMAGE_MANIFEST_PATH', None)
+
+        self.rows = rows
+        self.queries = QueryCounter()
+        from synthetic_inventory import InventoryGenerator
+        generator = InventoryGenerator(seed=1)
+        db = build_database(rows, generator)
+        lock = threading.RLock()
+        self.connect = lambda: SqliteConnection(db, lock, self.queries)
+        images = image_keys(rows, generator)
+        self.s3 = StubS3Client([key for keys in images.values() for key in keys], latency=s3_latency)
+        self.image_codes = sorted(images, key=int)[:50]
+        self.top_makes = [str(make) for make in generator.makes[:2]]
+
+        import s3_utils
+        import db_equipment_inventory
+        s3_utils._client, s3_utils._client_pid = self.s3, os.getpid()
+        db_equipment_inventory.connect_to_db = self.connect
+        # Reads go through the read/write router; replicas are stand-ins on the same database
+        from db_router import Backend
+        router = db_equipment_inventory.read_router
+        router.primary.connect = self.connect
+        router.replicas = [Backend(f'replica-{index}', self.connect) for index in range(replicas)]
+        self.s3_utils = s3_utils
+
+        from app import app
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+
+        # What gunicorn's post_worker_init does before a worker takes traffic
+        self.warmup_ms = None
+        if warm:
+            from warmup import warm_caches
+            with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+                self.warmup_ms = round(sum(warm_caches().values()), 1)
+
+        # Without warm-up the first request loads the inventory snapshot and
+        # builds its indexes, and the first search also fetches image URLs
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            started = time.perf_counter()
+            self.client.get('/').get_data()
+            self.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+            started = time.perf_counter()
+            self.client.get('/?type=Electrical').get_data()
+            self.first_search_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        if image_mode == 'manifest':
+            from image_manifest import get_manifest
+            manifest = get_manifest()
+            while not manifest.ready:
+                time.sleep(0.01)
+
+    def scenarios(self):
+        """
+        Name -> callable issuing one request, which must answer 2xx/3xx, or
+        (fn_*) calling one data-layer function directly, which must not
+        return None.
+        """
+        client = self.client
+        s3_utils = self.s3_utils
+        codes = [str(code) for code in range(1, min(self.rows, 50) + 1)]
+        next_code = itertools.cycle(codes).__next__
+        image_code = self.image_codes[0]
+        import inventory_cache
+        import db_equipment_inventory
+
+        def cold_images():
+            s3_utils.image_url_cache.clear()
+            return client.get('/?search=pump')
+
+        def cold_image_url():
+            s3_utils.image_url_cache.clear()
+            return s3_utils.get_product_image_url(image_code)
+
+        return {
+            'home_empty': lambda: client.get('/'),
+            'search_term': lambda: client.get('/?search=hydraulic pump'),
+            'search_prefix': lambda: client.get('/?search=hyd'),
+            'search_type': lambda: client.get('/?type=Electrical'),
+            'search_facets': lambda: client.get('/', query_string={
+                'make': self.top_makes, 'location': 'Leeds'}),
+            'search_cold_images': cold_images,
+            'api_search': lambda: client.get('/api/search?search=valve&limit=50'),
+            'api_search_304': lambda: client.get('/api/search?search=valve&limit=50',
+                                                 headers={'If-None-Match': self._etag()}),
+            'api_suggest': lambda: client.get('/api/suggest?q=ma'),
+            'all_products_page': lambda: client.get('/all_products'),
+            'enquiry': lambda: client.post('/enquiry', data={'selected_items': codes[:10]}),
+            'item_admin': lambda: client.get('/item_admin/7'),
+            'export_csv': lambda: client.get('/export?type=Tools'),
+            'bulk_edit_50': lambda: client.post('/admin/bulk_edit', json={
+                'item_codes': codes, 'action': 'set_location', 'value': random.choice(['Leeds', 'Hull'])}),
+            # The functions behind the routes, without the request around them:
+            # in-memory search and listing, and the database versions
+            'fn_search_products': lambda: inventory_cache.search_products('hydraulic pump'),
+            'fn_search_products_db': lambda: db_equipment_inventory.search_products('valve'),
+            'fn_get_all_products': inventory_cache.get_all_products,
+            'fn_get_all_products_db': db_equipment_inventory.get_all_products,
+            'fn_get_item_by_code': lambda: db_equipment_inventory.get_item_by_code(next_code()),
+            'fn_get_product_image_url': lambda: s3_utils.get_product_image_url(image_code),
+            'fn_get_product_image_url_cold': cold_image_url,
+        }
+
+    def _etag(self):
+        from app import search_etag
+        return f'W/"{search_etag()}"'
+
+    def run(self, iterations=DEFAULT_ITERATIONS, alloc_iterations=20, only=None):
+        # The routes print debugging output; keep it out of the results
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            return self._run(iterations, alloc_iterations, only)
+
+    def _run(self, iterations, alloc_iterations, only):
+        results = {}
+        for name, request in self.scenarios().items():
+            if only and name not in only:
+                continue
+            # Warm caches and indexes, then check the route actually works
+            for _ in range(3):
+                result = _complete(request())
+            if result is None or getattr(result, 'status_code', 200) >= 400:
+                raise RuntimeError(f"{name} answered {getattr(result, 'status_code', result)}")
+
+            timings = []
+            queries_before = self.queries.count
+            s3_before = self.s3.calls.count
+            for _ in range(iterations):
+                started = time.perf_counter()
+                _complete(request())
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = (self.queries.count - queries_before) / iterations
+            s3_calls = (self.s3.calls.count - s3_before) / iterations
+
+            # Allocations are measured in a separate, shorter pass because
+            # tracemalloc slows everything down
+            peaks = []
+            tracemalloc.start()
+            for _ in range(alloc_iterations):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                _complete(request())
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            tracemalloc.stop()
+
+            timings.sort()
+            results[name] = {
+                'p50_ms': round(percentile(timings, 0.50), 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+                'p99_ms': round(percentile(timings, 0.99), 3),
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'peak_alloc_kib': round(sorted(peaks)[len(peaks) // 2] / 1024, 1),
+                'queries_per_request': round(queries, 2),
+                's3_calls_per_request': round(s3_calls, 2),
+            }
+            print(f"{name:30s} p50 {results[name]['p50_ms']:8.3f} ms  p99 {results[name]['p99_ms']:8.3f} ms  "
+                  f"{results[name]['peak_alloc_kib']:8.1f} KiB  {queries:5.2f} queries  "
+                  f"{s3_calls:5.2f} S3 calls", file=sys.stderr)
+        return results
+
+#######################################################
+##### BASELINE COMPARISON
+#######################################################
+
+# Metrics compared with a relative tolerance; counts must not grow at all
+_TIMED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_alloc_kib')
+_COUNTED_METRICS = ('queries_per_request', 's3_calls_per_request')
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare scenario results with a baseline run.
+
+    Returns:
+        list: (scenario, metric, baseline value, new value) for every regression
+    """
+    regressions = []
+    for name, metrics in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in _TIMED_METRICS:
+            if metric in before and metrics[metric] > before[metric] * (1 + tolerance):
+                regressions.append((name, metric, before[metric], metrics[metric]))
+        for metric in _COUNTED_METRICS:
+            if metric in before and metrics[metric] > before[metric] + 0.01:
+                regressions.append((name, metric, before[metric], metrics[metric]))
+    return regressions
+
+#######################################################
+##### SCALING
+#######################################################
+
+DEFAULT_SCALING_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_SCALING_SCENARIOS = ('search_term', 'search_facets', 'api_search', 'api_suggest',
+                             'all_products_page', 'export_csv')
+
+def _max_rss_mib():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_scaling(sizes, iterations, scenarios, s3_latency_ms):
+    """
+    Run the benchmark once per catalogue size, each in a fresh process so
+    memory and start-up are measured from scratch.
+
+    Returns:
+        dict: Catalogue size -> that run's output
+    """
+    import subprocess
+    import tempfile
+    runs = {}
+    for rows in sizes:
+        with tempfile.NamedTemporaryFile(suffix='.json') as out:
+            command = [sys.executable, os.path.abspath(__file__), '--rows', str(rows),
+                       '--iterations', str(iterations), '--s3-latency-ms', str(s3_latency_ms),
+                       '--output', out.name, '--only', *scenarios]
+            print(f"--- {rows} rows", file=sys.stderr)
+            subprocess.run(command, check=True)
+            runs[rows] = json.load(open(out.name))
+    return runs
+
+def plot_scaling(runs, path):
+    """Plot latency, memory and start-up against catalogue size. Needs matplotlib."""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping the plot", file=sys.stderr)
+        return False
+    sizes = sorted(runs)
+    figure, (latency, memory) = plt.subplots(1, 2, figsize=(13, 5))
+    for name in runs[sizes[0]]['scenarios']:
+        latency.plot(sizes, [runs[rows]['scenarios'][name]['p50_ms'] for rows in sizes],
+                     marker='o', label=f"{name} p50")
+        latency.plot(sizes, [runs[rows]['scenarios'][name]['p95_ms'] for rows in sizes],
+                     linestyle=':', color=latency.lines[-1].get_color())
+    latency.set(xscale='log', yscale='log', xlabel='catalogue rows',
+                ylabel='latency ms (dotted: p95)', title='Request latency')
+    latency.legend(fontsize='small')
+    memory.plot(sizes, [runs[rows]['meta']['max_rss_mib'] for rows in sizes], marker='o',
+                label='peak RSS MiB')
+    memory.plot(sizes, [runs[rows]['meta']['startup_ms'] for rows in sizes], marker='s',
+                label='first request ms')
+    memory.set(xscale='log', yscale='log', xlabel='catalogue rows', title='Memory and start-up')
+    memory.legend(fontsize='small')
+    figure.tight_layout()
+    figure.savefig(path)
+    return True
+
+#######################################################
+##### CONCURRENT INSERTS
+#######################################################
+
+def check_inserts(rows=1000, threads=8, processes=4, per_worker=250):
+    """
+    Run id_allocator.check_concurrency (real add_or_update_item inserts from
+    forked processes and threads) against a stand-in database file.
+
+    Returns:
+        bool: True if every insert got a unique code
+    """
+    import tempfile
+    from synthetic_inventory import InventoryGenerator
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'equipment_inventory.db')
+        build_database(rows, InventoryGenerator(seed=1), path).close()
+        import db_equipment_inventory
+        db_equipment_inventory.connect_to_db = SharedDatabase(path, QueryCounter()).connect
+        from id_allocator import check_concurrency
+        return check_concurrency(threads, processes, per_worker)
+
+#######################################################
+##### LIVE SERVER LOAD
+#######################################################
+
+DEFAULT_LOAD_PATHS = ('/?search=valve', '/api/search?search=valve', '/api/suggest?q=val')
+
+def run_load(base_url, paths, requests, concurrency, password):
+    """
+    Fire requests at a running server (either serving mode) from concurrency
+    client threads, after logging in once, and time each response.
+
+    Returns:
+        dict: Path -> latency percentiles, throughput and error count
+    """
+    import http.cookiejar
+    import urllib.parse
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    opener.open(base_url.rstrip('/') + '/login',
+                urllib.parse.urlencode({'password': password}).encode()).read()
+
+    def fetch(url):
+        started = time.perf_counter()
+        try:
+            with opener.open(url) as response:
+                response.read()
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for path in paths:
+            url = base_url.rstrip('/') + path
+            started = time.perf_counter()
+            outcomes = list(pool.map(fetch, [url] * requests))
+            elapsed = time.perf_counter() - started
+            timings = sorted(seconds * 1000 for seconds, ok in outcomes if ok)
+            results[path] = {
+                'p50_ms': round(percentile(timings, 0.50), 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+                'p99_ms': round(percentile(timings, 0.99), 3),
+                'requests_per_second': round(len(outcomes) / elapsed, 1),
+                'errors': sum(1 for _, ok in outcomes if not ok),
+            }
+            print(f"{path}: {results[path]}", file=sys.stderr)
+    return results
+
+def _git_revision():
+    try:
+        import subprocess
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the inventory app")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--s3-latency-ms', type=float, default=5.0)
+    parser.add_argument('--image-mode', choices=['cache', 'manifest'], default='cache')
+    parser.add_argument('--replicas', type=int, default=0,
+                        help="Route reads across this many stand-in replicas")
+    parser.add_argument('--only', nargs='*', help="Run only these scenarios")
+    parser.add_argument('--output', help="Write results as JSON here (default: stdout)")
+    parser.add_argument('--baseline', help="Compare with this results file; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative slowdown before a timing counts as a regression")
+    parser.add_argument('--save-baseline', help="Also write the results to this baseline file")
+    parser.add_argument('--scale', nargs='*', type=int, metavar='ROWS',
+                        help="Run once per catalogue size instead (default sizes: "
+                             f"{' '.join(map(str, DEFAULT_SCALING_SIZES))})")
+    parser.add_argument('--plot', help="With --scale, write a PNG plot here (needs matplotlib)")
+    parser.add_argument('--warm', action='store_true',
+                        help="Warm the caches (as the gunicorn workers do) before the first request")
+    parser.add_argument('--url', help="Load-test a running server at this base URL instead")
+    parser.add_argument('--paths', nargs='*', help="With --url, the paths to request "
+                        f"(default: {' '.join(DEFAULT_LOAD_PATHS)})")
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help="With --url, requests in flight at once")
+    parser.add_argument('--password', default='engineerPWD', help="With --url, login password")
+    parser.add_argument('--check-inserts', action='store_true',
+                        help="Instead check concurrent item inserts from forked processes for "
+                             "duplicate codes")
+    args = parser.parse_args()
+
+    if args.check_inserts:
+        sys.exit(0 if check_inserts() else 1)
+
+    if args.url:
+        output = {
+            'meta': {
+                'revision': _git_revision(),
+                'url': args.url,
+                'requests': args.iterations,
+                'concurrency': args.concurrency,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'paths': run_load(args.url, args.paths or DEFAULT_LOAD_PATHS, args.iterations,
+                              args.concurrency, args.password),
+        }
+        text = json.dumps(output, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        sys.exit(0)
+
+    if args.scale is not None:
+        runs = run_scaling(args.scale or DEFAULT_SCALING_SIZES, args.iterations,
+                           args.only or DEFAULT_SCALING_SCENARIOS, args.s3_latency_ms)
+        text = json.dumps({'revision': _git_revision(), 'runs': runs}, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        if args.plot:
+            plot_scaling(runs, args.plot)
+        sys.exit(0)
+
+    bench = Bench(args.rows, args.s3_latency_ms / 1000, args.image_mode, args.replicas, args.warm)
+    output = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'rows': args.rows,
+            'iterations': args.iterations,
+            's3_latency_ms': args.s3_latency_ms,
+            'image_mode': args.image_mode,
+            'replicas': args.replicas,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'warm': args.warm,
+            'warmup_ms': bench.warmup_ms,
+            'startup_ms': bench.startup_ms,
+            'first_search_ms': bench.first_search_ms,
+        },
+        'scenarios': bench.run(args.iterations, only=args.only),
+    }
+    output['meta']['max_rss_mib'] = _max_rss_mib()
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(output['scenarios'], baseline['scenarios'], args.tolerance)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name} {metric}: {before} -> {after}", file=sys.stderr)
+        if not regressions:
+            print(f"No regressions against {args.baseline}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,356 @@
+import os
+import re
+import csv
+import sys
+import time
+import tempfile
+from decimal import Decimal, InvalidOperation
+
+from catalogue_repository import EQUIPMENT_TABLE
+
+DEFAULT_BATCH_SIZE = 1000
+
+# equipment_inventory column -> header spellings accepted for it, compared
+# after lower-casing and dropping everything but letters and digits
+COLUMN_ALIASES = {
+    'Item_Code': ('itemcode', 'code', 'uniquecodeidentifier', 'id'),
+    'Category': ('category', 'type'),
+    'Sub_Category': ('subcategory',),
+    'Category_Description': ('categorydescription', 'description'),
+    'Make': ('make', 'manufacturer'),
+    'Model': ('model',),
+    'Certification': ('certification',),
+    'Specification': ('specification', 'spec'),
+    'Location': ('location',),
+    'Price': ('price',),
+}
+
+_HEADER_RE = re.compile(r"[^0-9a-z]+")
+
+def _header_key(header):
+    return _HEADER_RE.sub('', header.lstrip('﻿').casefold())
+
+def map_columns(headers):
+    """
+    Match CSV headers to equipment_inventory columns.
+
+    Returns:
+        tuple: (mapping, unmapped) where mapping is a list of (index, column)
+        in table column order and unmapped lists headers that were ignored
+
+    Raises:
+        ValueError: If no column besides Item_Code could be matched, or a
+            column is matched twice
+    """
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    found = {}
+    unmapped = []
+    for index, header in enumerate(headers):
+        column = lookup.get(_header_key(header))
+        if column is None:
+            unmapped.append(header)
+        elif column in found:
+            raise ValueError(f"Headers {headers[found[column]]!r} and {header!r} both map to {column}")
+        else:
+            found[column] = index
+    if not set(found) - {'Item_Code'}:
+        raise ValueError(f"No importable columns in header: {headers}")
+    order = [column for column in COLUMN_ALIASES if column in found]
+    return [(found[column], column) for column in order], unmapped
+
+#######################################################
+##### VALIDATION
+#######################################################
+
+def _parse_code(value):
+    if not value:
+        return None
+    try:
+        code = int(value)
+    except ValueError:
+        raise ValueError(f"Item_Code must be a whole number, got {value!r}")
+    if code <= 0:
+        raise ValueError(f"Item_Code must be positive, got {value!r}")
+    return code
+
+def _parse_price(value):
+    if not value:
+        return None
+    cleaned = value.lstrip('£$€').replace(',', '')
+    try:
+        price = Decimal(cleaned)
+    except InvalidOperation:
+        raise ValueError(f"Price must be a number, got {value!r}")
+    if not price.is_finite() or price < 0:
+        raise ValueError(f"Price must be zero or more, got {value!r}")
+    return price
+
+def validate_row(raw, mapping):
+    """
+    Turn one CSV record into a column -> value dict.
+    Blank cells become None. Raises ValueError with a readable message.
+    """
+    row = {}
+    for index, column in mapping:
+        value = raw[index].strip() if index < len(raw) else ''
+        if column == 'Item_Code':
+            row[column] = _parse_code(value)
+        elif column == 'Price':
+            row[column] = _parse_price(value)
+        else:
+            row[column] = value or None
+    return row
+
+def _same(old, new):
+    if old is None or new is None:
+        return old is None and new is None
+    if isinstance(new, Decimal):
+        try:
+            return Decimal(str(old)) == new
+        except InvalidOperation:
+            return False
+    return str(old).strip() == new
+
+#######################################################
+##### IMPORT
+#######################################################
+
+class ImportReport:
+    """Counts and timings for one import run."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.batches = 0
+        self.unmapped_headers = []
+        self.error_path = None
+        self.started_at = time.perf_counter()
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'errors': self.errors,
+            'batches': self.batches,
+            'unmapped_headers': self.unmapped_headers,
+            'error_file': self.error_path,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CsvImporter:
+    """
+    Streams a CSV into equipment_inventory in bounded batches.
+
+    Each batch of rows is validated, diffed against the table by Item_Code
+    (one IN query), and only new or changed rows are written, with one
+    executemany INSERT ... ON DUPLICATE KEY UPDATE committed per batch.
+    Columns missing from the file are left untouched on existing rows. A
+    batch that fails is rolled back and its rows go to the error file; the
+    import carries on with the next batch.
+
+    Rows without an Item_Code are new items. They are spooled to a temporary
+    file and numbered after the main pass, with one allocator reservation
+    per batch. By then every explicit code in the file has been written, and
+    reservations never fall below the table's MAX(Item_Code), so a new item
+    can never land on a code the file sets explicitly.
+
+    Args:
+        connect (callable): Returns a DB connection or None
+        batch_size (int): Rows per diff query and per transaction
+        dry_run (bool): Validate and diff only; write nothing
+        progress (callable): Optional progress(report) called after each batch
+        allocator (HiLoAllocator): Source of new Item_Codes
+    """
+
+    def __init__(self, connect, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None,
+                 allocator=None):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.allocator = allocator
+        self.table = EQUIPMENT_TABLE
+
+    def run(self, path, error_path=None):
+        """
+        Import the file at path.
+
+        Args:
+            path (str): CSV file with a header row
+            error_path (str): Where to write rejected rows (default: <path>.errors.csv)
+
+        Returns:
+            ImportReport
+        """
+        report = ImportReport()
+        error_path = error_path or f"{path}.errors.csv"
+        conn = self.connect()
+        if not conn:
+            raise RuntimeError("Failed to connect to database")
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as source, \
+                    open(error_path, 'w', newline='', encoding='utf-8') as errors:
+                reader = csv.reader(source)
+                headers = next(reader, None)
+                if headers is None:
+                    raise ValueError("File is empty")
+                mapping, report.unmapped_headers = map_columns(headers)
+                columns = [column for _, column in mapping]
+                if 'Item_Code' not in columns:
+                    columns.insert(0, 'Item_Code')
+                error_writer = csv.writer(errors)
+                error_writer.writerow(['line', 'error'] + headers)
+
+                with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as spool:
+                    spool_writer = csv.writer(spool)
+                    batch = []
+                    for raw in reader:
+                        if not any(cell.strip() for cell in raw):
+                            continue
+                        report.rows_read += 1
+                        line = reader.line_num
+                        try:
+                            row = validate_row(raw, mapping)
+                        except ValueError as e:
+                            report.errors += 1
+                            error_writer.writerow([line, str(e)] + raw)
+                            continue
+                        if row.get('Item_Code') is None:
+                            spool_writer.writerow([line] + raw)
+                            continue
+                        batch.append((line, raw, row))
+                        if len(batch) >= self.batch_size:
+                            self._apply(conn, batch, columns, report, error_writer)
+                            batch = []
+                    if batch:
+                        self._apply(conn, batch, columns, report, error_writer)
+
+                    # New items, numbered now that every explicit code is known
+                    spool.seek(0)
+                    batch = []
+                    for record in csv.reader(spool):
+                        batch.append((int(record[0]), record[1:],
+                                      validate_row(record[1:], mapping)))
+                        if len(batch) >= self.batch_size:
+                            self._apply(conn, batch, columns, report, error_writer, new=True)
+                            batch = []
+                    if batch:
+                        self._apply(conn, batch, columns, report, error_writer, new=True)
+        finally:
+            conn.close()
+
+        report.seconds = time.perf_counter() - report.started_at
+        if report.errors:
+            report.error_path = error_path
+        else:
+            os.remove(error_path)
+        return report
+
+    def _existing(self, cursor, codes, columns):
+        if not codes:
+            return {}
+        placeholders = ', '.join(['%s'] * len(codes))
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {self.table.name} "
+                       f"WHERE {self.table.key} IN ({placeholders})", list(codes))
+        return {row[self.table.key]: row for row in cursor.fetchall()}
+
+    def _upsert_sql(self, columns):
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns
+                            if column != self.table.key)
+        return (f"INSERT INTO {self.table.name} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+    def _apply(self, conn, batch, columns, report, error_writer, new=False):
+        report.batches += 1
+        # A code repeated within the batch: the last row wins
+        if new:
+            latest = {entry[0]: entry for entry in batch}
+        else:
+            latest = {entry[2]['Item_Code']: entry for entry in batch}
+        try:
+            with conn.cursor() as cursor:
+                existing = {} if new else self._existing(cursor, list(latest), columns)
+                if new and not self.dry_run:
+                    new_codes = iter(self.allocator.reserve(len(latest)))
+                params = []
+                written = []
+                inserted = updated = unchanged = 0
+                for key, (_, _, row) in latest.items():
+                    old = existing.get(key)
+                    if old is None:
+                        if new:
+                            row['Item_Code'] = None if self.dry_run else next(new_codes)
+                        inserted += 1
+                    elif all(_same(old.get(column), row.get(column)) for column in columns
+                             if column != 'Item_Code'):
+                        unchanged += 1
+                        continue
+                    else:
+                        updated += 1
+                    params.append([row.get(column) for column in columns])
+                    written.append(row['Item_Code'])
+                unchanged += len(batch) - len(latest)
+                if params and not self.dry_run:
+                    cursor.executemany(self._upsert_sql(columns), params)
+            if not self.dry_run:
+                conn.commit()
+        except Exception as e:
+            if not self.dry_run:
+                conn.rollback()
+            print(f"Import batch error: {e}")
+            report.errors += len(batch)
+            for line, raw, _ in batch:
+                error_writer.writerow([line, f"Batch failed: {e}"] + raw)
+        else:
+            report.inserted += inserted
+            report.updated += updated
+            report.unchanged += unchanged
+            if written and not self.dry_run:
+                from db_equipment_inventory import note_committed
+                note_committed(written)
+        if self.progress:
+            report.seconds = time.perf_counter() - report.started_at
+            self.progress(report)
+
+
+def import_csv(path, error_path=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False,
+               progress=None):
+    """Import a CSV into equipment_inventory. Returns an ImportReport."""
+    from db_equipment_inventory import connect_to_db
+    from id_allocator import get_item_code_allocator
+    importer = CsvImporter(connect_to_db, batch_size=batch_size, dry_run=dry_run,
+                           progress=progress, allocator=get_item_code_allocator())
+    return importer.run(path, error_path)
+
+
+# Run from the command line: python bulk_import.py data/Stock.csv
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Bulk import a CSV into equipment_inventory")
+    parser.add_argument('path', help="CSV file with a header row")
+    parser.add_argument('--errors', help="File for rejected rows (default: <path>.errors.csv)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Validate and diff without writing")
+    args = parser.parse_args()
+
+    def show_progress(report):
+        print(f"{report.rows_read} rows, {report.rows_per_second:.0f} rows/s, "
+              f"{report.errors} errors", file=sys.stderr)
+
+    result = import_csv(args.path, args.errors, args.batch_size, args.dry_run, show_progress)
+    print(json.dumps(result.as_dict(), indent=2))
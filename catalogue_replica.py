@@ -0,0 +1,500 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from catalogue_repository import CatalogueRepository
+from request_metrics import TimedCursor
+from env_cred import catalogue_replica_path, catalogue_replica_refresh, catalogue_replica_max_staleness
+
+# Terms at least this long (and free of LIKE wildcards) are matched through the
+# trigram full-text index; shorter ones fall back to a LIKE scan
+FTS_MIN_TERM_LENGTH = 3
+
+# Seconds reads stay on MySQL after a replica query or resync failed
+FAILURE_BACKOFF = 30.0
+
+# Columns stored as text and handed back as Decimal, as PyMySQL would
+_DECIMAL_COLUMNS = ('Price',)
+
+#######################################################
+##### SQLITE CONNECTIONS
+#######################################################
+
+def _dict_row(cursor, row):
+    record = {column[0]: value for column, value in zip(cursor.description, row)}
+    for column in _DECIMAL_COLUMNS:
+        value = record.get(column)
+        if value is not None:
+            record[column] = Decimal(value)
+    return record
+
+
+class _ReplicaCursor:
+    """DictCursor-like wrapper that accepts the repository's %s placeholders."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        return self._cursor.execute(sql.replace('%s', '?'), params or ())
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _ReplicaConnection:
+    """
+    Stands in for a pooled MySQL connection on the read path. The SQLite
+    connection underneath belongs to the calling thread and stays open, so
+    close() and invalidate() do nothing.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, cursorclass=None):
+        return TimedCursor(_ReplicaCursor(self._conn.cursor()))
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def invalidate(self):
+        pass
+
+#######################################################
+##### REPOSITORY
+#######################################################
+
+class ReplicaRepository(CatalogueRepository):
+    """
+    CatalogueRepository over the SQLite replica. Free-text terms go through
+    the FTS5 trigram index, which matches substrings case-insensitively just
+    like the LIKE '%term%' predicate it replaces. A failed query takes the
+    replica out of rotation for FAILURE_BACKOFF seconds.
+    """
+
+    def __init__(self, replica):
+        super().__init__(replica.table, replica.connect)
+        self.replica = replica
+
+    def _term_mode(self, search_term):
+        if not search_term:
+            return False
+        if len(search_term) >= FTS_MIN_TERM_LENGTH and not set(search_term) & {'%', '_'}:
+            return 'fts'
+        return True
+
+    def _term_condition(self, mode):
+        if mode == 'fts':
+            fts = self.replica.fts_table
+            return f"{self.table.key} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)"
+        return super()._term_condition(mode)
+
+    def _term_params(self, search_term, mode):
+        if mode == 'fts':
+            # One quoted phrase: every trigram of the term, in order
+            return ['"' + search_term.replace('"', '""') + '"']
+        return super()._term_params(search_term, mode)
+
+    def _run(self, statements):
+        records = super()._run(statements)
+        if records is None:
+            self.replica.mark_failed()
+        return records
+
+#######################################################
+##### REPLICA
+#######################################################
+
+class CatalogueReplica:
+    """
+    Local read-only copy of a catalogue table in an SQLite file.
+
+    A background thread mirrors the table from MySQL every refresh seconds,
+    writing only rows that changed; writes made through the app resync just
+    their codes straight after commit (sync_codes), so reads never lag the
+    app's own writes. The file is in WAL mode: readers never wait for a
+    sync, and gunicorn workers on one host share it through the page cache.
+    Only one process runs a full sync at a time (an flock on <path>.lock),
+    and a worker skips its turn when another synced recently. SQLite's own
+    locking orders the targeted resyncs.
+
+    Reads are served while the last full sync is at most max_staleness
+    seconds old, including while MySQL is unreachable.
+
+    Args:
+        path (str): SQLite file (created on first sync)
+        source (CatalogueRepository): The MySQL repository being mirrored
+        refresh (float): Seconds between full syncs
+        max_staleness (float): Age after which reads go back to MySQL
+    """
+
+    def __init__(self, path, source, refresh=300.0, max_staleness=3600.0):
+        self.path = path
+        self.source = source
+        self.table = source.table
+        self.refresh = refresh
+        self.max_staleness = max_staleness
+        self.fts_table = f"{self.table.name}_fts"
+        self.columns = self.table.projections['full']
+        self.repository = ReplicaRepository(self)
+        self._local = threading.local()
+        self._thread_lock = threading.Lock()
+        self._failed_at = None
+        self._thread_pid = None
+        self._last_sync = None
+        # Last full sync as last read from the file, and when it was read
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    #######################################################
+    ##### READS
+
+    def connect(self):
+        """This thread's read connection, or None if the file does not exist yet."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return _ReplicaConnection(conn)
+        if not os.path.exists(self.path):
+            return None
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = _dict_row
+            conn.execute("PRAGMA query_only = ON")
+        except sqlite3.Error as e:
+            print(f"Error opening catalogue replica: {e}")
+            return None
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return _ReplicaConnection(conn)
+
+    def synced_at(self):
+        """Time of the last full sync by any process, or None."""
+        conn = self.connect()
+        if conn is None:
+            return None
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT value FROM replica_meta WHERE name = 'synced_at'")
+                rows = cursor.fetchall()
+            return float(rows[0]['value']) if rows else None
+        except sqlite3.Error:
+            # Not created yet
+            return None
+
+    @property
+    def ready(self):
+        """
+        True if reads should be served from the replica. Checked on every
+        read, so it works from the in-memory copy of synced_at, going back
+        to the file (at most once a second) only while that copy is missing
+        or too old, in case another process synced since.
+        """
+        self._ensure_syncer()
+        now = time.time()
+        if self.failed:
+            return False
+        synced_at = self._synced_at
+        if (synced_at is None or now - synced_at > self.max_staleness) and now - self._checked_at >= 1.0:
+            self._checked_at = now
+            synced_at = self._synced_at = self.synced_at()
+        return synced_at is not None and now - synced_at <= self.max_staleness
+
+    @property
+    def failed(self):
+        """True while reads are kept on MySQL after a failure."""
+        return self._failed_at is not None and time.time() - self._failed_at < FAILURE_BACKOFF
+
+    def mark_failed(self):
+        """Send reads back to MySQL for a while."""
+        self._failed_at = time.time()
+
+    def status(self):
+        synced_at = self.synced_at()
+        return {
+            'path': self.path,
+            'ready': self.ready,
+            'age_seconds': round(time.time() - synced_at, 3) if synced_at else None,
+            'last_sync': self._last_sync,
+            'refresh': self.refresh,
+        }
+
+    #######################################################
+    ##### WRITES
+
+    @contextmanager
+    def _writer(self, exclusive=False):
+        """
+        A write connection. With exclusive, also take an inter-process lock
+        (without waiting) and yield None if another process holds it.
+        """
+        lock_file = None
+        if exclusive:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            if fcntl is not None:
+                lock_file = open(f"{self.path}.lock", 'w')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    yield None
+                    return
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._create_schema(conn)
+            yield conn
+        finally:
+            conn.close()
+            if lock_file is not None:
+                lock_file.close()
+
+    def _create_schema(self, conn):
+        table = self.table
+        columns = ', '.join(f"{column} INTEGER PRIMARY KEY" if column == table.key else
+                            f"{column} TEXT" for column in self.columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table.name} ({columns})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table.name}_{table.category_column} "
+                     f"ON {table.name} ({table.category_column})")
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5(
+                {', '.join(table.search_columns)},
+                content='{table.name}', content_rowid='{table.key}', tokenize='trigram'
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS replica_meta (name TEXT PRIMARY KEY, value TEXT)")
+        # Codes resynced after a write, so a full sync that read MySQL
+        # before that write does not put the old row back
+        conn.execute("CREATE TABLE IF NOT EXISTS replica_writes "
+                     "(code INTEGER PRIMARY KEY, synced_at REAL)")
+        # Before any rows can be written, so a resync that lands before the
+        # first full sync is indexed too
+        self._create_triggers(conn)
+
+    def _create_triggers(self, conn):
+        """Keep the external-content FTS table in step with row changes."""
+        table, fts = self.table, self.fts_table
+        searched = ', '.join(table.search_columns)
+        new = ', '.join(f"new.{column}" for column in table.search_columns)
+        old = ', '.join(f"old.{column}" for column in table.search_columns)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_ai AFTER INSERT ON {table.name} BEGIN
+                INSERT INTO {fts} (rowid, {searched}) VALUES (new.{table.key}, {new});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_ad AFTER DELETE ON {table.name} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {searched}) VALUES ('delete', old.{table.key}, {old});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table.name}_au AFTER UPDATE ON {table.name} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {searched}) VALUES ('delete', old.{table.key}, {old});
+                INSERT INTO {fts} (rowid, {searched}) VALUES (new.{table.key}, {new});
+            END
+        """)
+
+    def _drop_triggers(self, conn):
+        for suffix in ('ai', 'ad', 'au'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {self.table.name}_{suffix}")
+
+    def _upsert_sql(self):
+        updates = ', '.join(f"{column} = excluded.{column}" for column in self.columns
+                            if column != self.table.key)
+        return (f"INSERT INTO {self.table.name} ({', '.join(self.columns)}) "
+                f"VALUES ({', '.join(['?'] * len(self.columns))}) "
+                f"ON CONFLICT ({self.table.key}) DO UPDATE SET {updates}")
+
+    def _row(self, record):
+        # Everything but the key is stored as text, so a Decimal keeps its
+        # exact digits and compares equal on the next sync
+        row = record.as_row()
+        key = self.table.key
+        return tuple(row[column] if column == key or row[column] is None else str(row[column])
+                     for column in self.columns)
+
+    def sync(self, force=False):
+        """
+        Mirror the whole table from MySQL, writing only the differences.
+
+        Returns:
+            dict: Counts of rows written and deleted, or None if the sync was
+            skipped (another process is syncing or synced recently) or failed
+        """
+        started = time.time()
+        if not force:
+            synced_at = self.synced_at()
+            if synced_at is not None and started - synced_at < self.refresh / 2:
+                return None
+        with self._writer(exclusive=True) as conn:
+            if conn is None:
+                return None
+            records = self.source.list_all(view='full')
+            if records is None:
+                print("Catalogue replica sync skipped: could not read MySQL")
+                return None
+            table, key = self.table, self.table.key
+            existing = {row[0]: row for row in
+                        conn.execute(f"SELECT {', '.join(self.columns)} FROM {table.name}")}
+            rows = [self._row(record) for record in records]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                recent = {code for (code,) in conn.execute(
+                    "SELECT code FROM replica_writes WHERE synced_at >= ?", (started,))}
+                first_sync = conn.execute(
+                    "SELECT 1 FROM replica_meta WHERE name = 'synced_at'").fetchone() is None
+                if not existing:
+                    # First load: bulk insert without the per-row triggers,
+                    # then index the text in one pass (below)
+                    self._drop_triggers(conn)
+                    conn.executemany(f"INSERT INTO {table.name} ({', '.join(self.columns)}) "
+                                     f"VALUES ({', '.join(['?'] * len(self.columns))})", rows)
+                    self._create_triggers(conn)
+                    changed = rows
+                    removed = []
+                else:
+                    changed = [row for row in rows
+                               if existing.get(row[0]) != row and row[0] not in recent]
+                    seen = {row[0] for row in rows}
+                    removed = [(code,) for code in existing
+                               if code not in seen and code not in recent]
+                    conn.executemany(self._upsert_sql(), changed)
+                    conn.executemany(f"DELETE FROM {table.name} WHERE {key} = ?", removed)
+                if first_sync:
+                    # Also repairs a file whose rows were written before the
+                    # triggers existed
+                    conn.execute(f"INSERT INTO {self.fts_table} ({self.fts_table}) VALUES ('rebuild')")
+                conn.execute("DELETE FROM replica_writes WHERE synced_at < ?", (started,))
+                conn.execute("INSERT OR REPLACE INTO replica_meta (name, value) "
+                             "VALUES ('synced_at', ?)", (str(started),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._failed_at = None
+        self._synced_at = started
+        self._last_sync = {
+            'at': started,
+            'rows': len(rows),
+            'written': len(changed),
+            'deleted': len(removed),
+            'seconds': round(time.time() - started, 3),
+        }
+        return self._last_sync
+
+    def sync_codes(self, codes):
+        """
+        Re-read the given codes from MySQL into the replica, after a write.
+        If that fails, reads go to MySQL until the next full sync.
+
+        Returns:
+            bool: True if the replica now holds the committed rows
+        """
+        if not os.path.exists(self.path):
+            return False
+        records = self.source.get_many(codes, view='full')
+        if records is None:
+            self.mark_failed()
+            return False
+        found = {record.Code for record in records}
+        missing = [(int(code),) for code in codes if int(code) not in found]
+        now = time.time()
+        try:
+            with self._writer() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(self._upsert_sql(), [self._row(record) for record in records])
+                    conn.executemany(f"DELETE FROM {self.table.name} WHERE {self.table.key} = ?",
+                                     missing)
+                    conn.executemany("INSERT OR REPLACE INTO replica_writes (code, synced_at) "
+                                     "VALUES (?, ?)", [(code, now) for code in found] + [
+                                         (code, now) for (code,) in missing])
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            print(f"Error resyncing catalogue replica: {e}")
+            self.mark_failed()
+            return False
+        return True
+
+    #######################################################
+    ##### BACKGROUND SYNC
+
+    def _ensure_syncer(self):
+        pid = os.getpid()
+        if self._thread_pid == pid or self.refresh <= 0:
+            return
+        with self._thread_lock:
+            if self._thread_pid != pid:
+                # Threads do not survive a fork; each worker runs its own
+                self._thread_pid = pid
+                threading.Thread(target=self._run, name='catalogue-replica-sync',
+                                 daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing catalogue replica: {e}")
+            time.sleep(self.refresh)
+
+#######################################################
+##### PROCESS-WIDE REPLICA
+#######################################################
+
+_replica = None
+_replica_lock = threading.Lock()
+
+def get_catalogue_replica():
+    """The equipment_inventory replica, or None unless CATALOGUE_REPLICA_PATH is set."""
+    global _replica
+    if not catalogue_replica_path:
+        return None
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                from db_equipment_inventory import equipment_repository
+                _replica = CatalogueReplica(
+                    catalogue_replica_path, equipment_repository,
+                    refresh=float(catalogue_replica_refresh) if catalogue_replica_refresh else 300.0,
+                    max_staleness=(float(catalogue_replica_max_staleness)
+                                   if catalogue_replica_max_staleness else 3600.0),
+                )
+    return _replica
+
+
+# Run directly to build or refresh the replica file once
+if __name__ == "__main__":
+    replica = get_catalogue_replica()
+    if replica is None:
+        print("Set CATALOGUE_REPLICA_PATH to the SQLite file to build")
+    else:
+        print(replica.sync(force=True))
@@ -0,0 +1,303 @@
+import pymysql
+
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, make_page
+from models import EquipmentItem, ProductItem
+
+#######################################################
+##### TABLE DEFINITIONS
+#######################################################
+
+class CatalogueTable:
+    """
+    Describes one catalogue table to the repository.
+
+    Args:
+        name (str): Table name
+        key (str): Integer primary key column, used for lookups and keyset paging
+        record (type): Record class with a from_row(row) classmethod
+        projections (dict): View name -> tuple of columns that view needs
+        search_columns (tuple): Columns matched by the free-text LIKE search
+        category_column (str): Column matched by the category filter
+        active_column (str): Optional flag column; only rows with it = 1 are served
+    """
+
+    def __init__(self, name, key, record, projections, search_columns, category_column,
+                 active_column=None):
+        self.name = name
+        self.key = key
+        self.record = record
+        self.projections = projections
+        self.search_columns = search_columns
+        self.category_column = category_column
+        self.active_column = active_column
+
+
+_EQUIPMENT_LISTING = ('Item_Code', 'Category_Description', 'Price', 'Category')
+_EQUIPMENT_ALL = ('Item_Code', 'Category', 'Sub_Category', 'Category_Description', 'Make',
+                  'Model', 'Certification', 'Specification', 'Location', 'Price')
+
+EQUIPMENT_TABLE = CatalogueTable(
+    name='equipment_inventory',
+    key='Item_Code',
+    record=EquipmentItem,
+    projections={
+        'search': _EQUIPMENT_LISTING,
+        'admin': _EQUIPMENT_LISTING,
+        'enquiry': _EQUIPMENT_LISTING,
+        'detail': _EQUIPMENT_ALL,
+        'full': _EQUIPMENT_ALL,
+    },
+    search_columns=('Category_Description', 'Make'),
+    category_column='Category',
+)
+
+_PRODUCT_LISTING = ('ID', 'product', 'quantity', 'category')
+
+PRODUCTS_TABLE = CatalogueTable(
+    name='products',
+    key='ID',
+    record=ProductItem,
+    projections={
+        'search': _PRODUCT_LISTING,
+        'admin': _PRODUCT_LISTING,
+        'enquiry': _PRODUCT_LISTING,
+        'detail': _PRODUCT_LISTING,
+        'full': _PRODUCT_LISTING,
+    },
+    search_columns=('product', 'ID'),
+    category_column='category',
+    active_column='active',
+)
+
+#######################################################
+##### REPOSITORY
+#######################################################
+
+# Largest IN list sent in one statement
+IN_CHUNK_SIZE = 512
+
+def normalise_codes(codes):
+    """
+    Coerce raw codes (e.g. form values) to ints, dropping duplicates and
+    anything non-numeric, while keeping the caller's order.
+    """
+    normalised = []
+    for code in codes:
+        try:
+            normalised.append(int(str(code).strip()))
+        except ValueError:
+            print(f"Ignoring invalid item code: {code!r}")
+    return list(dict.fromkeys(normalised))
+
+def in_list_size(n):
+    """Round an IN list length up to a power of two so few SQL shapes exist."""
+    size = 8
+    while size < n:
+        size *= 2
+    return min(size, IN_CHUNK_SIZE)
+
+
+class CatalogueRepository:
+    """
+    Read access to one catalogue table through per-view projections.
+
+    Each view selects only the columns it needs, the active-row filter runs
+    in SQL, and the SQL text for every query shape is built once and reused.
+
+    Args:
+        table (CatalogueTable): Table being served
+        connect (callable): Returns a connection (pooled) or None on failure
+    """
+
+    def __init__(self, table, connect):
+        self.table = table
+        self.connect = connect
+        self._sql_cache = {}
+
+    #######################################################
+    ##### SQL SHAPES
+
+    def _sql(self, view, has_term=False, has_category=False, direction=None,
+             paged=False, in_size=0, ordered=True):
+        shape = (view, has_term, has_category, direction, paged, in_size, ordered)
+        sql = self._sql_cache.get(shape)
+        if sql is None:
+            sql = self._sql_cache[shape] = self._build_sql(*shape)
+        return sql
+
+    def _build_sql(self, view, has_term, has_category, direction, paged, in_size, ordered):
+        table = self.table
+        sql = f"SELECT {', '.join(table.projections[view])} FROM {table.name}"
+        conditions = []
+        if table.active_column:
+            conditions.append(f"{table.active_column} = 1")
+        if has_term:
+            conditions.append(self._term_condition(has_term))
+        if has_category:
+            conditions.append(f"{table.category_column} = %s")
+        if in_size:
+            conditions.append(f"{table.key} IN ({', '.join(['%s'] * in_size)})")
+        if direction == 'next':
+            conditions.append(f"{table.key} > %s")
+        elif direction == 'prev':
+            conditions.append(f"{table.key} < %s")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if ordered:
+            sql += f" ORDER BY {table.key} {'DESC' if direction == 'prev' else 'ASC'}"
+        if paged:
+            sql += " LIMIT %s"
+        return sql
+
+    def statement(self, view, **shape):
+        """
+        SQL text for a query shape (the keyword arguments of _sql), for
+        callers that execute it on another driver, e.g. async_app.
+        """
+        return self._sql(view, **shape)
+
+    def _term_mode(self, search_term):
+        """
+        Which free-text predicate a term needs; part of the query shape.
+        Falsy without a term. Subclasses with more than one way to match
+        a term return a different value for each.
+        """
+        return bool(search_term)
+
+    def _term_condition(self, mode):
+        return "(" + " OR ".join(
+            f"UPPER({column}) LIKE UPPER(%s)" for column in self.table.search_columns
+        ) + ")"
+
+    def _term_params(self, search_term, mode):
+        return [f"%{search_term}%"] * len(self.table.search_columns)
+
+    def _filter_params(self, search_term, category):
+        params = []
+        if search_term:
+            params.extend(self._term_params(search_term, self._term_mode(search_term)))
+        if category:
+            params.append(category)
+        return params
+
+    #######################################################
+    ##### EXECUTION
+
+    def _run(self, statements):
+        """
+        Execute (sql, params) statements on one connection.
+        Returns the records from all of them, or None if anything failed.
+        """
+        conn = self.connect()
+        if not conn:
+            print("Failed to connect to database")
+            return None
+        try:
+            rows = []
+            with conn.cursor() as cursor:
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                    rows.extend(cursor.fetchall())
+            from_row = self.table.record.from_row
+            return [from_row(row) for row in rows]
+        except Exception as e:
+            print(f"Query error: {e}")
+            return None
+        finally:
+            conn.close()
+
+    #######################################################
+    ##### VIEWS
+
+    def search(self, search_term='', category='', view='search'):
+        """All matching records in key order."""
+        sql = self._sql(view, self._term_mode(search_term), bool(category))
+        return self._run([(sql, self._filter_params(search_term, category))]) or []
+
+    def search_page(self, search_term='', category='', cursor=None, limit=DEFAULT_PAGE_SIZE,
+                    view='search'):
+        """One keyset page of matching records. Returns a pagination.Page."""
+        direction, key = decode_cursor(cursor)
+        if not isinstance(key, int):
+            direction = key = None
+        sql = self._sql(view, self._term_mode(search_term), bool(category), direction, paged=True)
+        params = self._filter_params(search_term, category)
+        if direction:
+            params.append(key)
+        params.append(limit + 1)
+        records = self._run([(sql, params)])
+        if records is None:
+            return make_page([], [], limit, None)
+        if direction == 'prev':
+            records.reverse()
+        return make_page(records, [record.Code for record in records], limit, direction)
+
+    def list_all(self, view='admin'):
+        """Every record in key order, or None if the query failed."""
+        return self._run([(self._sql(view), [])])
+
+    def list_page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, view='admin'):
+        """One keyset page of every record. Returns a pagination.Page."""
+        return self.search_page('', '', cursor, limit, view)
+
+    def iter_all(self, view='admin', batch_size=1000, search_term='', category=''):
+        """
+        Stream every record with an unbuffered server-side cursor, so memory
+        stays flat however large the table is. search_term and category
+        filter with the same predicates as search().
+        """
+        conn = self.connect()
+        if not conn:
+            print("Failed to connect to database")
+            return
+
+        # Not a with-block: closing an unbuffered cursor reads the rest of the
+        # result, which is exactly what an abandoned stream must not do
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        from_row = self.table.record.from_row
+        finished = False
+        try:
+            cursor.execute(self._sql(view, self._term_mode(search_term), bool(category)),
+                           self._filter_params(search_term, category))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield from_row(row)
+            finished = True
+        except Exception as e:
+            print(f"Query error: {e}")
+        finally:
+            if finished:
+                cursor.close()
+                conn.close()
+            else:
+                # Drop the connection rather than drain an abandoned result
+                conn.invalidate()
+
+    def get(self, code, view='detail'):
+        """One record by key, or None."""
+        records = self._run([(self._sql(view, in_size=1, ordered=False), [code])])
+        return records[0] if records else None
+
+    def get_many(self, codes, view='enquiry'):
+        """
+        Records for the given codes in the order given, with one IN query per
+        chunk. Returns None if a query failed.
+        """
+        codes = normalise_codes(codes)
+        if not codes:
+            return []
+        statements = []
+        for start in range(0, len(codes), IN_CHUNK_SIZE):
+            chunk = codes[start:start + IN_CHUNK_SIZE]
+            size = in_list_size(len(chunk))
+            # Pad with a repeat so the statement matches a cached shape
+            params = chunk + [chunk[-1]] * (size - len(chunk))
+            statements.append((self._sql(view, in_size=size, ordered=False), params))
+        records = self._run(statements)
+        if records is None:
+            return None
+        by_code = {record.Code: record for record in records}
+        return [by_code[code] for code in codes if code in by_code]
@@ -1,7 +1,15 @@
-import pymysql
-import pandas as pd
 import os
+import functools
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from env_cred import host, user, password, db, port  # Import from env_cred.py
+from env_cred import mysql_primary_dsn, mysql_replica_dsns, db_read_your_writes_seconds
+from env_cred import db_replica_max_failures, db_replica_eject_seconds
+from db_pool import get_pool
+from db_router import Backend, ReplicaRouter, parse_dsn, parse_dsn_list, reading_from_primary
+from pymysql.err import IntegrityError
+from pagination import DEFAULT_PAGE_SIZE
+from catalogue_repository import CatalogueRepository, EQUIPMENT_TABLE, normalise_codes
+from catalogue_repository import IN_CHUNK_SIZE, in_list_size
 
 # Define the base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,22 +19,50 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ##### CONFIG AND CONNECTIONS
 #######################################################
 
+# The primary: MYSQL_PRIMARY_DSN if set, otherwise the MYSQL_* variables
+DB_CONFIG = parse_dsn(mysql_primary_dsn) if mysql_primary_dsn else {
+    'host': host,
+    'user': user,
+    'password': password,
+    'database': db,
+    'port': int(port) if port else 3306,
+}
+
+# Read replicas from MYSQL_REPLICA_DSNS (comma-separated mysql:// DSNs)
+REPLICA_CONFIGS = parse_dsn_list(mysql_replica_dsns)
+
 def connect_to_db():
-    """Connect to the database using environment variables."""
+    """
+    Check out a pooled connection to the primary using environment variables.
+    Calling close() on it returns it to the pool. Writes always use this.
+    """
     try:
-        connection = pymysql.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=db,
-            port=int(port) if port else 3306,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
+        return get_pool('equipment_inventory', DB_CONFIG).connect()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
+def _connect_replica(index):
+    # Raises on failure, so the router can count it against the replica
+    return get_pool(f'equipment_inventory_replica_{index}', REPLICA_CONFIGS[index]).connect()
+
+read_router = ReplicaRouter(
+    Backend('primary', connect_to_db),
+    [Backend(f'replica-{index}', functools.partial(_connect_replica, index))
+     for index in range(len(REPLICA_CONFIGS))],
+    sticky_seconds=float(db_read_your_writes_seconds) if db_read_your_writes_seconds else 5.0,
+    max_failures=int(db_replica_max_failures) if db_replica_max_failures else 2,
+    eject_seconds=float(db_replica_eject_seconds) if db_replica_eject_seconds else 30.0,
+)
+
+def connect_for_read():
+    """
+    Check out a pooled connection for a read: a healthy replica in
+    round-robin order, or the primary when there are none, none are
+    reachable, or this session wrote within the read-your-writes window.
+    """
+    return read_router.connect_read()
+
 def test_connection():
     """Test the database connection and return a sample query result."""
     conn = connect_to_db()
@@ -57,55 +93,81 @@ def test_connection():
 ##### CLIENT SEARCH PAGE
 #######################################################
 
+# Reads go through the shared catalogue repository: per-view column
+# projections and SQL text built once per query shape, on read connections
+equipment_repository = CatalogueRepository(EQUIPMENT_TABLE, connect_for_read)
+
+def _read(query):
+    """
+    Run query(repository) against the local SQLite replica when one is
+    configured and in sync, otherwise (or if the replica query fails)
+    against MySQL.
+    """
+    from catalogue_replica import get_catalogue_replica
+    replica = get_catalogue_replica()
+    if replica is not None and replica.ready:
+        result = query(replica.repository)
+        # A failed replica query marks it failed
+        if not replica.failed:
+            return result
+    return query(equipment_repository)
+
+def note_committed(codes):
+    """
+    Call after a commit touching these item codes: pin this session's reads
+    to the primary for the read-your-writes window, resync the codes into
+    the local replica, then mark them dirty in the inventory snapshot (whose
+    reload may read from the replica).
+    """
+    read_router.note_write()
+    from catalogue_replica import get_catalogue_replica
+    replica = get_catalogue_replica()
+    if replica is not None:
+        replica.sync_codes(codes)
+    from inventory_cache import note_write
+    note_write(codes)
+
 def search_products(search_term='', category=''):
     """
     Search products based on search term and/or category.
-    Returns a pandas DataFrame with the results.
+    Returns a list of EquipmentItem records.
     """
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to database")
-        return pd.DataFrame(columns=['ID', 'Code', 'Description', 'Price', 'Type', 'ImageUrl'])
-    
-    try:
-        with conn.cursor() as cursor:
-            # Base query
-            sql = "SELECT * FROM equipment_inventory WHERE 1=1"  # 1=1 allows for flexible WHERE clause building
-            params = []
-            
-            # Add search term condition if provided
-            if search_term:
-                sql += " AND (UPPER(Category_Description) LIKE UPPER(%s) OR UPPER(Make) LIKE UPPER(%s))"
-                search_param = f"%{search_term}%"
-                params.extend([search_param, search_param])
-            
-            # Add category condition if provided
-            if category:
-                sql += " AND category = %s"
-                params.append(category)
-            
-            # Execute query
-            cursor.execute(sql, params)
-            result = cursor.fetchall()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(result)
-            
-            # Rename columns to match the expected format
-            if not df.empty:
-                # Use appropriate column mappings for the equipment_inventory table
-                df = df.rename(columns={
-                    'Item_Code': 'Code',
-                    'Category_Description': 'Description',
-                    'Category': 'Type'
-                })
-                           
-            return df#[['Code', 'Description', 'Price', 'Type', 'ImageUrl']]
-    except Exception as e:
-        print(f"Query error: {e}")
-        return pd.DataFrame(columns=['Code', 'Description', 'Price', 'Type', 'ImageUrl'])
-    finally:
-        conn.close()
+    return _read(lambda repository: repository.search(search_term, category))
+
+def search_products_page(search_term='', category='', cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginated search: one page of matches in Item_Code order.
+    Returns a pagination.Page of EquipmentItem records.
+    """
+    return _read(lambda repository: repository.search_page(search_term, category, cursor, limit))
+
+#######################################################
+##### ENQUIRY PAGE
+#######################################################
+
+def get_items_by_codes(codes):
+    """
+    Fetch only the selected items with one IN query per chunk of codes.
+    Returns a list of EquipmentItem records (listing columns only),
+    in the order the codes were given.
+    """
+    return _read(lambda repository: repository.get_many(codes, view='enquiry')) or []
+
+#######################################################
+##### INVENTORY SNAPSHOT LOADING
+#######################################################
+
+def fetch_inventory_items(codes=None):
+    """
+    Fetch full rows for the whole table, or only for the given item codes.
+    Returns a list of EquipmentItem records ordered by Item_Code, or None if
+    the query failed (so callers can keep serving the copy they already have).
+    """
+    if codes is None:
+        return _read(lambda repository: repository.list_all(view='full'))
+    # Just-written rows: a lagging MySQL replica would put the old version back
+    with reading_from_primary():
+        return _read(lambda repository: repository.get_many(codes, view='full'))
 
 #######################################################
 ##### ADMIN SEARCH AND EDIT PAGES
@@ -114,62 +176,36 @@ def search_products(search_term='', category=''):
 def get_all_products():
     """
     Get all products from the database.
-    Returns a pandas DataFrame with all products.
+    Returns a list of EquipmentItem records (listing columns only).
     """
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to database")
-        return pd.DataFrame(columns=['Code', 'Description', 'Price', 'Type'])
-    
-    try:
-        with conn.cursor() as cursor:
-            # Get all active products
-            sql = "SELECT * FROM equipment_inventory"
-            cursor.execute(sql)
-            result = cursor.fetchall()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(result)
-            # If the query returns column names, assign them as DataFrame columns
-            if cursor.description:
-                df.columns = [desc[0] for desc in cursor.description]            
-            # Rename columns to match the expected format in the app
-            if not df.empty:
-                df = df.rename(columns={
-                    'Item_Code': 'Code',
-                    'Category_Description': 'Description',
-                    'Category': 'Type'
-                })
-            
-            return df[['Code', 'Description', 'Price', 'Type']]
-    except Exception as e:
-        print(f"Query error: {e}")
-        return pd.DataFrame(columns=['Code', 'Description', 'Price', 'Type'])
-    finally:
-        conn.close()
+    return _read(lambda repository: repository.list_all(view='admin')) or []
+
+def get_all_products_page(cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginated get_all_products: one page in Item_Code order.
+    Returns a pagination.Page of EquipmentItem records.
+    """
+    return _read(lambda repository: repository.list_page(cursor, limit, view='admin'))
 
+def iter_all_products(batch_size=1000):
+    """
+    Stream every product with an unbuffered server-side cursor.
+    Yields EquipmentItem records (listing columns) as MySQL sends them,
+    so memory stays flat however large the table is.
+    """
+    return equipment_repository.iter_all(view='admin', batch_size=batch_size)
+
+def iter_inventory_rows(search_term='', category='', batch_size=1000):
+    """
+    Stream full rows (every column) with an unbuffered server-side cursor,
+    optionally filtered like search_products. Used by exports.
+    """
+    return equipment_repository.iter_all(view='full', batch_size=batch_size,
+                                         search_term=search_term, category=category)
 
 def get_item_by_code(item_code):
-    """Fetch a specific item by its code"""
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to database")
-        return pd.DataFrame()
-        
-    try:
-        # Use %s placeholder instead of ? for MySQL
-        query = "SELECT * FROM equipment_inventory WHERE Item_Code = %s"
-        with conn.cursor() as cursor:
-            cursor.execute(query, (item_code,))
-            result = cursor.fetchall()
-            df = pd.DataFrame(result)
-            
-        return df
-    except Exception as e:
-        print(f"Database error: {e}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+    """Fetch a specific item by its code. Returns an EquipmentItem or None."""
+    return _read(lambda repository: repository.get(item_code, view='detail'))
 
 def add_or_update_item(item_data, is_update=False):
     """Add a new item or update an existing item in the database"""
@@ -202,12 +238,14 @@ def add_or_update_item(item_data, is_update=False):
                     item_data['Item_Code']
                 ))
             else:
-                # Add new item - first get the next available Item_Code if not provided
-                if not item_data['Item_Code']:
-                    cursor.execute("SELECT MAX(Item_Code) as max_id FROM equipment_inventory")
-                    result = cursor.fetchone()
-                    next_id = 1 if not result or result['max_id'] is None else result['max_id'] + 1
-                    item_data['Item_Code'] = next_id
+                # Add new item - take the next Item_Code from the hi/lo
+                # allocator if not provided (no MAX() scan, no race between
+                # two admins adding at once)
+                from id_allocator import get_item_code_allocator
+                allocator = get_item_code_allocator()
+                allocated = not item_data['Item_Code']
+                if allocated:
+                    item_data['Item_Code'] = allocator.next_id()
                 
                 # Insert the new item - using %s placeholders for MySQL
                 query = """
@@ -216,20 +254,34 @@ def add_or_update_item(item_data, is_update=False):
                     Make, Model, Certification, Specification, Location, Price
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 """
-                cursor.execute(query, (
-                    item_data['Item_Code'],
-                    item_data['Category'],
-                    item_data['Sub_Category'],
-                    item_data['Category_Description'],
-                    item_data['Make'],
-                    item_data['Model'],
-                    item_data['Certification'],
-                    item_data['Specification'],
-                    item_data['Location'],
-                    item_data['Price']
-                ))
+                def insert():
+                    cursor.execute(query, (
+                        item_data['Item_Code'],
+                        item_data['Category'],
+                        item_data['Sub_Category'],
+                        item_data['Category_Description'],
+                        item_data['Make'],
+                        item_data['Model'],
+                        item_data['Certification'],
+                        item_data['Specification'],
+                        item_data['Location'],
+                        item_data['Price']
+                    ))
+                try:
+                    insert()
+                except IntegrityError:
+                    if not allocated:
+                        raise
+                    # A code inside our block was written by something that
+                    # bypassed the allocator; skip to a fresh block once
+                    allocator.discard_block()
+                    item_data['Item_Code'] = allocator.next_id()
+                    insert()
             
             conn.commit()
+
+            # Resync the replica and snapshot so this worker's next read sees the change
+            note_committed([item_data['Item_Code']])
             return True
         
     except Exception as e:
@@ -242,6 +294,125 @@ def add_or_update_item(item_data, is_update=False):
         if conn:
             conn.close()
 
+#######################################################
+##### BULK EDIT
+#######################################################
+
+# Bulk edit action -> column it writes
+BULK_EDIT_ACTIONS = {
+    'set_price': 'Price',
+    'adjust_price_percent': 'Price',
+    'set_location': 'Location',
+    'set_certification': 'Certification',
+}
+
+def _parse_bulk_value(action, value):
+    """Validate the value for a bulk edit action; raises ValueError."""
+    value = (value or '').strip()
+    if action in ('set_price', 'adjust_price_percent'):
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            raise ValueError(f"{value!r} is not a number")
+        if not number.is_finite():
+            raise ValueError(f"{value!r} is not a number")
+        if action == 'set_price' and number < 0:
+            raise ValueError("Price cannot be negative")
+        if action == 'adjust_price_percent' and number <= -100:
+            raise ValueError("Percentage must be greater than -100")
+        return number
+    if not value:
+        raise ValueError("A value is required")
+    return value
+
+def bulk_update_items(item_codes, action, value):
+    """
+    Apply one edit to many items in one transaction: one locking SELECT and
+    one UPDATE per chunk of up to IN_CHUNK_SIZE codes, whatever the count.
+
+    Args:
+        item_codes (list): Codes of the selected items
+        action (str): One of BULK_EDIT_ACTIONS
+        value (str): New price, percentage, location or certification
+
+    Returns:
+        list: One dict per code with code, ok, message and, when written, new
+    """
+    if action not in BULK_EDIT_ACTIONS:
+        raise ValueError(f"Unknown bulk edit action: {action!r}")
+    parsed = _parse_bulk_value(action, value)
+    column = BULK_EDIT_ACTIONS[action]
+    codes = normalise_codes(item_codes)
+    if not codes:
+        return []
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database")
+        return [{'code': code, 'ok': False, 'message': "Database unavailable"} for code in codes]
+
+    try:
+        with conn.cursor() as cursor:
+            # Lock the selected rows so the percentage is applied to the
+            # price that is actually overwritten
+            current = {}
+            for start in range(0, len(codes), IN_CHUNK_SIZE):
+                chunk = codes[start:start + IN_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"SELECT Item_Code, {column} FROM equipment_inventory "
+                               f"WHERE Item_Code IN ({placeholders}) FOR UPDATE", chunk)
+                current.update((row['Item_Code'], row[column]) for row in cursor.fetchall())
+
+            results = []
+            params = []
+            for code in codes:
+                if code not in current:
+                    results.append({'code': code, 'ok': False, 'message': "Item not found"})
+                    continue
+                if action == 'adjust_price_percent':
+                    try:
+                        old_price = Decimal(str(current[code]))
+                    except InvalidOperation:
+                        results.append({'code': code, 'ok': False,
+                                        'message': f"Current price {current[code]!r} is not a number"})
+                        continue
+                    new_value = (old_price * (100 + parsed) / 100).quantize(
+                        Decimal('0.01'), rounding=ROUND_HALF_UP)
+                else:
+                    new_value = parsed
+                params.append((code, new_value))
+                results.append({'code': code, 'ok': True, 'message': "Updated",
+                                'new': str(new_value)})
+
+            # pymysql's executemany only batches INSERT ... VALUES; an UPDATE
+            # would go as one statement per row. Instead each chunk is one
+            # UPDATE picking the new value per row with CASE.
+            for start in range(0, len(params), IN_CHUNK_SIZE):
+                chunk = params[start:start + IN_CHUNK_SIZE]
+                size = in_list_size(len(chunk))
+                # Pad with a repeat so the statement matches a cached shape
+                chunk = chunk + [chunk[-1]] * (size - len(chunk))
+                cases = ' '.join(['WHEN %s THEN %s'] * size)
+                placeholders = ', '.join(['%s'] * size)
+                cursor.execute(f"UPDATE equipment_inventory SET {column} = CASE Item_Code {cases} END "
+                               f"WHERE Item_Code IN ({placeholders})",
+                               [param for pair in chunk for param in pair] + [code for code, _ in chunk])
+        conn.commit()
+
+        if params:
+            note_committed([code for code, _ in params])
+        return results
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"Database error: {e}")
+        return [{'code': code, 'ok': False, 'message': f"Not saved: {e}"} for code in codes]
+
+    finally:
+        if conn:
+            conn.close()
+
 # Example usage (will run when the script is executed directly)
 if __name__ == "__main__":
     test_connection()
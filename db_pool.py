@@ -0,0 +1,260 @@
+import os
+import time
+import threading
+from collections import deque
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+from env_cred import pool_size, pool_max_overflow, pool_timeout, pool_max_idle
+from request_metrics import TimedCursor, add_time
+import query_log
+
+
+#######################################################
+##### POOL
+#######################################################
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pymysql connection.
+
+    Behaves like the wrapped connection except that close() hands it back to
+    the pool instead of tearing down the socket, so existing
+    `finally: conn.close()` blocks keep working unchanged.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args):
+        # Statement time and rows go into the request's timings and the slow-query log
+        return TimedCursor(self._conn.cursor(*args), self._pool.observe)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn)
+
+    def invalidate(self):
+        """Close the underlying socket and drop it from the pool."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._discard(conn)
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pymysql connections.
+
+    Args:
+        connect_kwargs (dict): Keyword arguments passed to pymysql.connect
+        size (int): Number of idle connections kept open
+        max_overflow (int): Extra connections allowed above size under load
+        timeout (float): Seconds to wait for a free connection before giving up
+        max_idle (float): Idle connections older than this are closed, not reused
+        pre_ping (bool): Ping each connection before handing it out
+    """
+
+    def __init__(self, connect_kwargs, size=5, max_overflow=5, timeout=10.0,
+                 max_idle=300.0, pre_ping=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.pre_ping = pre_ping
+        # Slow statements are EXPLAINed on another connection from this pool
+        self.observe = query_log.observer(self.connect)
+        self._reset()
+
+    def _reset(self):
+        # Called at construction and in a freshly forked child. Sockets
+        # inherited from the parent are abandoned, never closed, because
+        # closing them would send COM_QUIT down the parent's connection.
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._open = 0
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _connect(self):
+        return pymysql.connect(**self.connect_kwargs)
+
+    def connect(self):
+        """
+        Check out a connection.
+
+        Returns:
+            PooledConnection: Call close() on it to return it to the pool
+
+        Raises:
+            PoolTimeout: If the pool is exhausted for longer than the timeout
+        """
+        self._check_pid()
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                conn = None
+                while self._idle:
+                    candidate, released_at = self._idle.pop()
+                    if time.monotonic() - released_at > self.max_idle:
+                        self._open -= 1
+                        _quietly_close(candidate)
+                        continue
+                    conn = candidate
+                    break
+                if conn is None:
+                    if self._open < self.size + self.max_overflow:
+                        self._open += 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeout(
+                                f"No connection available within {self.timeout}s "
+                                f"({self._open} open)"
+                            )
+                        self._cond.wait(remaining)
+                        continue
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            elif self.pre_ping:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._discard(conn)
+                    continue
+            add_time('connect', time.perf_counter() - started)
+            return PooledConnection(self, conn)
+
+    def _release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            # Never hand out a connection with an open transaction: a stale
+            # REPEATABLE READ snapshot would hide other workers' writes.
+            if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        with self._cond:
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if conn is not None:
+            _quietly_close(conn)
+
+    def _discard(self, conn):
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+        _quietly_close(conn)
+
+    def dispose(self):
+        """Close every idle connection. Checked-out connections are unaffected."""
+        self._check_pid()
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            _quietly_close(conn)
+
+    def status(self):
+        """Return a dict of pool counters for monitoring."""
+        with self._cond:
+            return {
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._open - len(self._idle),
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+            }
+
+
+def _quietly_close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+#######################################################
+##### PROCESS-WIDE REGISTRY
+#######################################################
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, connect_kwargs=None):
+    """
+    Return the named pool, creating it on first use.
+
+    connect_kwargs is only consulted when the pool is created, so callers can
+    pass it on every call without re-reading their configuration.
+    """
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            if connect_kwargs is None:
+                raise KeyError(f"Pool '{name}' has not been configured")
+            kwargs = {'cursorclass': pymysql.cursors.DictCursor}
+            kwargs.update(connect_kwargs)
+            pool = ConnectionPool(
+                kwargs,
+                size=int(pool_size) if pool_size else 5,
+                max_overflow=int(pool_max_overflow) if pool_max_overflow else 5,
+                timeout=float(pool_timeout) if pool_timeout else 10.0,
+                max_idle=float(pool_max_idle) if pool_max_idle else 300.0,
+            )
+            _pools[name] = pool
+    return pool
+
+
+def reset_pools():
+    """
+    Forget every inherited connection in a forked worker.
+
+    Registered with os.register_at_fork so gunicorn workers start with empty
+    pools; safe to call again from a post_fork hook.
+    """
+    for pool in list(_pools.values()):
+        pool._reset()
+
+
+def dispose_pools():
+    """Close all idle connections in this process."""
+    for pool in list(_pools.values()):
+        pool.dispose()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_pools)
@@ -1,13 +1,15 @@
-import pymysql
-import pandas as pd
 from configparser import ConfigParser
+import functools
 import os
+from db_pool import get_pool
+from catalogue_repository import CatalogueRepository, PRODUCTS_TABLE
 
 # Define the base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+@functools.lru_cache(maxsize=None)
 def get_db_config():
-    """Read database configuration from config file."""
+    """Read database configuration from config file (once per process)."""
     config = ConfigParser()
     config_path = os.path.join(BASE_DIR, 'config.ini')
 
@@ -29,18 +31,19 @@ def get_db_config():
     }
 
 def connect_to_db():
-    """Connect to the database using configuration values."""
+    """
+    Check out a pooled connection using configuration values.
+    Calling close() on it returns it to the pool.
+    """
     try:
         config = get_db_config()
-        connection = pymysql.connect(
-            host=config['host'],
-            user=config['user'],
-            password=config['password'],
-            database=config['db'],
-            port=config['port'],
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
+        return get_pool('products', {
+            'host': config['host'],
+            'user': config['user'],
+            'password': config['password'],
+            'database': config['db'],
+            'port': config['port'],
+        }).connect()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
@@ -71,98 +74,23 @@ def test_connection():
         print("Failed to connect to database")
         return False
 
+# Reads go through the shared catalogue repository: per-view column
+# projections, active = 1 filtered in SQL, SQL text built once per query shape
+products_repository = CatalogueRepository(PRODUCTS_TABLE, connect_to_db)
+
 def search_products(search_term='', category=''):
     """
-    Search products based on search term and/or category.
-    Returns a pandas DataFrame with the results.
+    Search active products based on search term and/or category.
+    Returns a list of ProductItem records.
     """
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to database")
-        return pd.DataFrame(columns=['ID', 'product', 'quantity', 'category', 'active'])
-    
-    try:
-        with conn.cursor() as cursor:
-            # Base query
-            sql = "SELECT * FROM products WHERE 1=1"  # 1=1 allows for flexible WHERE clause building
-            params = []
-            
-            # Add search term condition if provided
-            if search_term:
-                sql += " AND (UPPER(product) LIKE UPPER(%s) OR ID LIKE UPPER(%s))"
-                search_param = f"%{search_term}%"
-                params.extend([search_param, search_param])
-            
-            # Add category condition if provided
-            if category:
-                sql += " AND category = %s"
-                params.append(category)
-            
-            # Execute query
-            cursor.execute(sql, params)
-            result = cursor.fetchall()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(result)
-            
-            # Rename columns to match the expected format in the app
-            if not df.empty:
-                df = df.rename(columns={
-                    'ID': 'Code',
-                    'product': 'Description',
-                    'quantity': 'Quantity',
-                    'category': 'Type'
-                })
-                
-                # Filter out inactive products
-                if 'active' in df.columns:
-                    df = df[df['active'] == 1]
-                    df = df.drop('active', axis=1)
-            
-            return df
-    except Exception as e:
-        print(f"Query error: {e}")
-        return pd.DataFrame(columns=['Code', 'Description', 'Quantity', 'Type'])
-    finally:
-        conn.close()
-
-# Add these functions to your existing db.py file
+    return products_repository.search(search_term, category)
 
 def get_all_products():
     """
-    Get all products from the database.
-    Returns a pandas DataFrame with all products.
+    Get all active products from the database.
+    Returns a list of ProductItem records.
     """
-    conn = connect_to_db()
-    if not conn:
-        print("Failed to connect to database")
-        return pd.DataFrame(columns=['Code', 'Description', 'Quantity', 'Type'])
-    
-    try:
-        with conn.cursor() as cursor:
-            # Get all active products
-            sql = "SELECT ID, product, quantity, category FROM products WHERE active = 1"
-            cursor.execute(sql)
-            result = cursor.fetchall()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(result)
-            
-            # Rename columns to match the expected format in the app
-            if not df.empty:
-                df = df.rename(columns={
-                    'ID': 'Code',
-                    'product': 'Description',
-                    'quantity': 'Quantity',
-                    'category': 'Type'
-                })
-            
-            return df
-    except Exception as e:
-        print(f"Query error: {e}")
-        return pd.DataFrame(columns=['Code', 'Description', 'Quantity', 'Type'])
-    finally:
-        conn.close()
+    return products_repository.list_all(view='admin') or []
 
 def update_product_in_db(product_id, description, quantity, product_type):
     """
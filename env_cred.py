@@ -14,3 +14,36 @@ s3_access_key_id = os.getenv("S3_ACCESS_KEY_ID")
 s3_secret_access_key = os.getenv("S3_SECRET_ACCESS_KEY")
 s3_region = os.getenv("S3_REGION")
 s3_bucket_name = os.getenv("S3_BUCKET_NAME")
+
+pool_size = os.getenv("MYSQL_POOL_SIZE")
+pool_max_overflow = os.getenv("MYSQL_POOL_MAX_OVERFLOW")
+pool_timeout = os.getenv("MYSQL_POOL_TIMEOUT")
+pool_max_idle = os.getenv("MYSQL_POOL_MAX_IDLE")
+
+image_cache_ttl = os.getenv("IMAGE_CACHE_TTL")
+image_cache_size = os.getenv("IMAGE_CACHE_SIZE")
+image_lookup_workers = os.getenv("IMAGE_LOOKUP_WORKERS")
+image_manifest_path = os.getenv("IMAGE_MANIFEST_PATH")
+image_manifest_refresh = os.getenv("IMAGE_MANIFEST_REFRESH")
+inventory_cache_ttl = os.getenv("INVENTORY_CACHE_TTL")
+inventory_write_log = os.getenv("INVENTORY_WRITE_LOG")
+item_code_block_size = os.getenv("ITEM_CODE_BLOCK_SIZE")
+catalogue_replica_path = os.getenv("CATALOGUE_REPLICA_PATH")
+catalogue_replica_refresh = os.getenv("CATALOGUE_REPLICA_REFRESH")
+catalogue_replica_max_staleness = os.getenv("CATALOGUE_REPLICA_MAX_STALENESS")
+mysql_primary_dsn = os.getenv("MYSQL_PRIMARY_DSN")
+mysql_replica_dsns = os.getenv("MYSQL_REPLICA_DSNS")
+db_read_your_writes_seconds = os.getenv("DB_READ_YOUR_WRITES_SECONDS")
+db_replica_max_failures = os.getenv("DB_REPLICA_MAX_FAILURES")
+db_replica_eject_seconds = os.getenv("DB_REPLICA_EJECT_SECONDS")
+serve_mode = os.getenv("SERVE_MODE")
+async_s3_concurrency = os.getenv("ASYNC_S3_CONCURRENCY")
+async_db_pool_size = os.getenv("ASYNC_DB_POOL_SIZE")
+web_concurrency = os.getenv("WEB_CONCURRENCY")
+gunicorn_threads = os.getenv("GUNICORN_THREADS")
+gunicorn_worker_memory_mib = os.getenv("GUNICORN_WORKER_MEMORY_MIB")
+warmup_image_wait = os.getenv("WARMUP_IMAGE_WAIT")
+metrics_dir = os.getenv("METRICS_DIR")
+metrics_flush_seconds = os.getenv("METRICS_FLUSH_SECONDS")
+slow_query_ms = os.getenv("SLOW_QUERY_MS")
+query_log_size = os.getenv("QUERY_LOG_SIZE")
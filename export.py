@@ -0,0 +1,189 @@
+import io
+import csv
+import sys
+
+from models import EQUIPMENT_COLUMNS
+
+DEFAULT_CHUNK_ROWS = 1000
+DEFAULT_ROW_GROUP_ROWS = 50000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Exported columns, named as in equipment_inventory
+EXPORT_COLUMNS = [column for column, _ in EQUIPMENT_COLUMNS]
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+#######################################################
+##### CSV
+#######################################################
+
+def iter_csv(records, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield CSV text in chunks of chunk_rows rows, header first.
+    records is any iterable of EquipmentItem, consumed lazily.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in _chunks(records, chunk_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(record._values() for record in chunk)
+        yield buffer.getvalue()
+
+#######################################################
+##### PARQUET (optional: needs pyarrow)
+#######################################################
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema(pa):
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if column == 'Item_Code':
+            fields.append(pa.field(column, pa.int64()))
+        elif column == 'Price':
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+def _price(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def iter_parquet(records, row_group_rows=DEFAULT_ROW_GROUP_ROWS):
+    """
+    Yield a Parquet file as bytes, one row group at a time, so neither the
+    rows nor the file are ever held in memory whole.
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _chunks(records, row_group_rows):
+            rows = [record._values() for record in chunk]
+            arrays = []
+            for i, field in enumerate(schema):
+                values = [row[i] for row in rows]
+                if field.name == 'Price':
+                    values = [_price(value) for value in values]
+                elif field.name != 'Item_Code':
+                    values = [None if value is None else str(value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            # One write_table per chunk makes each chunk its own row group
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema),
+                               row_group_size=len(rows))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+#######################################################
+##### EXPORT
+#######################################################
+
+def export_rows(search_term='', category=''):
+    """Stream every matching equipment_inventory row straight from the database."""
+    from db_equipment_inventory import iter_inventory_rows
+    return iter_inventory_rows(search_term=search_term, category=category)
+
+def iter_export(fmt, search_term='', category=''):
+    """
+    Yield the export in the given format ('csv' or 'parquet') as str/bytes chunks.
+
+    Raises:
+        ValueError: For an unknown format
+        ImportError: For parquet without pyarrow installed
+    """
+    rows = export_rows(search_term, category)
+    if fmt == 'csv':
+        return iter_csv(rows)
+    if fmt == 'parquet':
+        import pyarrow.parquet  # noqa: F401  (fail before any output is sent)
+        return iter_parquet(rows)
+    raise ValueError(f"Unknown export format: {fmt!r}")
+
+
+# Run from the command line: python export.py inventory.csv [--search pump] [--category Mechanical]
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Export equipment_inventory to CSV or Parquet")
+    parser.add_argument('path', help="Output file; the format follows the extension unless --format is given")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS))
+    parser.add_argument('--search', default='', help="Only rows matching this search term")
+    parser.add_argument('--category', default='', help="Only rows in this category")
+    args = parser.parse_args()
+
+    fmt = args.format or ('parquet' if args.path.endswith('.parquet') else 'csv')
+    started = time.perf_counter()
+    written = 0
+    mode, encoding = ('w', 'utf-8') if fmt == 'csv' else ('wb', None)
+    with open(args.path, mode, encoding=encoding, newline='' if fmt == 'csv' else None) as out:
+        for chunk in iter_export(fmt, args.search, args.category):
+            out.write(chunk)
+            written += len(chunk)
+    print(f"Wrote {written} {'characters' if fmt == 'csv' else 'bytes'} to {args.path} "
+          f"in {time.perf_counter() - started:.2f}s", file=sys.stderr)
@@ -0,0 +1,256 @@
+import threading
+
+# Facet name -> (EquipmentItem attribute, request argument selecting it)
+FACETS = {
+    'Category': ('Type', 'type'),
+    'Sub_Category': ('Sub_Category', 'sub_category'),
+    'Make': ('Make', 'make'),
+    'Location': ('Location', 'location'),
+    'Price': ('Price', 'price'),
+}
+
+# Upper bounds of the price buckets; anything above the last is one open bucket
+PRICE_BUCKETS = (100, 500, 1000, 5000)
+
+def _bucket_labels(bounds):
+    labels = [f"Under {bounds[0]}"]
+    labels.extend(f"{low}-{high}" for low, high in zip(bounds, bounds[1:]))
+    labels.append(f"{bounds[-1]}+")
+    return tuple(labels)
+
+PRICE_LABELS = _bucket_labels(PRICE_BUCKETS)
+
+def price_bucket(price):
+    """Bucket label for a price, or None if it is missing or not a number."""
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+    for bound, label in zip(PRICE_BUCKETS, PRICE_LABELS):
+        if price < bound:
+            return label
+    return PRICE_LABELS[-1]
+
+def selected_facets(args, include_category=True):
+    """
+    Facet selections from request args, e.g. ?make=Acme&make=Bosch&price=100-500.
+
+    Returns:
+        dict: Facet name -> list of selected values, for facets with a selection
+    """
+    selected = {}
+    for facet, (_, arg) in FACETS.items():
+        if facet == 'Category' and not include_category:
+            continue
+        values = [value for value in args.getlist(arg) if value]
+        if values:
+            selected[facet] = values
+    return selected
+
+# Values listed per facet in the filter panel (selected values are always listed)
+FACET_DISPLAY_LIMIT = 10
+
+def facet_panel(counts, selected, limit=FACET_DISPLAY_LIMIT):
+    """
+    Shape facet counts for the filter panel; the template and search.js
+    both render this structure.
+
+    Returns:
+        list: One dict per facet (Category excluded, it has the dropdown) with
+        name, arg, label and options of {value, count, checked}
+    """
+    panel = []
+    for facet, (_, arg) in FACETS.items():
+        if facet == 'Category':
+            continue
+        chosen = selected.get(facet, [])
+        pairs = counts.get(facet, [])
+        listed = pairs[:limit] if facet != 'Price' else pairs
+        shown = {value for value, _ in listed}
+        found = dict(pairs)
+        # Keep selections visible even when they now match nothing
+        listed = listed + [(value, found.get(value, 0)) for value in chosen if value not in shown]
+        panel.append({
+            'name': facet,
+            'arg': arg,
+            'label': facet.replace('_', ' '),
+            'options': [{'value': value, 'count': count, 'checked': value in chosen}
+                        for value, count in listed],
+        })
+    return panel
+
+#######################################################
+##### INDEX
+#######################################################
+
+class FacetIndex:
+    """
+    Value -> item codes for each facet, so counts are the size of a set and
+    filtering is set intersection.
+
+    Values within one facet are OR-ed and facets are AND-ed. Counts for a
+    facet ignore that facet's own selection, so the other values it offers
+    show how many items selecting them would add.
+
+    Args:
+        facets (dict): Facet name -> (attribute, request argument)
+    """
+
+    def __init__(self, facets=FACETS):
+        self.facets = facets
+        self._postings = {facet: {} for facet in facets}  # facet -> value -> codes
+        self._values = {}  # code -> {facet: value} it was indexed under
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _item_values(self, item):
+        values = {}
+        for facet, (attr, _) in self.facets.items():
+            value = getattr(item, attr, None)
+            if facet == 'Price':
+                value = price_bucket(value)
+            elif value is not None:
+                value = str(value).strip() or None
+            if value is not None:
+                values[facet] = value
+        return values
+
+    def add(self, code, item):
+        """Index a record, replacing any previous version of it."""
+        values = self._item_values(item)
+        with self._lock:
+            if self._values.get(code) == values:
+                return
+            self._remove(code)
+            for facet, value in values.items():
+                self._postings[facet].setdefault(value, set()).add(code)
+            self._values[code] = values
+
+    def remove(self, code):
+        with self._lock:
+            self._remove(code)
+
+    def _remove(self, code):
+        values = self._values.pop(code, None)
+        if values is None:
+            return
+        for facet, value in values.items():
+            codes = self._postings[facet][value]
+            codes.discard(code)
+            if not codes:
+                del self._postings[facet][value]
+
+    def rebuild(self, rows):
+        """Replace the whole index with the given (code, record) pairs."""
+        fresh = FacetIndex(self.facets)
+        for code, item in rows:
+            fresh.add(code, item)
+        with self._lock:
+            self._postings = fresh._postings
+            self._values = fresh._values
+
+    def resolve(self, facet, values):
+        """
+        Indexed values of facet equal to any of values, ignoring case and
+        surrounding spaces, e.g. ['tools'] -> ['Tools'] for the category
+        dropdown's ?type=tools. Empty when none match.
+        """
+        wanted = {str(value).strip().casefold() for value in values}
+        with self._lock:
+            return [value for value in self._postings[facet] if value.casefold() in wanted]
+
+    def _facet_codes(self, facet, values):
+        postings = self._postings[facet]
+        sets = [postings[value] for value in values if value in postings]
+        if len(sets) == 1:
+            return sets[0]
+        return set().union(*sets)
+
+    def matching(self, selected, within=None, exclude=None):
+        """
+        Codes matching every selected facet.
+
+        Args:
+            selected (dict): Facet name -> list of accepted values
+            within (set): Optional codes to start from (e.g. text search hits)
+            exclude (str): Facet whose selection is ignored
+
+        Returns:
+            set: Matching codes, or None when nothing constrains the result
+        """
+        with self._lock:
+            constraints = [self._facet_codes(facet, values)
+                           for facet, values in selected.items()
+                           if facet != exclude and facet in self._postings]
+            if within is not None:
+                constraints.append(within)
+            if not constraints:
+                return None
+            constraints.sort(key=len)
+            return set(constraints[0]).intersection(*constraints[1:])
+
+    def counts(self, selected=None, within=None):
+        """
+        Live counts for every facet value under the current selection.
+
+        Returns:
+            dict: Facet name -> list of (value, count), largest first, except
+            Price, which keeps bucket order
+        """
+        selected = selected or {}
+        with self._lock:
+            result = {}
+            # Facets without a selection of their own all count within the same set
+            shared = None
+            for facet, postings in self._postings.items():
+                if facet in selected:
+                    base = self.matching(selected, within, exclude=facet)
+                else:
+                    if shared is None:
+                        shared = (self.matching(selected, within),)
+                    base = shared[0]
+                if base is None:
+                    pairs = [(value, len(codes)) for value, codes in postings.items()]
+                else:
+                    pairs = [(value, len(codes & base)) for value, codes in postings.items()]
+                    pairs = [pair for pair in pairs if pair[1]]
+                if facet == 'Price':
+                    pairs.sort(key=lambda pair: PRICE_LABELS.index(pair[0]))
+                else:
+                    pairs.sort(key=lambda pair: (-pair[1], pair[0]))
+                result[facet] = pairs
+            return result
+
+#######################################################
+##### PROCESS-WIDE INDEX
+#######################################################
+
+facet_index = FacetIndex()
+
+def _sync_with_snapshot(snapshot, changed_codes):
+    """inventory_cache listener: rebuild fully or re-index changed records."""
+    if changed_codes is None:
+        facet_index.rebuild(snapshot.by_code.items())
+        return
+    for code in changed_codes:
+        item = snapshot.by_code.get(code)
+        if item is None:
+            facet_index.remove(code)
+        else:
+            facet_index.add(code, item)
+
+_registered = False
+_register_lock = threading.Lock()
+
+def get_facet_index():
+    """Return the index, hooking it up to the inventory snapshot on first use."""
+    global _registered
+    if not _registered:
+        with _register_lock:
+            if not _registered:
+                from inventory_cache import add_listener
+                add_listener(_sync_with_snapshot)
+                _registered = True
+    return facet_index
@@ -0,0 +1,116 @@
+"""
+gunicorn settings for production (render.yaml):
+
+    gunicorn -c gunicorn.conf.py serve:application
+
+Workers and threads are sized from the CPUs and memory the container may
+use; WEB_CONCURRENCY and GUNICORN_THREADS override them. The app and its
+data modules are imported once in the master (preload_app), so workers
+share that code copy-on-write. Each worker rebuilds its connection pools
+and S3 client after the fork, then warms its caches before it accepts
+requests.
+
+Caches are warmed per worker, not in the master, because warming starts
+refresher threads and a fork must not copy a lock held by a thread. Each
+worker's inventory snapshot re-reads items written by any worker through
+a shared write journal (INVENTORY_WRITE_LOG), not only its own writes.
+"""
+import os
+import tempfile
+from env_cred import serve_mode, web_concurrency, gunicorn_threads, gunicorn_worker_memory_mib
+from env_cred import metrics_dir, inventory_write_log
+
+#######################################################
+##### SIZING
+#######################################################
+
+def cpu_count():
+    """CPUs this process may run on, honouring a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def memory_mib():
+    """Memory available to the container: its cgroup limit, else physical memory."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            # cgroup v1 reports "no limit" as a huge number
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value) // (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+
+def worker_count(cpus, memory, per_worker, headroom=0.25):
+    """
+    2 x CPUs + 1 (the usual gunicorn rule), capped so the workers fit in
+    memory with some headroom for the master and page cache.
+    """
+    by_memory = int(memory * (1 - headroom) // per_worker)
+    return max(1, min(2 * cpus + 1, by_memory))
+
+# Each worker holds its own inventory snapshot and indexes. Measured RSS
+# per worker: ~110 MiB at 10k rows, ~530 MiB at 100k; raise this for
+# bigger catalogues.
+WORKER_MEMORY_MIB = int(gunicorn_worker_memory_mib) if gunicorn_worker_memory_mib else 256
+
+#######################################################
+##### SETTINGS
+#######################################################
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = (int(web_concurrency) if web_concurrency
+           else worker_count(cpu_count(), memory_mib(), WORKER_MEMORY_MIB))
+
+# Threads cover the waits on MySQL and S3; the async mode (see serve.py)
+# runs one event loop per worker instead
+if (serve_mode or 'sync').lower() == 'async':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    worker_class = 'gthread'
+    threads = int(gunicorn_threads) if gunicorn_threads else 4
+
+preload_app = True
+
+#######################################################
+##### HOOKS
+#######################################################
+
+def on_starting(server):
+    # Workers write their /metrics histograms here for whichever one is scraped
+    from request_metrics import set_metrics_dir
+    set_metrics_dir(metrics_dir or os.path.join(tempfile.gettempdir(), 'inventory-metrics'),
+                    clear=True)
+    # A write in one worker invalidates those items in every worker's snapshot
+    from inventory_cache import set_write_journal
+    set_write_journal(inventory_write_log or
+                      os.path.join(tempfile.gettempdir(), 'inventory-writes.log'), clear=True)
+    from warmup import preload
+    server.log.info(f"Preloaded modules and templates in {preload()} ms; "
+                    f"{workers} workers ({worker_class})")
+
+def post_fork(server, worker):
+    from warmup import reinit_after_fork
+    reinit_after_fork()
+
+def worker_exit(server, worker):
+    # Keep the requests served since the last periodic write
+    from request_metrics import flush
+    flush()
+
+def post_worker_init(worker):
+    # Runs before the worker's accept loop, so no request meets a cold cache
+    from warmup import warm_caches
+    timings = warm_caches(notify=worker.notify)
+    worker.log.info(f"Worker {worker.pid} warmed in {sum(timings.values()):.0f} ms: {timings}")
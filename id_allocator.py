@@ -0,0 +1,247 @@
+import os
+import threading
+import weakref
+
+from env_cred import item_code_block_size
+
+#######################################################
+##### SEQUENCE TABLE
+#######################################################
+
+class SequenceTable:
+    """
+    Named counters kept in a small MySQL table and advanced atomically.
+
+    Each reservation is one short transaction on its own connection:
+    UPDATE ... SET next_value = LAST_INSERT_ID(next_value + n) takes the row
+    lock only for that statement, and LAST_INSERT_ID() hands the new value
+    back to this connection alone, so concurrent processes never see the
+    same range.
+
+    Args:
+        connect (callable): Returns a DB connection or None
+        table (str): Name of the sequence table (created on first use)
+    """
+
+    def __init__(self, connect, table='id_sequences'):
+        self.connect = connect
+        self.table = table
+        self._created = False
+
+    def reserve(self, name, count, floor_table, floor_column):
+        """
+        Reserve count consecutive values from the named sequence.
+
+        The sequence is first raised past MAX(floor_column) of floor_table,
+        so codes written without the allocator (imports, older code) are
+        never handed out again.
+
+        Returns:
+            int: First reserved value
+
+        Raises:
+            RuntimeError: If no connection is available
+        """
+        conn = self.connect()
+        if not conn:
+            raise RuntimeError("Failed to connect to database")
+        try:
+            with conn.cursor() as cursor:
+                if not self._created:
+                    cursor.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {self.table} (
+                            name VARCHAR(64) NOT NULL PRIMARY KEY,
+                            next_value BIGINT NOT NULL
+                        )
+                    """)
+                    self._created = True
+                cursor.execute(f"INSERT IGNORE INTO {self.table} (name, next_value) VALUES (%s, 1)",
+                               (name,))
+                cursor.execute(f"""
+                    UPDATE {self.table}
+                    SET next_value = LAST_INSERT_ID(GREATEST(
+                        next_value,
+                        (SELECT COALESCE(MAX({floor_column}), 0) + 1 FROM {floor_table})
+                    ) + %s)
+                    WHERE name = %s
+                """, (count, name))
+                cursor.execute("SELECT LAST_INSERT_ID() AS next_value")
+                end = cursor.fetchone()['next_value']
+            conn.commit()
+            return end - count
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+#######################################################
+##### HI/LO ALLOCATOR
+#######################################################
+
+class HiLoAllocator:
+    """
+    Hands out unique codes from blocks reserved in a SequenceTable.
+
+    One round trip reserves block_size codes (the "hi" part); the next
+    block_size calls are served from memory (the "lo" part). Codes are
+    unique across threads, processes and hosts but not gap-free: a block
+    that is not used up before the process exits is simply skipped.
+
+    The sequence stores the next free code rather than a block number (the
+    "pooled" hi/lo variant), so codes stay contiguous with the existing
+    Item_Code values and block_size can change between deployments.
+
+    Args:
+        sequence (SequenceTable): Where blocks are reserved
+        name (str): Sequence name
+        table (str): Table whose key column the codes are for
+        column (str): Key column; the sequence never falls behind its MAX
+        block_size (int): Codes reserved per round trip
+    """
+
+    def __init__(self, sequence, name, table, column, block_size=100):
+        self.sequence = sequence
+        self.name = name
+        self.table = table
+        self.column = column
+        self.block_size = block_size
+        self._reset()
+        _allocators.add(self)
+
+    def _reset(self):
+        # A forked child must never reuse its parent's block
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+        self._pid = os.getpid()
+
+    def next_id(self):
+        """Return the next unused code."""
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            if self._next >= self._limit:
+                start = self.sequence.reserve(self.name, self.block_size, self.table, self.column)
+                self._next, self._limit = start, start + self.block_size
+            code = self._next
+            self._next += 1
+            return code
+
+    def reserve(self, count):
+        """Reserve count consecutive codes directly (for bulk inserts). Returns a range."""
+        start = self.sequence.reserve(self.name, count, self.table, self.column)
+        return range(start, start + count)
+
+    def discard_block(self):
+        """Drop the rest of the current block, e.g. after a duplicate-key error."""
+        with self._lock:
+            self._next = self._limit = 0
+
+
+_allocators = weakref.WeakSet()
+
+def _reset_allocators():
+    for allocator in list(_allocators):
+        allocator._reset()
+
+os.register_at_fork(after_in_child=_reset_allocators)
+
+#######################################################
+##### ITEM CODES
+#######################################################
+
+_item_code_allocator = None
+_item_code_lock = threading.Lock()
+
+def get_item_code_allocator():
+    """The process-wide allocator for equipment_inventory.Item_Code."""
+    global _item_code_allocator
+    if _item_code_allocator is None:
+        with _item_code_lock:
+            if _item_code_allocator is None:
+                from db_equipment_inventory import connect_to_db
+                _item_code_allocator = HiLoAllocator(
+                    SequenceTable(connect_to_db), 'equipment_inventory',
+                    'equipment_inventory', 'Item_Code',
+                    block_size=int(item_code_block_size) if item_code_block_size else 100,
+                )
+    return _item_code_allocator
+
+def check_concurrency(threads=8, processes=4, per_worker=250):
+    """
+    Add items through add_or_update_item (allocating their codes) from many
+    threads in several forked processes, then check that every insert
+    succeeded, no code was handed out twice and the table gained exactly
+    one row per insert. The rows are deleted again afterwards.
+
+    Runs against the configured database; benchmark.py --check-inserts runs
+    it against the SQLite stand-in instead.
+
+    Returns:
+        bool: True if every insert succeeded with a unique code
+    """
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+    from db_equipment_inventory import add_or_update_item, connect_to_db
+
+    def count_rows():
+        conn = connect_to_db()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) AS n FROM equipment_inventory")
+                return cursor.fetchone()['n']
+        finally:
+            conn.close()
+
+    def insert_many(worker_index):
+        codes = []
+        for n in range(per_worker):
+            item = {'Item_Code': '', 'Category': 'Concurrency check', 'Sub_Category': '',
+                    'Category_Description': f"Concurrency check {os.getpid()}-{worker_index}-{n}",
+                    'Make': '', 'Model': '', 'Certification': '', 'Specification': '',
+                    'Location': '', 'Price': '0.00'}
+            if add_or_update_item(item):
+                codes.append(int(item['Item_Code']))
+        return codes
+
+    def worker(queue):
+        with ThreadPoolExecutor(threads) as executor:
+            codes = [code for batch in executor.map(insert_many, range(threads)) for code in batch]
+        queue.put(codes)
+
+    rows_before = count_rows()
+    # Take a block in the parent first, so the children start with one to (wrongly) share
+    get_item_code_allocator().next_id()
+
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    children = [context.Process(target=worker, args=(queue,)) for _ in range(processes)]
+    for child in children:
+        child.start()
+    codes = [code for _ in children for code in queue.get()]
+    for child in children:
+        child.join()
+    rows_added = count_rows() - rows_before
+
+    expected = threads * processes * per_worker
+    unique = len(set(codes))
+    print(f"Inserted {len(codes)} of {expected} items in {processes} processes x {threads} threads "
+          f"x {per_worker}: {unique} unique codes, {rows_added} new rows")
+
+    conn = connect_to_db()
+    try:
+        with conn.cursor() as cursor:
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                cursor.execute(f"DELETE FROM equipment_inventory WHERE Item_Code IN "
+                               f"({', '.join(['%s'] * len(chunk))})", chunk)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(codes) == expected and unique == expected and rows_added == expected
+
+
+# Run directly to check concurrent inserts against the configured database
+if __name__ == "__main__":
+    check_concurrency()
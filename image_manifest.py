@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from env_cred import s3_bucket_name, image_manifest_path, image_manifest_refresh
+
+IMAGE_PREFIX = "engineer-inventory/product_id/"
+
+#######################################################
+##### LISTERS
+#######################################################
+
+class S3ObjectLister:
+    """
+    Lists every key under a prefix with paginated list_objects_v2 calls.
+
+    Any object with a boto3-compatible list_objects_v2 method works as the
+    client, which makes it easy to swap in a stub.
+    """
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def list_keys(self, prefix):
+        kwargs = {'Bucket': self.bucket, 'Prefix': prefix}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for obj in response.get('Contents', []):
+                yield obj['Key']
+            if not response.get('IsTruncated'):
+                break
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+class LocalObjectLister:
+    """Lists files below a local directory laid out like the bucket."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_keys(self, prefix):
+        base = os.path.join(self.root, prefix)
+        keys = []
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                keys.append(os.path.relpath(path, self.root).replace(os.sep, '/'))
+        # S3 returns keys in lexicographic order; match it so "first image" agrees
+        return sorted(keys)
+
+
+def s3_public_url(key):
+    return f"https://{s3_bucket_name}.s3.amazonaws.com/{key}"
+
+#######################################################
+##### MANIFEST
+#######################################################
+
+class ImageManifest:
+    """
+    In-memory index of product code -> image keys, built from one sweep.
+
+    Args:
+        lister: Object with a list_keys(prefix) method
+        prefix (str): Bucket prefix holding one folder per product code
+        path (str): Optional JSON file used to persist the manifest
+        url_for_key (callable): Turns an object key into a public URL
+    """
+
+    def __init__(self, lister, prefix=IMAGE_PREFIX, path=None, url_for_key=s3_public_url):
+        self.lister = lister
+        self.prefix = prefix
+        self.path = path
+        self.url_for_key = url_for_key
+        # (urls, keys, built_at) replaced as a whole so readers never lock
+        self._state = None
+        # Hash of the key set; changes only when images are added or removed,
+        # and agrees between workers that swept the same bucket
+        self.fingerprint = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._state is not None
+
+    @property
+    def built_at(self):
+        return self._state[2] if self._state else None
+
+    def lookup(self, product_key):
+        """Return the first image URL for a product, or None."""
+        return self._state[0].get(str(product_key)) if self._state else None
+
+    def image_keys(self, product_key):
+        """Return every image key stored for a product."""
+        return self._state[1].get(str(product_key), ()) if self._state else ()
+
+    def __len__(self):
+        return len(self._state[0]) if self._state else 0
+
+    def build(self):
+        """Sweep the prefix once and swap in the new index."""
+        grouped = {}
+        for key in self.lister.list_keys(self.prefix):
+            rest = key[len(self.prefix):]
+            code, sep, name = rest.partition('/')
+            # Skip folder placeholder objects and stray files at the top level
+            if not sep or not name:
+                continue
+            grouped.setdefault(code, []).append(key)
+        self._install({code: tuple(keys) for code, keys in grouped.items()}, time.time())
+        if self.path:
+            self.save()
+        return len(grouped)
+
+    def _install(self, keys, built_at):
+        if self._state is not None and self._state[1] == keys:
+            self._state = (self._state[0], self._state[1], built_at)
+            return
+        urls = {code: self.url_for_key(code_keys[0]) for code, code_keys in keys.items()}
+        self._state = (urls, keys, built_at)
+        self.fingerprint = hashlib.blake2b(
+            json.dumps(sorted(keys.items())).encode(), digest_size=8).hexdigest()
+
+    def save(self):
+        """Write the manifest to its file atomically."""
+        state = self._state
+        if state is None or not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'built_at': state[2], 'prefix': self.prefix,
+                       'keys': {code: list(keys) for code, keys in state[1].items()}}, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """
+        Warm-start from the manifest file.
+
+        Returns:
+            bool: True if a manifest for this prefix was loaded
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('prefix') != self.prefix:
+                return False
+            self._install({code: tuple(keys) for code, keys in data['keys'].items()},
+                          data['built_at'])
+            return True
+        except Exception as e:
+            print(f"Error loading image manifest: {e}")
+            return False
+
+    def start(self, interval):
+        """Rebuild now and then every interval seconds on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,),
+                                        name='image-manifest', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Error building image manifest: {e}")
+            self._stop.wait(interval)
+
+#######################################################
+##### PROCESS-WIDE MANIFEST
+#######################################################
+
+_manifest = None
+_manifest_pid = None
+_manifest_lock = threading.Lock()
+
+def get_manifest():
+    """
+    Return this process's manifest, starting its refresher on first use.
+
+    Returns None when disabled with IMAGE_MANIFEST_REFRESH=0. The refresher
+    thread does not survive a fork, so each worker starts its own.
+    """
+    global _manifest, _manifest_pid
+    interval = float(image_manifest_refresh) if image_manifest_refresh else 300.0
+    if interval <= 0:
+        return None
+    pid = os.getpid()
+    if _manifest is not None and _manifest_pid == pid:
+        return _manifest
+    with _manifest_lock:
+        if _manifest is None or _manifest_pid != pid:
+            from s3_utils import get_s3_client
+            manifest = ImageManifest(S3ObjectLister(get_s3_client(), s3_bucket_name),
+                                     path=image_manifest_path)
+            manifest.load()
+            manifest.start(interval)
+            _manifest, _manifest_pid = manifest, pid
+    return _manifest
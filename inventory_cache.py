@@ -0,0 +1,610 @@
+import os
+import time
+import bisect
+import hashlib
+import threading
+
+from env_cred import inventory_cache_ttl, inventory_write_log
+from pagination import DEFAULT_PAGE_SIZE, decode_cursor, make_page
+from request_metrics import timed
+
+#######################################################
+##### SNAPSHOT
+#######################################################
+
+class InventorySnapshot:
+    """
+    Immutable in-memory copy of equipment_inventory.
+
+    Never modified after construction: writers build a new snapshot and swap
+    it in, so readers can use whichever one they picked up without locking.
+    """
+
+    __slots__ = ('rows', 'codes', 'by_code', 'version', 'loaded_at', '_categories',
+                 '_fingerprint')
+
+    def __init__(self, by_code, version, loaded_at):
+        self.by_code = by_code
+        self.codes = sorted(by_code)
+        self.rows = [by_code[code] for code in self.codes]
+        self.version = version
+        self.loaded_at = loaded_at
+        self._categories = None
+        self._fingerprint = None
+
+    def categories(self):
+        """Sorted distinct Category values, computed once per snapshot."""
+        if self._categories is None:
+            self._categories = sorted({item.Type for item in self.rows if item.Type})
+        return self._categories
+
+    def fingerprint(self):
+        """
+        Content hash of the snapshot, equal in every worker holding the same
+        rows (unlike version, which each worker counts on its own). XOR of
+        per-item digests, so it can be updated incrementally. The cache sets
+        it before publishing a snapshot, so requests do not pay for it.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = _fingerprint(self.rows)
+        return self._fingerprint
+
+
+def _item_digest(item):
+    digest = hashlib.blake2b(repr(item._values()).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+def _fingerprint(items):
+    fingerprint = 0
+    for item in items:
+        fingerprint ^= _item_digest(item)
+    return fingerprint
+
+def _next_fingerprint(previous, codes, by_code):
+    """
+    Fingerprint after the items with these codes changed: previous's,
+    with their old digests XORed out and their new ones in.
+    """
+    fingerprint = previous.fingerprint()
+    for code in codes:
+        for item in (previous.by_code.get(code), by_code.get(code)):
+            if item is not None:
+                fingerprint ^= _item_digest(item)
+    return fingerprint
+
+
+class WriteJournal:
+    """
+    Item codes written by any process on this host, appended to one file,
+    so each gunicorn worker re-reads the items another worker wrote on its
+    next get() instead of at its next full reload.
+
+    Each entry is one short O_APPEND write, so entries from different
+    processes never interleave. Past max_bytes the writer swaps in an empty
+    file; a reader that sees the file replaced (or gone) may have missed
+    entries, so it reloads everything.
+
+    Args:
+        path (str): Journal file, the same for every worker
+        max_bytes (int): Size at which the file is started afresh
+    """
+
+    def __init__(self, path, max_bytes=1 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inode = None
+        self._offset = 0
+        # Always there, so a reader's mark() has a file to compare with
+        try:
+            open(path, 'a').close()
+        except OSError as e:
+            print(f"Error creating inventory write journal: {e}")
+
+    def append(self, codes):
+        line = ','.join(str(int(code)) for code in codes) + '\n'
+        try:
+            with self._lock, open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                end = f.tell()
+                stat = os.fstat(f.fileno())
+                # Skip our own entry if nothing else was appended in between
+                if stat.st_ino == self._inode and self._offset == end - len(line):
+                    self._offset = end
+            if end > self.max_bytes:
+                fresh = f"{self.path}.{os.getpid()}"
+                open(fresh, 'w').close()
+                os.replace(fresh, self.path)
+        except OSError as e:
+            print(f"Error writing inventory write journal: {e}")
+
+    def mark(self):
+        """Start reading from the current end, e.g. just before a full load."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+                self._inode, self._offset = stat.st_ino, stat.st_size
+            except FileNotFoundError:
+                self._inode, self._offset = None, 0
+
+    def read_new(self):
+        """
+        Codes appended since the last call, or None if the file was deleted
+        or replaced since and entries may have been missed.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None if self._inode is not None else ()
+        if stat.st_ino == self._inode and stat.st_size == self._offset:
+            return ()
+        with self._lock:
+            if stat.st_ino != self._inode:
+                missed = self._inode is not None or self._offset
+                self._inode, self._offset = stat.st_ino, 0
+                if missed:
+                    return None
+            try:
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data = f.read(stat.st_size - self._offset)
+            except FileNotFoundError:
+                return None
+            # Leave a line still being written for the next call
+            data = data[:data.rfind(b'\n') + 1]
+            self._offset += len(data)
+        return {int(code) for line in data.split() for code in line.split(b',') if code}
+
+
+class InventoryCache:
+    """
+    Per-process snapshot of equipment_inventory with write invalidation.
+
+    Writes made by this process (note_write) are re-read on the next get().
+    With a journal, so are writes made by the other workers on this host;
+    writes from anywhere else show up at the next full reload, every ttl
+    seconds. If re-reading written items fails (the database is down),
+    reads keep getting the previous snapshot, and the re-read is retried
+    after retry_interval seconds.
+
+    Args:
+        loader (callable): loader(codes=None) returning EquipmentItem records, or None on failure
+        ttl (float): Seconds between background full reloads (0 disables them)
+        journal (WriteJournal): Shares written codes with the other workers, or None
+        retry_interval (float): Seconds to serve the previous snapshot after a failed re-read
+    """
+
+    def __init__(self, loader, ttl=60.0, journal=None, retry_interval=5.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.journal = journal
+        self.retry_interval = retry_interval
+        self._snapshot = None
+        self._version = 0
+        self._dirty = set()
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._refreshing = False
+        self._reload = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        Register listener(snapshot, changed_codes) to keep a derived index in
+        step with the snapshot. changed_codes is None when the whole table was
+        (re)loaded. Called under the cache lock before the new snapshot is
+        published; a listener registered late is primed with the current one.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            if self._snapshot is not None:
+                listener(self._snapshot, None)
+
+    def _publish(self, snapshot, changed_codes):
+        for listener in self._listeners:
+            try:
+                listener(snapshot, changed_codes)
+            except Exception as e:
+                print(f"Error updating inventory listener {listener!r}: {e}")
+        self._snapshot = snapshot
+
+    def get(self):
+        """
+        Return the current snapshot.
+
+        Only blocks for the first load, or to re-read items written since
+        the snapshot was built (by this process, or by another worker
+        through the journal), at most once per retry_interval while that
+        fails. Full reloads run in the background and never block readers.
+        """
+        self._ensure_refresher()
+        if self.journal is not None and self._snapshot is not None:
+            codes = self.journal.read_new()
+            if codes is None:
+                # Entries may have been missed: have the refresher reload
+                # the lot, and re-read from here on
+                self.journal.mark()
+                self._reload.set()
+            elif codes:
+                with self._lock:
+                    self._dirty.update(codes)
+        snapshot = self._snapshot
+        if snapshot is not None and (not self._dirty or time.time() < self._retry_at):
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                self._load_all()
+            elif self._dirty and time.time() >= self._retry_at:
+                self._apply_writes()
+            return self._snapshot
+
+    def note_write(self, codes):
+        """Record committed writes; the next get() in every worker re-reads those codes."""
+        with self._lock:
+            self._version += 1
+            self._dirty.update(int(code) for code in codes)
+        if self.journal is not None:
+            self.journal.append(codes)
+
+    def refresh(self):
+        """Reload the whole table and swap it in if anything changed."""
+        rows = self.loader()
+        if rows is None:
+            return False
+        by_code = {item.Code: item for item in rows}
+        while True:
+            # Compared and fingerprinted outside the lock, in the refresh
+            # thread; snapshots are immutable, so only the swap needs it
+            current = self._snapshot
+            if current is None:
+                changed = None
+                fingerprint = _fingerprint(by_code.values())
+            elif current.by_code == by_code:
+                changed = set()
+            else:
+                changed = {code for code in current.by_code.keys() | by_code.keys()
+                           if current.by_code.get(code) != by_code.get(code)}
+                fingerprint = _next_fingerprint(current, changed, by_code)
+            with self._lock:
+                if self._snapshot is not current:
+                    # A write was applied meanwhile; compare with that instead
+                    continue
+                self._checked_at = time.time()
+                if changed is not None and not changed:
+                    return True
+                # Codes written while the reload ran stay dirty and are re-read
+                # on the next get(), so a racing reload cannot hide a write
+                self._version += 1
+                snapshot = InventorySnapshot(by_code, self._version, self._checked_at)
+                snapshot._fingerprint = fingerprint
+                self._publish(snapshot, changed)
+                return True
+
+    def status(self):
+        """Return snapshot age, version and size for monitoring."""
+        snapshot = self._snapshot
+        checked_at = self._checked_at
+        return {
+            'version': snapshot.version if snapshot else None,
+            'pending_writes': len(self._dirty),
+            'age_seconds': round(time.time() - checked_at, 3) if checked_at else None,
+            'rows': len(snapshot.rows) if snapshot else 0,
+            'refreshing': self._refreshing,
+            'retry_in_seconds': round(max(0.0, self._retry_at - time.time()), 1),
+            'ttl': self.ttl,
+        }
+
+    def _load_all(self):
+        if self.journal is not None:
+            # Writes from here on are re-read after this load
+            self.journal.mark()
+        rows = self.loader()
+        if rows is None:
+            raise RuntimeError("Could not load equipment_inventory")
+        self._version += 1
+        self._dirty.clear()
+        self._checked_at = time.time()
+        snapshot = InventorySnapshot({item.Code: item for item in rows}, self._version,
+                                     self._checked_at)
+        # Known from the start, so every later snapshot's is incremental
+        snapshot.fingerprint()
+        self._publish(snapshot, None)
+
+    def _apply_writes(self):
+        codes = sorted(self._dirty)
+        rows = self.loader(codes)
+        if rows is None:
+            # Serve the previous snapshot; the codes stay dirty for the next
+            # attempt, which waits so an outage does not stall every read
+            self._retry_at = time.time() + self.retry_interval
+            return
+        self._retry_at = 0.0
+        by_code = dict(self._snapshot.by_code)
+        for code in codes:
+            by_code.pop(code, None)
+        for item in rows:
+            by_code[item.Code] = item
+        self._dirty.clear()
+        # Bump again so a version never names two different contents
+        self._version += 1
+        snapshot = InventorySnapshot(by_code, self._version, time.time())
+        snapshot._fingerprint = _next_fingerprint(self._snapshot, codes, by_code)
+        self._publish(snapshot, set(codes))
+
+    def _ensure_refresher(self):
+        # Runs with ttl 0 too, for reloads the journal asks for
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid != pid:
+                # Threads do not survive a fork; each worker runs its own
+                self._pid = pid
+                self._reload = threading.Event()
+                self._thread = threading.Thread(target=self._run, name='inventory-refresh',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._reload.wait(self.ttl if self.ttl > 0 else None)
+            self._reload.clear()
+            self._refreshing = True
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing inventory snapshot: {e}")
+            finally:
+                self._refreshing = False
+
+#######################################################
+##### PROCESS-WIDE CACHE
+#######################################################
+
+def _load_rows(codes=None):
+    from db_equipment_inventory import fetch_inventory_items
+    return fetch_inventory_items(codes)
+
+inventory_cache = InventoryCache(
+    _load_rows,
+    ttl=float(inventory_cache_ttl) if inventory_cache_ttl else 60.0,
+    journal=WriteJournal(inventory_write_log) if inventory_write_log else None,
+)
+
+def set_write_journal(path, clear=False):
+    """
+    Share write invalidation between processes through the file at path.
+    Call in the gunicorn master before forking; clear=True drops entries
+    from earlier runs.
+    """
+    if clear:
+        open(path, 'w').close()
+    inventory_cache.journal = WriteJournal(path)
+
+def get_snapshot():
+    """Return the current snapshot, or None if it could not be loaded."""
+    try:
+        return inventory_cache.get()
+    except Exception as e:
+        print(f"Error loading inventory snapshot: {e}")
+        return None
+
+def note_write(codes):
+    """Called by the data layer after a commit touching these item codes."""
+    inventory_cache.note_write(codes)
+
+def add_listener(listener):
+    inventory_cache.add_listener(listener)
+
+def cache_status():
+    return inventory_cache.status()
+
+#######################################################
+##### READS
+#######################################################
+
+@timed('search')
+def search_products(search_term='', category=''):
+    """
+    Search the snapshot. Terms are matched through the BM25 search index
+    over the equipment text fields (best match first); without a term,
+    every item in the category is returned in code order.
+    """
+    from search_index import get_search_index
+    index = get_search_index()
+    if category:
+        from facet_index import get_facet_index
+        facet_index = get_facet_index()
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return []
+
+    by_code = snapshot.by_code
+    if not category:
+        if search_term.strip():
+            return [by_code[code] for code in index.search(search_term) if code in by_code]
+        return list(snapshot.rows)
+    in_category = facet_index.matching(_with_category(facet_index, category, None))
+    if search_term.strip():
+        codes = index.search(search_term, allowed=in_category.__contains__)
+    else:
+        codes = sorted(in_category)
+    return [by_code[code] for code in codes if code in by_code]
+
+@timed('search')
+def suggest(prefix, limit=10):
+    """
+    Completions for a search-box prefix from Make, Model, Category and
+    Category_Description, most common first. Returns (column, value, count)
+    tuples.
+    """
+    from suggest_index import get_suggest_index
+    index = get_suggest_index()
+    # Makes sure the first load has run, which primes the index
+    if get_snapshot() is None:
+        return []
+    return index.suggest(prefix, limit)
+
+def get_all_products():
+    snapshot = get_snapshot()
+    return list(snapshot.rows) if snapshot else []
+
+def get_items_by_codes(codes):
+    """Return records for the given codes, in the order given."""
+    from catalogue_repository import normalise_codes
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return []
+    by_code = snapshot.by_code
+    return [by_code[code] for code in normalise_codes(codes) if code in by_code]
+
+def inventory_etag():
+    """
+    Weak ETag naming the current inventory contents, or None if the
+    snapshot is unavailable. Identical across workers with the same rows.
+    """
+    snapshot = get_snapshot()
+    return f"inv-{snapshot.fingerprint():016x}" if snapshot else None
+
+def get_categories():
+    """Distinct categories across the whole inventory, for the type dropdown."""
+    snapshot = get_snapshot()
+    return snapshot.categories() if snapshot else []
+
+#######################################################
+##### PAGED READS
+#######################################################
+
+def _walk_codes(codes, fetch, allowed, direction, key):
+    """Up to fetch codes from the sorted code list on one side of key."""
+    if direction == 'prev':
+        i = bisect.bisect_left(codes, key) - 1
+        picked = []
+        while i >= 0 and len(picked) < fetch:
+            if allowed is None or allowed(codes[i]):
+                picked.append(codes[i])
+            i -= 1
+        picked.reverse()
+        return picked
+    i = bisect.bisect_right(codes, key) if direction == 'next' else 0
+    if allowed is None:
+        return codes[i:i + fetch]
+    picked = []
+    while i < len(codes) and len(picked) < fetch:
+        if allowed(codes[i]):
+            picked.append(codes[i])
+        i += 1
+    return picked
+
+def get_all_products_page(cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One keyset page of the whole inventory in Item_Code order.
+    Returns a pagination.Page of EquipmentItem records.
+    """
+    direction, key = decode_cursor(cursor)
+    if not isinstance(key, int):
+        direction = key = None
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return make_page([], [], limit, None)
+    codes = _walk_codes(snapshot.codes, limit + 1, None, direction, key)
+    return make_page([snapshot.by_code[code] for code in codes], codes,
+                     limit, direction)
+
+@timed('search')
+def search_products_page(search_term='', category='', cursor=None, limit=DEFAULT_PAGE_SIZE,
+                         facets=None):
+    """
+    One keyset page of search results. Ranked by BM25 when there is a
+    search term, otherwise in Item_Code order within the category.
+    facets optionally narrows further (facet name -> accepted values, see
+    facet_index). Returns a pagination.Page of EquipmentItem records.
+    """
+    from search_index import get_search_index
+    index = get_search_index()
+    facet_codes = None
+    if facets or category:
+        from facet_index import get_facet_index
+        facet_index = get_facet_index()
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return make_page([], [], limit, None)
+
+    by_code = snapshot.by_code
+    if facets or category:
+        # The category goes through the facet index too, so the page lists
+        # exactly the items get_facet_counts() counts
+        facet_codes = facet_index.matching(_with_category(facet_index, category, facets))
+    allowed = facet_codes.__contains__ if facet_codes is not None else None
+    direction, key = decode_cursor(cursor)
+    if search_term.strip():
+        if not (isinstance(key, tuple) and len(key) == 2):
+            direction = key = None
+        codes, keys = index.search_page(search_term, limit, allowed, direction, key)
+        # The index can briefly hold a code the snapshot has just dropped
+        pairs = [(code, k) for code, k in zip(codes, keys) if code in by_code]
+        codes, keys = [code for code, _ in pairs], [k for _, k in pairs]
+    else:
+        if not isinstance(key, int):
+            direction = key = None
+        codes = snapshot.codes
+        # A narrow facet selection is cheaper to sort than to scan past
+        if facet_codes is not None and len(facet_codes) < len(codes) // 4:
+            codes = sorted(code for code in facet_codes if code in by_code)
+        codes = keys = _walk_codes(codes, limit + 1, allowed, direction, key)
+    return make_page([by_code[code] for code in codes], keys, limit, direction)
+
+@timed('search')
+def get_facet_counts(search_term='', category='', facets=None):
+    """
+    Live facet counts for a search: for each facet, how many matching items
+    carry each value, given the selections on the other facets. Returns
+    facet name -> list of (value, count); see facet_index.FacetIndex.counts.
+    Cached per snapshot version.
+    """
+    global _facet_counts
+    from facet_index import get_facet_index
+    facet_index = get_facet_index()
+    within = None
+    if search_term.strip():
+        from search_index import get_search_index
+        index = get_search_index()
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return {}
+    selected = _with_category(facet_index, category, facets)
+    # Counts only change with the snapshot. The indexes are updated before a
+    # snapshot is published, so counts cached under a version are never older
+    key = (' '.join(search_term.split()).casefold(),
+           tuple(sorted((facet, tuple(sorted(values))) for facet, values in selected.items())))
+    version, cached = _facet_counts
+    if version != snapshot.version:
+        cached = {}
+        _facet_counts = (snapshot.version, cached)
+    counts = cached.get(key)
+    if counts is None:
+        if search_term.strip():
+            within = index.matches(search_term)
+        counts = facet_index.counts(selected, within)
+        if len(cached) >= _MAX_CACHED_FACET_COUNTS:
+            cached.clear()
+        cached[key] = counts
+    return counts
+
+# (snapshot version, {(search term, selection): facet counts}) for the latest version seen
+_facet_counts = (None, {})
+_MAX_CACHED_FACET_COUNTS = 256
+
+def _with_category(facet_index, category, facets):
+    """
+    The facet selection with the category dropdown's value (any case, e.g.
+    ?type=tools) mapped to the Category value(s) it names in the index.
+    """
+    selected = dict(facets or {})
+    if category:
+        selected['Category'] = facet_index.resolve('Category', [category])
+    return selected
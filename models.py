@@ -0,0 +1,121 @@
+#######################################################
+##### EQUIPMENT RECORDS
+#######################################################
+
+# equipment_inventory column -> attribute name used by the views and templates
+EQUIPMENT_COLUMNS = (
+    ('Item_Code', 'Code'),
+    ('Category', 'Type'),
+    ('Sub_Category', 'Sub_Category'),
+    ('Category_Description', 'Description'),
+    ('Make', 'Make'),
+    ('Model', 'Model'),
+    ('Certification', 'Certification'),
+    ('Specification', 'Specification'),
+    ('Location', 'Location'),
+    ('Price', 'Price'),
+)
+
+
+class EquipmentItem:
+    """
+    One equipment_inventory row.
+
+    A plain __slots__ record: no per-instance dict, so a snapshot of the
+    whole catalogue stays compact. The column renaming (Item_Code -> Code,
+    Category_Description -> Description, Category -> Type) happens once, in
+    from_row(). Columns a query did not select are None.
+    """
+
+    __slots__ = tuple(attr for _, attr in EQUIPMENT_COLUMNS)
+
+    def __init__(self, Code, Type=None, Sub_Category=None, Description=None, Make=None,
+                 Model=None, Certification=None, Specification=None, Location=None,
+                 Price=None):
+        self.Code = Code
+        self.Type = Type
+        self.Sub_Category = Sub_Category
+        self.Description = Description
+        self.Make = Make
+        self.Model = Model
+        self.Certification = Certification
+        self.Specification = Specification
+        self.Location = Location
+        self.Price = Price
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a DictCursor row keyed by column name."""
+        get = row.get
+        return cls(get('Item_Code'), get('Category'), get('Sub_Category'),
+                   get('Category_Description'), get('Make'), get('Model'),
+                   get('Certification'), get('Specification'), get('Location'),
+                   get('Price'))
+
+    def _values(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, EquipmentItem):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"EquipmentItem(Code={self.Code!r}, Description={self.Description!r})"
+
+    def as_dict(self):
+        """Attribute name -> value, e.g. for JSON responses."""
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def as_row(self):
+        """Column name -> value, in equipment_inventory column order."""
+        return {column: getattr(self, attr) for column, attr in EQUIPMENT_COLUMNS}
+
+
+#######################################################
+##### PRODUCT RECORDS
+#######################################################
+
+# products column -> attribute name used by the views
+PRODUCT_COLUMNS = (
+    ('ID', 'Code'),
+    ('product', 'Description'),
+    ('quantity', 'Quantity'),
+    ('category', 'Type'),
+)
+
+
+class ProductItem:
+    """One row of the legacy products table, renamed like EquipmentItem."""
+
+    __slots__ = tuple(attr for _, attr in PRODUCT_COLUMNS)
+
+    def __init__(self, Code, Description=None, Quantity=None, Type=None):
+        self.Code = Code
+        self.Description = Description
+        self.Quantity = Quantity
+        self.Type = Type
+
+    @classmethod
+    def from_row(cls, row):
+        get = row.get
+        return cls(get('ID'), get('product'), get('quantity'), get('category'))
+
+    def __repr__(self):
+        return f"ProductItem(Code={self.Code!r}, Description={self.Description!r})"
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+
+def items_to_dataframe(items):
+    """
+    Convert records to a pandas DataFrame for analytics or export.
+    pandas is imported here, not at module load, to keep it off the request path.
+    """
+    import pandas as pd
+    from request_metrics import timed
+    with timed('dataframe'):
+        return pd.DataFrame([item.as_dict() for item in items])
@@ -0,0 +1,91 @@
+import json
+import base64
+import binascii
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class Page:
+    """
+    One page of a keyset-paginated listing.
+
+    next_cursor / prev_cursor are opaque strings (None at either end) to pass
+    back as the cursor parameter to move forwards or backwards.
+    """
+
+    __slots__ = ('items', 'next_cursor', 'prev_cursor')
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(direction, key):
+    """Pack a direction ('next' or 'prev') and a sort key into a URL-safe token."""
+    raw = json.dumps([direction, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """
+    Unpack a cursor token.
+
+    Returns:
+        tuple: (direction, key), or (None, None) for a missing or malformed token
+    """
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, key = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None, None
+    if direction not in ('next', 'prev'):
+        return None, None
+    # JSON has no tuples; composite keys come back as lists
+    return direction, tuple(key) if isinstance(key, list) else key
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a requested page size, clamped to 1..MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def make_page(items, keys, limit, direction):
+    """
+    Build a Page from up to limit + 1 fetched items.
+
+    Fetchers ask for one item more than the page size in the direction of
+    travel, so whether another page exists is known without a COUNT query.
+
+    Args:
+        items (list): Items in display order
+        keys (list): Sort key of each item
+        limit (int): Page size
+        direction (str): 'next', 'prev', or None for the first page
+    """
+    has_more = len(items) > limit
+    if direction == 'prev':
+        # The look-ahead item sits in front of the page
+        if has_more:
+            items, keys = items[-limit:], keys[-limit:]
+        return Page(
+            items,
+            next_cursor=encode_cursor('next', keys[-1]) if items else None,
+            prev_cursor=encode_cursor('prev', keys[0]) if has_more else None,
+        )
+    if has_more:
+        items, keys = items[:limit], keys[:limit]
+    return Page(
+        items,
+        next_cursor=encode_cursor('next', keys[-1]) if has_more else None,
+        prev_cursor=encode_cursor('prev', keys[0]) if direction and items else None,
+    )
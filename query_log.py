@@ -0,0 +1,271 @@
+"""
+Slow-query log for every statement run on a pooled MySQL connection (the
+equipment and products databases, their replicas, imports and the ID
+allocator).
+
+Statements are grouped by fingerprint: string and number literals and
+placeholders become ?, and IN lists and multi-row VALUES collapse to one
+form whatever their length. Each fingerprint keeps its count, total and
+max time and failures. The first time a fingerprint runs slower than
+SLOW_QUERY_MS, it is EXPLAINed once on a separate connection, in the
+background, and the plan is logged with its warning signs (full table
+scans, filesort, temporary tables). /admin/slow_queries lists the top
+offenders across all workers.
+"""
+import os
+import re
+import queue
+import threading
+from functools import partial
+
+from env_cred import slow_query_ms, query_log_size
+import request_metrics
+
+#######################################################
+##### FINGERPRINTS
+#######################################################
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s|\?")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*\([?,\s]*\)(?:\s*,\s*\([?,\s]*\))*", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+_fingerprints = {}
+_MAX_CACHED_FINGERPRINTS = 4096
+
+def fingerprint(sql):
+    """
+    Normalised form of a statement, the same for every literal value and
+    IN-list length:
+
+        SELECT a FROM t WHERE id IN (%s, %s, %s) AND b = 'x' LIMIT 50
+        -> SELECT a FROM t WHERE id IN (...) AND b = ? LIMIT ?
+    """
+    text = _fingerprints.get(sql)
+    if text is None:
+        text = _STRING_RE.sub('?', sql)
+        text = _NUMBER_RE.sub('?', text)
+        text = _PLACEHOLDER_RE.sub('?', text)
+        text = _IN_LIST_RE.sub('IN (...)', text)
+        text = _VALUES_RE.sub('VALUES (...)', text)
+        text = _SPACE_RE.sub(' ', text).strip()
+        # Statement text comes from a bounded set of query shapes; this is a backstop
+        if len(_fingerprints) >= _MAX_CACHED_FINGERPRINTS:
+            _fingerprints.clear()
+        _fingerprints[sql] = text
+    return text
+
+#######################################################
+##### PLANS
+#######################################################
+
+# Statements MySQL can EXPLAIN without running them
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+def plan_flags(plan):
+    """
+    Warning signs in the rows of a tabular MySQL EXPLAIN: full table or
+    index scans, filesorts and temporary tables.
+    """
+    flags = []
+    for row in plan or ():
+        table = row.get('table')
+        extra = row.get('Extra') or ''
+        if row.get('type') == 'ALL':
+            flags.append(f"full scan of {table} (~{row.get('rows')} rows)")
+        elif row.get('type') == 'index':
+            flags.append(f"full index scan of {table} (~{row.get('rows')} rows)")
+        if 'Using filesort' in extra:
+            flags.append(f"filesort on {table}")
+        if 'Using temporary' in extra:
+            flags.append(f"temporary table for {table}")
+    return flags
+
+#######################################################
+##### LOG
+#######################################################
+
+class QueryLog:
+    """
+    Per-fingerprint statement statistics for this process, plus the
+    background EXPLAIN of slow ones.
+
+    Args:
+        threshold (float): Seconds after which a statement counts as slow
+        max_fingerprints (int): Distinct fingerprints tracked; later ones
+            are folded into a single "(other)" entry
+    """
+
+    OTHER = '(other)'
+
+    def __init__(self, threshold=0.1, max_fingerprints=500):
+        self.threshold = threshold
+        self.max_fingerprints = max_fingerprints
+        self._reset()
+
+    def _reset(self):
+        # Also called in a forked child: the parent's statistics and queue stay with it
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._explained = set()
+        self._queue = queue.SimpleQueue()
+        self._thread_started = False
+        self._dirty = False
+
+    def record(self, sql, args, seconds, failed, explain=None):
+        """
+        Count one statement. Used as a TimedCursor observer, with explain
+        bound to a callable returning a connection to the same database.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        text = fingerprint(sql)
+        if text.startswith('EXPLAIN'):
+            return
+        slow = seconds >= self.threshold
+        with self._lock:
+            stats = self._stats.get(text)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    text = self.OTHER
+                    stats = self._stats.get(text)
+                if stats is None:
+                    stats = self._stats[text] = {
+                        'count': 0, 'total': 0.0, 'max': 0.0, 'errors': 0, 'slow': 0,
+                        'sample': None, 'plan': None, 'flags': None,
+                    }
+            stats['count'] += 1
+            stats['total'] += seconds
+            if seconds > stats['max']:
+                stats['max'] = seconds
+            if failed:
+                stats['errors'] += 1
+            self._dirty = True
+            if not slow:
+                return
+            stats['slow'] += 1
+            stats['sample'] = _SPACE_RE.sub(' ', sql).strip()[:2000]
+            need_plan = (explain is not None and args is not None and text != self.OTHER
+                         and text not in self._explained
+                         and text.split(' ', 1)[0].upper() in _EXPLAINABLE)
+            if need_plan:
+                self._explained.add(text)
+        if need_plan:
+            self._queue.put((text, sql, args, seconds, explain))
+            self._ensure_thread()
+        else:
+            print(f"Slow query ({seconds * 1000:.0f} ms): {text}")
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread_started:
+                return
+            self._thread_started = True
+        threading.Thread(target=self._run, args=(self._queue,), name='query-explain',
+                         daemon=True).start()
+
+    def _run(self, pending):
+        while True:
+            self._explain(*pending.get())
+
+    def _explain(self, text, sql, args, seconds, connect):
+        plan = None
+        try:
+            conn = connect()
+        except Exception as e:
+            print(f"Error connecting to EXPLAIN a slow query: {e}")
+            conn = None
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("EXPLAIN " + sql, args)
+                    plan = [dict(row) for row in cursor.fetchall()]
+            except Exception as e:
+                print(f"Error explaining slow query {text}: {e}")
+            finally:
+                conn.close()
+        flags = plan_flags(plan)
+        with self._lock:
+            stats = self._stats.get(text)
+            if stats is not None:
+                stats['plan'] = plan
+                stats['flags'] = flags
+                self._dirty = True
+
+        print(f"Slow query ({seconds * 1000:.0f} ms): {text}")
+        print(f"  Plan warnings: {'; '.join(flags) if flags else 'none'}")
+        for row in plan or ():
+            print(f"  {row.get('table')}: type={row.get('type')} key={row.get('key')} "
+                  f"rows={row.get('rows')} extra={row.get('Extra')}")
+
+    def snapshot(self):
+        """This process's statistics: fingerprint -> stats dict (copies)."""
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            return {text: dict(stats) for text, stats in self._stats.items()}
+
+    def publish(self):
+        """Write this process's statistics for the other workers to read."""
+        if self._dirty:
+            self._dirty = False
+            request_metrics.write_shared('queries', self.snapshot())
+
+    def top(self, limit=50, order='total'):
+        """
+        The heaviest fingerprints across every worker.
+
+        Args:
+            limit (int): How many to return
+            order (str): 'total', 'max', 'count', 'avg' or 'errors'
+
+        Returns:
+            list: Dicts with fingerprint, count, total_ms, avg_ms, max_ms,
+                errors, slow, sample, plan and flags
+        """
+        merged = self.snapshot()
+        for state in request_metrics.read_shared('queries'):
+            for text, stats in state.items():
+                mine = merged.get(text)
+                if mine is None:
+                    merged[text] = stats
+                    continue
+                for key in ('count', 'total', 'errors', 'slow'):
+                    mine[key] += stats[key]
+                mine['max'] = max(mine['max'], stats['max'])
+                for key in ('sample', 'plan', 'flags'):
+                    if mine[key] is None:
+                        mine[key] = stats[key]
+
+        rows = []
+        for text, stats in merged.items():
+            rows.append({
+                'fingerprint': text,
+                'count': stats['count'],
+                'total_ms': round(stats['total'] * 1000, 1),
+                'avg_ms': round(stats['total'] * 1000 / stats['count'], 2) if stats['count'] else 0.0,
+                'max_ms': round(stats['max'] * 1000, 1),
+                'errors': stats['errors'],
+                'slow': stats['slow'],
+                'sample': stats['sample'],
+                'plan': stats['plan'],
+                'flags': stats['flags'],
+            })
+        key = {'total': 'total_ms', 'max': 'max_ms', 'count': 'count', 'avg': 'avg_ms',
+               'errors': 'errors'}.get(order, 'total_ms')
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+
+query_log = QueryLog(
+    threshold=float(slow_query_ms) / 1000 if slow_query_ms else 0.1,
+    max_fingerprints=int(query_log_size) if query_log_size else 500,
+)
+request_metrics.on_flush(query_log.publish)
+
+def observer(connect):
+    """TimedCursor observer recording into query_log, EXPLAINing through connect()."""
+    return partial(query_log.record, explain=connect)
@@ -0,0 +1,433 @@
+"""
+Per-request timing: where a request's time went (database connect and
+queries, S3, in-memory search, DataFrame work, template rendering), as a
+Server-Timing header on the response and as Prometheus histograms at
+/metrics.
+
+Hooks call timed(phase) / count(name); outside a request they do nothing.
+Each gunicorn worker keeps its own histograms and writes them to a file
+in the shared metrics directory every few seconds, and /metrics merges
+every worker's file, so a scrape sees the whole server whichever worker
+answers it.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from time import perf_counter
+
+from env_cred import metrics_dir, metrics_flush_seconds
+
+#######################################################
+##### PER-REQUEST RECORDING
+#######################################################
+
+# Phases in Server-Timing order
+PHASES = ('connect', 'query', 's3', 'search', 'dataframe', 'render')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Seconds and calls per phase, plus counters, for one request."""
+
+    __slots__ = ('started', 'phases', 'counts')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.phases = {}
+        self.counts = {}
+
+    def add(self, phase, seconds, calls=1):
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+
+def begin_request():
+    """Start recording a new request in this context."""
+    _current.set(RequestTimings())
+
+def current():
+    """This context's RequestTimings, or None outside a request."""
+    return _current.get()
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to phase (also usable as a decorator)."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, perf_counter() - started)
+
+def add_time(phase, seconds, calls=1):
+    """Add time measured elsewhere (e.g. across a batch of threads) to phase."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds, calls)
+
+def count(name, n=1):
+    """Add n to a per-request counter ('queries', 's3_calls', 'rows')."""
+    timings = _current.get()
+    if timings is not None:
+        timings.counts[name] = timings.counts.get(name, 0) + n
+
+
+class TimedCursor:
+    """
+    Cursor proxy adding statement time to the 'query' phase and counting
+    queries and rows returned. Wraps pymysql and replica cursors alike.
+
+    Args:
+        cursor: The cursor being wrapped
+        observer (callable): Optional; called as observer(sql, args, seconds,
+            failed) after every statement (see query_log)
+    """
+
+    __slots__ = ('_cursor', '_observer')
+
+    def __init__(self, cursor, observer=None):
+        self._cursor = cursor
+        self._observer = observer
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query, args=None):
+        started = perf_counter()
+        failed = True
+        try:
+            result = self._cursor.execute(query, args)
+            failed = False
+            return result
+        finally:
+            self._executed(query, args, perf_counter() - started, failed)
+
+    def executemany(self, query, args):
+        started = perf_counter()
+        failed = True
+        try:
+            result = self._cursor.executemany(query, args)
+            failed = False
+            return result
+        finally:
+            # No single parameter set to EXPLAIN with, so none is passed on
+            self._executed(query, None, perf_counter() - started, failed)
+
+    def _executed(self, query, args, seconds, failed):
+        timings = _current.get()
+        if timings is not None:
+            timings.add('query', seconds)
+            timings.counts['queries'] = timings.counts.get('queries', 0) + 1
+        if self._observer is not None:
+            self._observer(query, args, seconds, failed)
+
+    def _fetched(self, started, rows):
+        timings = _current.get()
+        if timings is not None:
+            # An unbuffered cursor's fetches are reads from the server too
+            timings.add('query', perf_counter() - started, calls=0)
+            timings.counts['rows'] = timings.counts.get('rows', 0) + rows
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        started = perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchone(self):
+        started = perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 1 if row is not None else 0)
+        return row
+
+#######################################################
+##### HISTOGRAMS
+#######################################################
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 10000, 100000, 1000000)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with fixed buckets, one series per label
+    tuple. Per-bucket (not cumulative) counts are kept, so merging workers
+    is plain addition.
+    """
+
+    def __init__(self, name, help, labelnames, buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts = self.series.get(labels)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+class Counter:
+    """Prometheus-style counter, one series per label tuple."""
+
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+
+REQUESTS = Counter('inventory_requests_total', "Requests served", ('endpoint', 'status'))
+REQUEST_SECONDS = Histogram('inventory_request_duration_seconds', "Request handling time",
+                            ('endpoint',), SECONDS_BUCKETS)
+PHASE_SECONDS = Histogram('inventory_request_phase_seconds', "Time per request spent in each phase",
+                          ('endpoint', 'phase'), SECONDS_BUCKETS)
+REQUEST_QUERIES = Histogram('inventory_request_queries', "SQL statements per request",
+                            ('endpoint',), COUNT_BUCKETS)
+REQUEST_S3_CALLS = Histogram('inventory_request_s3_calls', "S3 calls per request",
+                             ('endpoint',), COUNT_BUCKETS)
+REQUEST_ROWS = Histogram('inventory_request_rows', "Database rows returned per request",
+                         ('endpoint',), ROW_BUCKETS)
+METRICS = (REQUESTS, REQUEST_SECONDS, PHASE_SECONDS, REQUEST_QUERIES, REQUEST_S3_CALLS,
+           REQUEST_ROWS)
+
+_lock = threading.Lock()
+_state_pid = os.getpid()
+_dirty = False
+
+def finish_request(endpoint, status):
+    """
+    Stop recording this context's request: fold it into the histograms and
+    return its Server-Timing header value (None outside a request).
+    """
+    global _dirty
+    timings = _current.get()
+    if timings is None:
+        return None
+    _current.set(None)
+    total = perf_counter() - timings.started
+    endpoint = endpoint or 'unmatched'
+    counts = timings.counts
+
+    _check_pid()
+    with _lock:
+        REQUESTS.inc((endpoint, str(status)))
+        REQUEST_SECONDS.observe((endpoint,), total)
+        for phase, (seconds, _) in timings.phases.items():
+            PHASE_SECONDS.observe((endpoint, phase), seconds)
+        REQUEST_QUERIES.observe((endpoint,), counts.get('queries', 0))
+        REQUEST_S3_CALLS.observe((endpoint,), counts.get('s3_calls', 0))
+        REQUEST_ROWS.observe((endpoint,), counts.get('rows', 0))
+        _dirty = True
+    _ensure_flusher()
+    return server_timing(timings, total)
+
+def server_timing(timings, total):
+    """Server-Timing header value: one metric per phase used, then the total."""
+    counts = timings.counts
+    notes = {
+        'query': f"{counts.get('queries', 0)} queries, {counts.get('rows', 0)} rows",
+        's3': f"{counts.get('s3_calls', 0)} calls",
+    }
+    parts = []
+    for phase in PHASES:
+        entry = timings.phases.get(phase)
+        if entry is not None:
+            part = f"{phase};dur={entry[0] * 1000:.2f}"
+            if phase in notes:
+                part += f';desc="{notes[phase]}"'
+            parts.append(part)
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
+
+#######################################################
+##### ACROSS WORKERS
+#######################################################
+
+_metrics_dir = metrics_dir
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+FLUSH_SECONDS = float(metrics_flush_seconds) if metrics_flush_seconds else 5.0
+
+def set_metrics_dir(path, clear=False):
+    """
+    Share histograms between processes through files in path. Call in the
+    gunicorn master before forking; clear=True drops files from earlier runs.
+    """
+    global _metrics_dir
+    os.makedirs(path, exist_ok=True)
+    if clear:
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                os.remove(os.path.join(path, name))
+    _metrics_dir = path
+
+def _check_pid():
+    # Series inherited across a fork belong to the parent, which reports them itself
+    global _state_pid, _lock
+    if _state_pid != os.getpid():
+        _lock = threading.Lock()
+        for metric in METRICS:
+            metric.series = {}
+        _state_pid = os.getpid()
+
+def _snapshot():
+    with _lock:
+        return {metric.name: [[list(labels), values if isinstance(values, (int, float))
+                               else list(values)] for labels, values in metric.series.items()]
+                for metric in METRICS}
+
+def write_shared(kind, state):
+    """Publish this process's state of one kind (e.g. 'metrics') to the other workers."""
+    if not _metrics_dir:
+        return
+    path = os.path.join(_metrics_dir, f"{kind}-{os.getpid()}.json")
+    try:
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"Error writing {kind}: {e}")
+
+def read_shared(kind):
+    """States of one kind published by every other process."""
+    if not _metrics_dir or not os.path.isdir(_metrics_dir):
+        return []
+    prefix = f"{kind}-"
+    own = f"{kind}-{os.getpid()}.json"
+    states = []
+    for filename in os.listdir(_metrics_dir):
+        if not filename.startswith(prefix) or not filename.endswith('.json') or filename == own:
+            continue
+        try:
+            with open(os.path.join(_metrics_dir, filename)) as f:
+                states.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return states
+
+# Other per-process state written out alongside the histograms (see query_log)
+_flush_hooks = []
+
+def on_flush(hook):
+    """Call hook() whenever the histograms are flushed."""
+    _flush_hooks.append(hook)
+
+def flush():
+    """Write this process's series to the metrics directory, if it changed."""
+    global _dirty
+    if not _metrics_dir:
+        return
+    for hook in _flush_hooks:
+        hook()
+    if not _dirty:
+        return
+    _dirty = False
+    write_shared('metrics', _snapshot())
+
+def _ensure_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    if not _metrics_dir or _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid != pid:
+            # Threads do not survive a fork; each worker runs its own
+            _flusher_pid = pid
+            threading.Thread(target=_run_flusher, name='metrics-flush', daemon=True).start()
+
+def _run_flusher():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        flush()
+
+def _merge(target, metric_name, series):
+    merged = target.setdefault(metric_name, {})
+    for labels, values in series:
+        labels = tuple(labels)
+        current = merged.get(labels)
+        if current is None:
+            merged[labels] = values
+        elif isinstance(values, list):
+            merged[labels] = [a + b for a, b in zip(current, values)]
+        else:
+            merged[labels] = current + values
+
+def _collect():
+    """Series of every process: this one live, the others from their files."""
+    _check_pid()
+    merged = {}
+    for name, series in _snapshot().items():
+        _merge(merged, name, series)
+    for state in read_shared('metrics'):
+        for name, series in state.items():
+            _merge(merged, name, series)
+    return merged
+
+#######################################################
+##### EXPOSITION
+#######################################################
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render_metrics():
+    """Every metric, merged across workers, in the Prometheus text format."""
+    merged = _collect()
+    lines = []
+    for metric in METRICS:
+        kind = 'histogram' if isinstance(metric, Histogram) else 'counter'
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        for labels, values in sorted(merged.get(metric.name, {}).items()):
+            if kind == 'counter':
+                lines.append(f"{metric.name}{_label_text(metric.labelnames, labels)} {values}")
+                continue
+            cumulative = 0
+            bounds = [str(bound) for bound in metric.buckets] + ['+Inf']
+            for bound, bucket in zip(bounds, values[:-1]):
+                cumulative += bucket
+                text = _label_text(metric.labelnames, labels, [('le', bound)])
+                lines.append(f"{metric.name}_bucket{text} {cumulative}")
+            text = _label_text(metric.labelnames, labels)
+            lines.append(f"{metric.name}_sum{text} {values[-1]}")
+            lines.append(f"{metric.name}_count{text} {cumulative}")
+    return '\n'.join(lines) + '\n'
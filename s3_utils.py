@@ -1,37 +1,253 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 from env_cred import s3_access_key_id, s3_secret_access_key, s3_region, s3_bucket_name
+from env_cred import image_cache_ttl, image_cache_size, image_lookup_workers
+from image_manifest import IMAGE_PREFIX, get_manifest, s3_public_url
+from request_metrics import add_time, count
 
-def get_product_image_url(product_key):
+#######################################################
+##### SHARED CLIENT
+#######################################################
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_s3_client():
     """
-    Get the URL of the first image for a product from S3 bucket.
-    
-    Args:
-        product_key (str): The product code/ID to look up
-        
-    Returns:
-        str or None: URL of the first image if found, None otherwise
+    Return the process-wide S3 client, creating it on first use.
+
+    boto3 clients are thread-safe but must not cross a fork, so a new one is
+    built whenever the current pid differs from the one that created it.
     """
-    # Connect to S3 using environment variables
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=s3_access_key_id,
-        aws_secret_access_key=s3_secret_access_key,
-        region_name=s3_region
-    )
-    
-    prefix = f"engineer-inventory/product_id/{product_key}/"
-    
-    # List objects in the product folder
-    response = s3_client.list_objects_v2(
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = boto3.client(
+                's3',
+                aws_access_key_id=s3_access_key_id,
+                aws_secret_access_key=s3_secret_access_key,
+                region_name=s3_region
+            )
+            _client_pid = pid
+    return _client
+
+#######################################################
+##### IMAGE URL CACHE
+#######################################################
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries expire after ttl seconds.
+
+    None is a valid cached value, so "no image" answers are remembered too.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+image_url_cache = TTLCache(
+    maxsize=int(image_cache_size) if image_cache_size else 10000,
+    ttl=float(image_cache_ttl) if image_cache_ttl else 300.0
+)
+
+def image_cache_stats():
+    """Return hit/miss counters for the product image URL cache."""
+    return image_url_cache.stats()
+
+#######################################################
+##### LOOKUPS
+#######################################################
+
+def _fetch_product_image_url(product_key):
+    """Ask S3 for the first image under the product's prefix."""
+    prefix = f"{IMAGE_PREFIX}{product_key}/"
+
+    # MaxKeys=1: only the first image is ever used
+    response = get_s3_client().list_objects_v2(
         Bucket=s3_bucket_name,
-        Prefix=prefix
+        Prefix=prefix,
+        MaxKeys=1
     )
-    
+
     # Check if any objects were found
     if 'Contents' in response and len(response['Contents']) > 0:
         # Get the first image key
         first_image_key = response['Contents'][0]['Key']
-        public_url = f"https://{s3_bucket_name}.s3.amazonaws.com/{first_image_key}"
-        return public_url
+        return s3_public_url(first_image_key)
     else:
-        return None
\ No newline at end of file
+        return None
+
+def get_product_image_url(product_key):
+    """
+    Get the URL of the first image for a product from S3 bucket.
+
+    Args:
+        product_key (str): The product code/ID to look up
+
+    Returns:
+        str or None: URL of the first image if found, None otherwise
+    """
+    product_key = str(product_key)
+    manifest = get_manifest()
+    if manifest is not None and manifest.ready:
+        return manifest.lookup(product_key)
+
+    # Manifest still building (or disabled): fall back to a cached listing
+    url = image_url_cache.get(product_key)
+    if url is _MISSING:
+        started = time.perf_counter()
+        url = _fetch_product_image_url(product_key)
+        add_time('s3', time.perf_counter() - started)
+        count('s3_calls')
+        image_url_cache.set(product_key, url)
+    return url
+
+_executor = None
+_executor_pid = None
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _client_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(image_lookup_workers) if image_lookup_workers else 16,
+                thread_name_prefix='s3-image'
+            )
+            _executor_pid = pid
+    return _executor
+
+def reset_s3_client():
+    """
+    Drop the S3 client and lookup threads inherited across a fork, so this
+    process builds its own on next use. Called from gunicorn's post_fork
+    hook; the pid checks above catch any other fork lazily.
+    """
+    global _client, _client_pid, _client_lock, _executor, _executor_pid
+    _client_lock = threading.Lock()
+    _client = _client_pid = None
+    _executor = _executor_pid = None
+
+def get_product_image_urls(product_keys):
+    """
+    Resolve image URLs for many products at once.
+
+    Answered from the image manifest once it is ready. Until then cached
+    codes are answered from memory and the remaining ones are looked up
+    in parallel so the batch costs roughly one S3 round trip of wall time.
+    A failed lookup is reported as None and not cached.
+
+    Args:
+        product_keys (iterable): Product codes/IDs to look up
+
+    Returns:
+        dict: Maps each product code (as str) to its URL or None
+    """
+    urls, pending = known_product_image_urls(product_keys)
+    if not pending:
+        return urls
+    # Timed as one wall-clock span: the lookups overlap on the worker threads
+    started = time.perf_counter()
+    if len(pending) > 1:
+        results = list(_get_executor().map(_safe_fetch, pending))
+    else:
+        results = [_safe_fetch(pending[0])]
+    add_time('s3', time.perf_counter() - started, calls=len(pending))
+    count('s3_calls', len(pending))
+    remember_product_image_urls(urls, pending, results)
+    return urls
+
+def known_product_image_urls(product_keys):
+    """
+    The part of a batch lookup answered without S3: every code from the
+    manifest once it is ready, otherwise whatever the URL cache holds.
+
+    Args:
+        product_keys (iterable): Product codes/IDs to look up
+
+    Returns:
+        tuple: (dict of code (as str) -> URL or None, list of codes still to fetch)
+    """
+    manifest = get_manifest()
+    if manifest is not None and manifest.ready:
+        return {str(k): manifest.lookup(k) for k in product_keys}, []
+
+    urls = {}
+    pending = []
+    for key in dict.fromkeys(str(k) for k in product_keys):
+        url = image_url_cache.get(key)
+        if url is _MISSING:
+            pending.append(key)
+        else:
+            urls[key] = url
+    return urls, pending
+
+def remember_product_image_urls(urls, pending, results):
+    """
+    Add fetched (url, ok) results for the pending codes to urls, caching
+    the successful ones.
+    """
+    for key, (url, ok) in zip(pending, results):
+        if ok:
+            image_url_cache.set(key, url)
+        urls[key] = url
+
+def _safe_fetch(product_key):
+    try:
+        return _fetch_product_image_url(product_key), True
+    except Exception as e:
+        print(f"Error fetching image for {product_key}: {e}")
+        return None, False
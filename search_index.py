@@ -0,0 +1,445 @@
+import re
+import math
+import heapq
+import bisect
+import threading
+
+# EquipmentItem fields searched and how much a match in each counts towards the score
+FIELD_WEIGHTS = {
+    'Description': 3.0,
+    'Make': 2.0,
+    'Model': 2.0,
+    'Sub_Category': 1.5,
+    'Specification': 1.0,
+    'Certification': 1.0,
+}
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Runs of letters and digits in any script (and underscores), so "Düsseldorf"
+# stays one token
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    """Case-fold a value and split it into alphanumeric tokens."""
+    if text is None:
+        return []
+    return _TOKEN_RE.findall(str(text).casefold())
+
+def _tf_weight(tf, length, avg_len):
+    """BM25 saturation of a term frequency, normalised by document length."""
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_len))
+
+# Query tokens at least this long find their terms through the trigram index;
+# shorter ones scan the vocabulary
+GRAM = 3
+
+def _grams(term):
+    return {term[i:i + GRAM] for i in range(len(term) - GRAM + 1)}
+
+# Query tokens whose ranked codes are cached; past this the cache starts over
+_MAX_CACHED_ORDERS = 1024
+# Relative change in average document length or document count after which
+# a cached order is re-scored
+ORDER_DRIFT = 0.01
+
+#######################################################
+##### INDEX
+#######################################################
+
+class SearchIndex:
+    """
+    In-memory inverted index over the equipment text fields, ranked with
+    BM25 on field-weighted term frequencies (BM25F style).
+
+    Every query term must match (AND). A query term matches every indexed
+    token containing it, so "hydra" finds "hydraulic" and "meter" finds
+    "multimeter", as the old LIKE '%term%' search did. Unlike LIKE, the
+    words of a query are matched separately, in any order and any field,
+    rather than as one phrase.
+
+    Args:
+        field_weights (dict): Field name -> weight
+    """
+
+    def __init__(self, field_weights=FIELD_WEIGHTS):
+        self.field_weights = field_weights
+        self._postings = {}   # term -> {code: weighted tf}
+        self._doc_terms = {}  # code -> {term: weighted tf}
+        self._doc_len = {}    # code -> weighted length
+        self._total_len = 0.0
+        self._grams = {}      # trigram -> terms containing it
+        self._impacts = {}    # query token -> (avg_len, n_docs, codes by descending score)
+        self._impact_deps = {}  # term -> query tokens whose cached order it is part of
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def _analyse(self, item):
+        terms = {}
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            for token in tokenize(getattr(item, field, None)):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+        return terms, length
+
+    def add(self, code, item):
+        """Index a record, replacing any previous version of it."""
+        terms, length = self._analyse(item)
+        with self._lock:
+            self._remove(code)
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._add_term(term)
+                postings[code] = tf
+                self._invalidate(term)
+            self._doc_terms[code] = terms
+            self._doc_len[code] = length
+            self._total_len += length
+
+    def remove(self, code):
+        with self._lock:
+            self._remove(code)
+
+    def _remove(self, code):
+        terms = self._doc_terms.pop(code, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[code]
+            self._invalidate(term)
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+        self._total_len -= self._doc_len.pop(code)
+
+    def _add_term(self, term):
+        for gram in _grams(term):
+            terms = self._grams.get(gram)
+            if terms is None:
+                terms = self._grams[gram] = set()
+            terms.add(term)
+        # A cached query token contained in the new term now matches more
+        for token in [token for token in self._impacts if token in term]:
+            del self._impacts[token]
+
+    def _drop_term(self, term):
+        for gram in _grams(term):
+            terms = self._grams[gram]
+            terms.discard(term)
+            if not terms:
+                del self._grams[gram]
+        self._impact_deps.pop(term, None)
+
+    def _invalidate(self, term):
+        """Drop the cached orders of every query token that expands to term."""
+        tokens = self._impact_deps.pop(term, None)
+        if tokens:
+            for token in tokens:
+                self._impacts.pop(token, None)
+
+    def rebuild(self, rows):
+        """Replace the whole index with the given (code, record) pairs."""
+        fresh = SearchIndex(self.field_weights)
+        for code, item in rows:
+            fresh.add(code, item)
+        with self._lock:
+            self._postings = fresh._postings
+            self._doc_terms = fresh._doc_terms
+            self._doc_len = fresh._doc_len
+            self._total_len = fresh._total_len
+            self._grams = fresh._grams
+            self._impacts = {}
+            self._impact_deps = {}
+
+    def _expand(self, token):
+        """Every indexed term containing token (all of them, however many)."""
+        if len(token) < GRAM:
+            return [term for term in self._postings if token in term]
+        sets = []
+        for gram in _grams(token):
+            terms = self._grams.get(gram)
+            if not terms:
+                return []
+            sets.append(terms)
+        sets.sort(key=len)
+        matches = sets[0].intersection(*sets[1:])
+        if len(token) == GRAM:
+            return list(matches)
+        return [term for term in matches if token in term]
+
+    def _impact_order(self, token, terms, n_docs, avg_len):
+        # A one-word query is scored the same way on every request, so its
+        # codes are cached as sorted (-score, code) keys. Postings changes
+        # drop the entry (see _invalidate); collection statistics only move
+        # scores a little per write, so the entry is kept until the average
+        # length or document count drifts past ORDER_DRIFT
+        cached = self._impacts.get(token)
+        if cached is not None:
+            built_len, built_docs, ranked = cached
+            if (abs(avg_len - built_len) <= ORDER_DRIFT * built_len
+                    and abs(n_docs - built_docs) <= ORDER_DRIFT * built_docs):
+                return ranked
+        scores = {}
+        doc_len = self._doc_len
+        for term, postings in terms:
+            idf = _idf(n_docs, len(postings))
+            for code, tf in postings.items():
+                scores[code] = scores.get(code, 0.0) + idf * _tf_weight(tf, doc_len[code], avg_len)
+        ranked = [(-score, code) for code, score in scores.items()]
+        ranked.sort()
+        if len(self._impacts) >= _MAX_CACHED_ORDERS:
+            self._impacts = {}
+            self._impact_deps = {}
+        self._impacts[token] = (avg_len, n_docs, ranked)
+        for term, _ in terms:
+            deps = self._impact_deps.get(term)
+            if deps is None:
+                deps = self._impact_deps[term] = set()
+            deps.add(token)
+        return ranked
+
+    def search(self, query, limit=None, allowed=None):
+        """
+        Rank documents matching every query term.
+
+        Args:
+            query (str): Free-text query
+            limit (int): Return at most this many codes (all when None)
+            allowed (callable): Optional code -> bool filter applied before scoring
+
+        Returns:
+            list: Item codes, best match first
+        """
+        codes = self.search_page(query, limit, allowed)[0]
+        return codes if limit is None else codes[:limit]
+
+    def matches(self, query):
+        """Every code matching all query terms, unranked (a set)."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return set()
+        with self._lock:
+            groups = []
+            for token in tokens:
+                terms = self._expand(token)
+                if not terms:
+                    return set()
+                groups.append([(term, self._postings[term]) for term in terms])
+            return _intersect(groups)
+
+    def search_page(self, query, limit=None, allowed=None, direction=None, key=None):
+        """
+        Rank documents matching every query term, one keyset page at a time.
+
+        Results are ordered by sort key (-score, code), so ties break on item
+        code. Keys are only comparable between pages of the same query.
+
+        Args:
+            query (str): Free-text query
+            limit (int): Page size (everything when None)
+            allowed (callable): Optional code -> bool filter applied before scoring
+            direction (str): 'next' for items after key, 'prev' for items before it
+            key (tuple): Sort key of the page boundary
+
+        Returns:
+            tuple: (codes, keys) in ranked order; with a limit, one extra item
+            is included in the direction of travel to show whether more exist
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return [], []
+        fetch = None if limit is None else limit + 1
+
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return [], []
+            avg_len = self._total_len / n_docs or 1.0
+
+            # Each query term becomes the postings of every token containing it
+            groups = []
+            for token in tokens:
+                terms = self._expand(token)
+                if not terms:
+                    return [], []
+                groups.append([(term, self._postings[term]) for term in terms])
+
+            # A single word needs no scoring per request: walk its codes in
+            # precomputed score order and stop once enough have passed
+            if fetch is not None and len(groups) == 1:
+                ranked = self._impact_order(tokens[0], groups[0], n_docs, avg_len)
+                return _walk(ranked, fetch, allowed, direction, key)
+
+            candidates = _intersect(groups)
+            if not candidates:
+                return [], []
+            if allowed is not None:
+                candidates = [code for code in candidates if allowed(code)]
+
+            doc_len = self._doc_len
+            scores = dict.fromkeys(candidates, 0.0)
+            for group in groups:
+                for _, postings in group:
+                    idf = _idf(n_docs, len(postings))
+                    # Walk whichever side is smaller: a word can expand to
+                    # many short posting lists
+                    if len(postings) < len(scores):
+                        matched = ((code, tf) for code, tf in postings.items() if code in scores)
+                    else:
+                        matched = ((code, postings[code]) for code in scores if code in postings)
+                    for code, tf in matched:
+                        scores[code] += idf * _tf_weight(tf, doc_len[code], avg_len)
+
+        # Every candidate is scored whichever page is asked for, so a deep
+        # page costs the same as the first one
+        ranked = [(-score, code) for code, score in scores.items()]
+        if direction == 'next':
+            ranked = [entry for entry in ranked if entry > key]
+        elif direction == 'prev':
+            ranked = [entry for entry in ranked if entry < key]
+        if fetch is None:
+            ranked.sort()
+        elif direction == 'prev':
+            ranked = heapq.nlargest(fetch, ranked)
+            ranked.reverse()
+        else:
+            ranked = heapq.nsmallest(fetch, ranked)
+        return [code for _, code in ranked], ranked
+
+
+def _idf(n_docs, df):
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+def _intersect(groups):
+    """AND the query terms: start from the rarest one and intersect."""
+    groups = sorted(groups, key=lambda group: sum(len(p) for _, p in group))
+    candidates = set()
+    for _, postings in groups[0]:
+        candidates.update(postings)
+    for group in groups[1:]:
+        matched = set()
+        for _, postings in group:
+            if len(postings) < len(candidates):
+                matched.update(code for code in postings if code in candidates)
+            else:
+                matched.update(code for code in candidates if code in postings)
+        if not candidates:
+            break
+    return candidates
+
+def _walk(ranked, fetch, allowed, direction, key):
+    """Collect up to fetch entries from a sorted key list around a boundary."""
+    entries = []
+    if direction == 'prev':
+        i = bisect.bisect_left(ranked, key) - 1
+        while i >= 0 and len(entries) < fetch:
+            if allowed is None or allowed(ranked[i][1]):
+                entries.append(ranked[i])
+            i -= 1
+        entries.reverse()
+    else:
+        i = bisect.bisect_right(ranked, key) if direction == 'next' else 0
+        if allowed is None:
+            entries = ranked[i:i + fetch]
+        else:
+            while i < len(ranked) and len(entries) < fetch:
+                if allowed(ranked[i][1]):
+                    entries.append(ranked[i])
+                i += 1
+    return [code for _, code in entries], entries
+
+#######################################################
+##### PROCESS-WIDE INDEX
+#######################################################
+
+search_index = SearchIndex()
+
+def _sync_with_snapshot(snapshot, changed_codes):
+    """inventory_cache listener: rebuild fully or re-index changed records."""
+    if changed_codes is None:
+        search_index.rebuild(snapshot.by_code.items())
+        return
+    for code in changed_codes:
+        item = snapshot.by_code.get(code)
+        if item is None:
+            search_index.remove(code)
+        else:
+            search_index.add(code, item)
+
+_registered = False
+_register_lock = threading.Lock()
+
+def get_search_index():
+    """Return the index, hooking it up to the inventory snapshot on first use."""
+    global _registered
+    if not _registered:
+        with _register_lock:
+            if not _registered:
+                from inventory_cache import add_listener
+                add_listener(_sync_with_snapshot)
+                _registered = True
+    return search_index
+
+
+def check_search():
+    """
+    Search a small stand-in catalogue and print what happened: a word
+    contained in more terms than any cap would keep, words inside longer
+    words, and how cached one-word orders follow writes.
+
+    Returns:
+        bool: True if every search found what it should
+    """
+    from types import SimpleNamespace
+
+    index = SearchIndex()
+    descriptions = {code: f"a{code:02d}tool" for code in range(60)}
+    descriptions.update({60: "azimuth sensor", 61: "digital multimeter", 62: "meter stick"})
+    for code, description in descriptions.items():
+        index.add(code, SimpleNamespace(Description=description))
+
+    checks = []
+    checks.append(("every item with an a", len(index.search('a', limit=100)), 62))
+    checks.append(("'azimuth' among them", 60 in index.search('a', limit=100), True))
+    checks.append(("'meter' inside 'multimeter'", sorted(index.search('meter', limit=10)), [61, 62]))
+    checks.append(("'imut' inside 'azimuth'", index.search('imut sensor'), [60]))
+    index.add(63, SimpleNamespace(Description="voltmeters"))
+    checks.append(("new 'voltmeters' after a cached search", sorted(index.search('meter', limit=10)),
+                   [61, 62, 63]))
+    checks.append(("matches() agrees", index.matches('meter'), {61, 62, 63}))
+
+    cached = index._impacts['meter'][2]
+    index.add(0, SimpleNamespace(Description="b00tool"))
+    index.search('meter', limit=10)
+    checks.append(("write to another item keeps 'meter' cached", index._impacts['meter'][2] is cached,
+                   True))
+    # Many long items raise the average length, which lifts the repeated
+    # term of the long 64 above the short 65
+    index.add(64, SimpleNamespace(Description="gasmeter " * 4 + "part " * 96))
+    index.add(65, SimpleNamespace(Description="ammeter"))
+    checks.append(("short 65 ranks first", [code for code in index.search('meter', limit=10)
+                                             if code in (64, 65)], [65, 64]))
+    for code in range(100, 400):
+        index.add(code, SimpleNamespace(Description="spare " * 150))
+    checks.append(("cached order re-ranked after a large length shift",
+                   [code for code in index.search('meter', limit=10) if code in (64, 65)], [64, 65]))
+
+    ok = True
+    for label, result, expected in checks:
+        passed = result == expected
+        ok = ok and passed
+        print(f"{'ok  ' if passed else 'FAIL'} {label}: {result}")
+    return ok
+
+
+# Run directly to check matching against a stand-in catalogue
+if __name__ == "__main__":
+    check_search()
@@ -0,0 +1,21 @@
+"""
+Entry point choosing the serving mode from SERVE_MODE:
+
+    sync (default)  the Flask WSGI app from app.py, on gunicorn's threaded workers
+    async           the ASGI app from async_app.py, on uvicorn workers
+
+    SERVE_MODE=async gunicorn -c gunicorn.conf.py serve:application
+
+gunicorn.conf.py picks the matching worker class from SERVE_MODE.
+"""
+from env_cred import serve_mode
+
+SERVE_MODES = ('sync', 'async')
+SERVE_MODE = (serve_mode or 'sync').lower()
+if SERVE_MODE not in SERVE_MODES:
+    raise ValueError(f"SERVE_MODE must be one of {', '.join(SERVE_MODES)}, not {serve_mode!r}")
+
+if SERVE_MODE == 'async':
+    from async_app import application
+else:
+    from app import app as application
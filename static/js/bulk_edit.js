@@ -0,0 +1,85 @@
+// Bulk edit on the product list
+document.addEventListener('DOMContentLoaded', function() {
+    const bulkForm = document.getElementById('bulkEditForm');
+    const selectAll = document.getElementById('selectAll');
+    const bulkAction = document.getElementById('bulkAction');
+    const bulkValue = document.getElementById('bulkValue');
+    const bulkApply = document.getElementById('bulkApply');
+    const bulkStatus = document.getElementById('bulkStatus');
+
+    if (!bulkForm) {
+        return;
+    }
+
+    function rowCheckboxes() {
+        return Array.from(document.querySelectorAll('.bulk-checkbox'));
+    }
+
+    // Tick or clear every row on the page
+    if (selectAll) {
+        selectAll.addEventListener('change', function() {
+            rowCheckboxes().forEach(function(checkbox) {
+                checkbox.checked = selectAll.checked;
+            });
+        });
+    }
+
+    // Send the edit as JSON so each row can show its own result; without
+    // JavaScript the form posts normally and the page reloads
+    bulkForm.addEventListener('submit', function(event) {
+        event.preventDefault();
+        const codes = rowCheckboxes()
+            .filter(function(checkbox) { return checkbox.checked; })
+            .map(function(checkbox) { return checkbox.value; });
+        if (codes.length === 0) {
+            bulkStatus.textContent = 'Select at least one item.';
+            return;
+        }
+
+        bulkApply.disabled = true;
+        bulkStatus.textContent = 'Saving...';
+        fetch(bulkForm.action, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'Accept': 'application/json'},
+            credentials: 'same-origin',
+            body: JSON.stringify({item_codes: codes, action: bulkAction.value, value: bulkValue.value})
+        }).then(function(response) {
+            if (response.redirected) {
+                // Session expired; fall back to the normal form post
+                bulkForm.submit();
+                return null;
+            }
+            return response.json();
+        }).then(function(data) {
+            if (!data) {
+                return;
+            }
+            if (data.error) {
+                bulkStatus.textContent = data.error;
+                return;
+            }
+            data.results.forEach(showResult);
+            bulkStatus.textContent = data.updated + ' updated, ' + data.failed + ' failed.';
+        }).catch(function() {
+            bulkStatus.textContent = 'Bulk edit failed; nothing was changed.';
+        }).finally(function() {
+            bulkApply.disabled = false;
+        });
+    });
+
+    function showResult(result) {
+        const row = document.querySelector('tr[data-id="' + result.code + '"]');
+        if (!row) {
+            return;
+        }
+        row.classList.remove('bulk-ok', 'bulk-failed');
+        row.classList.add(result.ok ? 'bulk-ok' : 'bulk-failed');
+        row.title = result.message;
+        if (result.ok && bulkAction.value.indexOf('price') !== -1) {
+            const priceCell = row.querySelector('.price-cell');
+            if (priceCell) {
+                priceCell.textContent = result.new;
+            }
+        }
+    }
+});
@@ -3,45 +3,351 @@ document.addEventListener('DOMContentLoaded', function() {
     // Get elements
     const typeSelect = document.getElementById('typeSelect');
     const searchForm = document.getElementById('searchForm');
+    const searchBox = searchForm ? searchForm.querySelector('.search-box') : null;
     const enquireButton = document.getElementById('enquireButton');
     const enquiryForm = document.getElementById('enquiryForm');
-    const checkboxes = document.querySelectorAll('.item-checkbox');
-    
-    // Add event listener for type select
+    const resultsSection = document.getElementById('resultsSection');
+    const resultsBody = document.getElementById('resultsBody');
+    const resultsPager = document.getElementById('resultsPager');
+    const suggestionList = document.getElementById('searchSuggestions');
+    const facetPanel = document.getElementById('facetPanel');
+
+    // Live search settings
+    const SEARCH_DELAY_MS = 250;
+    const CACHE_SIZE = 50;
+    const SUGGEST_DELAY_MS = 100;
+
+    // Recent responses by query string: {etag, data}. A Map keeps insertion
+    // order, so re-inserting on use makes the first key the least recent
+    const recentResults = new Map();
+    let pendingTimer = null;
+    let inFlight = null;
+    const recentSuggestions = new Map();
+    let suggestTimer = null;
+    let suggestInFlight = null;
+
+    // Type changes and typing search in place instead of reloading the page
     if (typeSelect) {
         typeSelect.addEventListener('change', function() {
-            // Automatically submit form when type changes
-            searchForm.submit();
+            runSearch(null);
         });
     }
-    
-    // Add loading indicator to search button
-    const searchButton = document.querySelector('.search-button');
-    if (searchForm && searchButton) {
-        searchForm.addEventListener('submit', function() {
-            searchButton.textContent = 'Searching...';
-            searchButton.style.backgroundColor = '#999';
-            searchButton.disabled = true;
-            
-            // Reset button after short delay (in case of quick response)
-            setTimeout(function() {
-                searchButton.textContent = 'Search';
-                searchButton.style.backgroundColor = '';
-                searchButton.disabled = false;
-            }, 2000);
+
+    // Ticking a facet filter narrows the results straight away
+    if (facetPanel) {
+        facetPanel.addEventListener('change', function(event) {
+            if (event.target.type === 'checkbox') {
+                runSearch(null);
+            }
+        });
+    }
+
+    if (searchBox) {
+        searchBox.addEventListener('input', function() {
+            clearTimeout(pendingTimer);
+            pendingTimer = setTimeout(function() { runSearch(null); }, SEARCH_DELAY_MS);
+            clearTimeout(suggestTimer);
+            suggestTimer = setTimeout(runSuggest, SUGGEST_DELAY_MS);
+        });
+    }
+
+    // Pressing Enter or the Search button searches in place too; without JS
+    // (or if the API fails, see runSearch) the form still submits normally
+    if (searchForm) {
+        searchForm.addEventListener('submit', function(event) {
+            event.preventDefault();
+            runSearch(null);
+        });
+    }
+
+    // Pager links page through the API too; without JS they are plain links
+    if (resultsPager) {
+        resultsPager.addEventListener('click', function(event) {
+            const link = event.target.closest('a[data-cursor]');
+            if (link) {
+                event.preventDefault();
+                runSearch(link.dataset.cursor);
+            }
+        });
+        resultsPager.querySelectorAll('a.nav-button').forEach(function(link) {
+            const cursor = new URL(link.href).searchParams.get('cursor');
+            if (cursor) {
+                link.dataset.cursor = cursor;
+            }
+        });
+    }
+
+    // Build the query string for the current form state
+    function searchParams(cursor) {
+        const params = new URLSearchParams();
+        params.set('search', searchBox ? searchBox.value.trim() : '');
+        params.set('type', typeSelect ? typeSelect.value : '');
+        if (facetPanel) {
+            facetPanel.querySelectorAll('input[type="checkbox"]:checked').forEach(function(checkbox) {
+                params.append(checkbox.name, checkbox.value);
+            });
+        }
+        const limit = new URLSearchParams(window.location.search).get('limit');
+        if (limit) {
+            params.set('limit', limit);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return params;
+    }
+
+    function remember(cache, key, entry) {
+        cache.delete(key);
+        cache.set(key, entry);
+        if (cache.size > CACHE_SIZE) {
+            cache.delete(cache.keys().next().value);
+        }
+    }
+
+    // Fill the search box's datalist with completions for what has been typed
+    function runSuggest() {
+        if (!suggestionList) {
+            return;
+        }
+        const prefix = searchBox.value.trim();
+        if (!prefix) {
+            suggestionList.textContent = '';
+            return;
+        }
+        const cached = recentSuggestions.get(prefix.toLowerCase());
+        if (cached) {
+            renderSuggestions(cached);
+            return;
+        }
+        if (suggestInFlight) {
+            suggestInFlight.abort();
+        }
+        const controller = new AbortController();
+        suggestInFlight = controller;
+        fetch('/api/suggest?' + new URLSearchParams({q: prefix}).toString(), {
+            headers: {'Accept': 'application/json'},
+            signal: controller.signal,
+            credentials: 'same-origin'
+        }).then(function(response) {
+            if (!response.ok || response.redirected) {
+                return null;
+            }
+            return response.json();
+        }).then(function(data) {
+            if (data && suggestInFlight === controller) {
+                remember(recentSuggestions, prefix.toLowerCase(), data.suggestions);
+                renderSuggestions(data.suggestions);
+            }
+        }).catch(function() {
+            // Suggestions are optional; searching still works without them
+        }).finally(function() {
+            if (suggestInFlight === controller) {
+                suggestInFlight = null;
+            }
+        });
+    }
+
+    function renderSuggestions(suggestions) {
+        suggestionList.textContent = '';
+        suggestions.forEach(function(suggestion) {
+            const option = document.createElement('option');
+            option.value = suggestion.value;
+            option.label = suggestion.field + ' (' + suggestion.count + ')';
+            suggestionList.appendChild(option);
+        });
+    }
+
+    function runSearch(cursor) {
+        clearTimeout(pendingTimer);
+        const params = searchParams(cursor);
+        const query = params.toString();
+
+        // Only the latest query matters; drop any request still running
+        if (inFlight) {
+            inFlight.abort();
+        }
+        const controller = new AbortController();
+        inFlight = controller;
+
+        // Show a remembered result at once, then revalidate it with its ETag
+        const cached = recentResults.get(query);
+        const headers = {'Accept': 'application/json'};
+        if (cached) {
+            render(cached.data, params);
+            if (cached.etag) {
+                headers['If-None-Match'] = cached.etag;
+            }
+        }
+
+        fetch('/api/search?' + query, {
+            headers: headers,
+            signal: controller.signal,
+            credentials: 'same-origin',
+            cache: 'no-store'
+        }).then(function(response) {
+            if (response.status === 304 && cached) {
+                remember(recentResults, query, cached);
+                return null;
+            }
+            // A redirect means the session expired; let the page handle it
+            if (!response.ok || response.redirected) {
+                throw new Error('Search request failed');
+            }
+            const etag = response.headers.get('ETag');
+            return response.json().then(function(data) {
+                remember(recentResults, query, {etag: etag, data: data});
+                return data;
+            });
+        }).then(function(data) {
+            if (data && inFlight === controller) {
+                render(data, params);
+            }
+        }).catch(function(error) {
+            if (error.name !== 'AbortError' && searchForm) {
+                searchForm.submit();
+            }
+        }).finally(function() {
+            if (inFlight === controller) {
+                inFlight = null;
+            }
+        });
+    }
+
+    function render(data, params) {
+        // Keep the address bar in step so reload and bookmarks still work
+        window.history.replaceState(null, '', '?' + params.toString());
+
+        if (!resultsSection || !resultsBody) {
+            return;
+        }
+        resultsBody.textContent = '';
+        data.rows.forEach(function(row) {
+            const item = {};
+            data.columns.forEach(function(column, i) { item[column] = row[i]; });
+            resultsBody.appendChild(buildRow(item));
+        });
+        resultsSection.hidden = data.rows.length === 0;
+        renderPager(data, params);
+        renderFacets(data);
+        updateEnquireButton();
+    }
+
+    // Refresh the live counts in the type dropdown and the facet filters
+    function renderFacets(data) {
+        if (typeSelect && data.types) {
+            const selected = typeSelect.value;
+            while (typeSelect.options.length > 1) {
+                typeSelect.remove(1);
+            }
+            data.types.forEach(function(pair) {
+                const option = document.createElement('option');
+                option.value = pair[0];
+                option.textContent = pair[0] + ' (' + pair[1] + ')';
+                option.selected = pair[0] === selected;
+                typeSelect.appendChild(option);
+            });
+        }
+        if (!facetPanel || !data.facets) {
+            return;
+        }
+        facetPanel.textContent = '';
+        data.facets.forEach(function(facet) {
+            const fieldset = document.createElement('fieldset');
+            fieldset.className = 'facet-group';
+            const legend = document.createElement('legend');
+            legend.textContent = facet.label;
+            fieldset.appendChild(legend);
+            facet.options.forEach(function(option) {
+                const label = document.createElement('label');
+                label.className = 'facet-option';
+                const checkbox = document.createElement('input');
+                checkbox.type = 'checkbox';
+                checkbox.setAttribute('form', 'searchForm');
+                checkbox.name = facet.arg;
+                checkbox.value = option.value;
+                checkbox.checked = option.checked;
+                const count = document.createElement('span');
+                count.className = 'facet-count';
+                count.textContent = '(' + option.count + ')';
+                label.appendChild(checkbox);
+                label.appendChild(document.createTextNode(' ' + option.value + ' '));
+                label.appendChild(count);
+                fieldset.appendChild(label);
+            });
+            facetPanel.appendChild(fieldset);
+        });
+    }
+
+    function buildRow(item) {
+        const tr = document.createElement('tr');
+
+        const selectCell = document.createElement('td');
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.name = 'selected_items';
+        checkbox.value = item.Code;
+        checkbox.className = 'item-checkbox';
+        selectCell.appendChild(checkbox);
+        tr.appendChild(selectCell);
+
+        [item.Code, item.Description, item.Price, item.Type].forEach(function(value) {
+            const td = document.createElement('td');
+            td.textContent = value === null ? 'None' : value;
+            tr.appendChild(td);
+        });
+
+        const imageCell = document.createElement('td');
+        if (item.ImageUrl) {
+            const img = document.createElement('img');
+            img.src = item.ImageUrl;
+            img.alt = 'Product image';
+            img.className = 'product-image';
+            img.style.maxWidth = '50px';
+            img.style.maxHeight = '50px';
+            imageCell.appendChild(img);
+        } else {
+            const span = document.createElement('span');
+            span.textContent = 'No image';
+            imageCell.appendChild(span);
+        }
+        tr.appendChild(imageCell);
+        return tr;
+    }
+
+    function renderPager(data, params) {
+        if (!resultsPager) {
+            return;
+        }
+        resultsPager.textContent = '';
+        [['prev', '« Previous'], ['next', 'Next »']].forEach(function(pair) {
+            const cursor = data[pair[0]];
+            if (!cursor) {
+                return;
+            }
+            const linkParams = new URLSearchParams(params);
+            linkParams.set('cursor', cursor);
+            const link = document.createElement('a');
+            link.href = '?' + linkParams.toString();
+            link.className = 'nav-button';
+            link.dataset.cursor = cursor;
+            link.textContent = pair[1];
+            resultsPager.appendChild(link);
         });
     }
-    
-    // Handle checkboxes and enquire button
-    if (checkboxes.length > 0 && enquireButton) {
-        // Add event listeners to all checkboxes
-        checkboxes.forEach(function(checkbox) {
-            checkbox.addEventListener('change', updateEnquireButton);
+
+    // Handle checkboxes and enquire button; rows are replaced by live search,
+    // so listen on the table body rather than on each checkbox
+    if (resultsBody && enquireButton) {
+        resultsBody.addEventListener('change', function(event) {
+            if (event.target.classList.contains('item-checkbox')) {
+                updateEnquireButton();
+            }
         });
-        
+
         // Initial update of enquire button state
         updateEnquireButton();
-        
+
         // Handle enquire button click
         enquireButton.addEventListener('click', function() {
             if (hasCheckedItems()) {
@@ -49,14 +355,17 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
-    
+
     // Function to check if any items are checked
     function hasCheckedItems() {
-        return Array.from(checkboxes).some(checkbox => checkbox.checked);
+        return Array.from(document.querySelectorAll('.item-checkbox')).some(checkbox => checkbox.checked);
     }
-    
+
     // Function to update enquire button state
     function updateEnquireButton() {
+        if (!enquireButton) {
+            return;
+        }
         if (hasCheckedItems()) {
             enquireButton.disabled = false;
             enquireButton.classList.add('active');
@@ -65,4 +374,4 @@ document.addEventListener('DOMContentLoaded', function() {
             enquireButton.classList.remove('active');
         }
     }
-});
\ No newline at end of file
+});
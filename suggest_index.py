@@ -0,0 +1,235 @@
+import heapq
+import bisect
+import threading
+
+# (EquipmentItem attribute, column name reported to clients) offered as completions
+SUGGEST_FIELDS = (
+    ('Make', 'Make'),
+    ('Model', 'Model'),
+    ('Type', 'Category'),
+    ('Description', 'Category_Description'),
+)
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+# Prefixes whose results are kept between changes
+_RESULT_CACHE_SIZE = 4096
+
+# Prefixes up to this length are ranked eagerly after a rebuild; they span
+# the most values, so ranking them on demand would be the slowest lookups
+_WARM_PREFIX_LENGTH = 2
+
+#######################################################
+##### INDEX
+#######################################################
+
+class SuggestIndex:
+    """
+    Prefix completions over distinct field values, ranked by how many items
+    carry each value.
+
+    Values live in one sorted array of (folded value, column, value), so a
+    prefix is a bisect to the first match and a scan to the last. Counts are
+    kept per (column, value) and updated item by item. Ranked results are
+    cached per prefix and patched in place when a count changes, so a write
+    does not send the broad one- and two-letter prefixes back to a full scan.
+
+    Args:
+        fields (tuple): (attribute, column label) pairs to index
+    """
+
+    def __init__(self, fields=SUGGEST_FIELDS):
+        self.fields = fields
+        self._counts = {}   # (column, value) -> number of items
+        self._values = {}   # code -> (column, value) pairs it contributed
+        self._entries = []  # sorted (folded value, column, value)
+        self._results = {}  # folded prefix -> {limit: result}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _item_values(self, item):
+        values = []
+        for attr, column in self.fields:
+            value = getattr(item, attr, None)
+            if value is None:
+                continue
+            value = str(value).strip()
+            if value:
+                values.append((column, value))
+        return tuple(values)
+
+    def add(self, code, item):
+        """Count a record's values, replacing any previous version of it."""
+        values = self._item_values(item)
+        with self._lock:
+            if self._values.get(code) == values:
+                return
+            self._remove(code)
+            counts = self._counts
+            for key in values:
+                count = counts.get(key, 0)
+                if not count:
+                    bisect.insort(self._entries, (key[1].casefold(), key[0], key[1]))
+                counts[key] = count + 1
+                self._adjust(key, count + 1, dropped=False)
+            self._values[code] = values
+
+    def remove(self, code):
+        with self._lock:
+            self._remove(code)
+
+    def _remove(self, code):
+        values = self._values.pop(code, None)
+        if values is None:
+            return
+        counts = self._counts
+        for key in values:
+            count = counts[key] - 1
+            if count:
+                counts[key] = count
+            else:
+                del counts[key]
+                entry = (key[1].casefold(), key[0], key[1])
+                entries = self._entries
+                del entries[bisect.bisect_left(entries, entry)]
+            self._adjust(key, count, dropped=True)
+
+    def _adjust(self, key, count, dropped):
+        """Patch the cached results of every prefix of a value whose count changed."""
+        folded = key[1].casefold()
+        results = self._results
+        for end in range(1, len(folded) + 1):
+            cached = results.get(folded[:end])
+            if cached is None:
+                continue
+            for limit, result in list(cached.items()):
+                result = _adjust_top(result, limit, key, count, dropped)
+                if result is None:
+                    del cached[limit]
+                else:
+                    cached[limit] = result
+
+    def rebuild(self, rows):
+        """Replace the whole index with the given (code, record) pairs."""
+        counts = {}
+        values = {}
+        for code, item in rows:
+            item_values = values[code] = self._item_values(item)
+            for key in item_values:
+                counts[key] = counts.get(key, 0) + 1
+        entries = sorted((value.casefold(), column, value) for column, value in counts)
+        results = {}
+        for length in range(1, _WARM_PREFIX_LENGTH + 1):
+            results.update(_rank_by_prefix(entries, counts, length, DEFAULT_SUGGESTIONS))
+        with self._lock:
+            self._counts = counts
+            self._values = values
+            self._entries = entries
+            self._results = results
+
+    def suggest(self, prefix, limit=DEFAULT_SUGGESTIONS):
+        """
+        Most common values starting with prefix (case-insensitive).
+
+        Returns:
+            list: (column, value, count) tuples, most frequent first, ties by value
+        """
+        folded = prefix.strip().casefold()
+        if not folded:
+            return []
+        with self._lock:
+            cached = self._results.get(folded)
+            if cached is not None and limit in cached:
+                return cached[limit]
+            entries = self._entries
+            start = bisect.bisect_left(entries, (folded,))
+            end = bisect.bisect_left(entries, (folded + '\U0010ffff',), start)
+            result = _top(entries[start:end], self._counts, limit)
+            if cached is None:
+                if len(self._results) >= _RESULT_CACHE_SIZE:
+                    self._results = {}
+                cached = self._results[folded] = {}
+            cached[limit] = result
+            return result
+
+
+def _top(entries, counts, limit):
+    best = heapq.nsmallest(
+        limit, entries,
+        key=lambda entry: (-counts[entry[1], entry[2]], entry[0], entry[1]),
+    )
+    return [(column, value, counts[column, value]) for _, column, value in best]
+
+def _rank(suggestion):
+    column, value, count = suggestion
+    return -count, value.casefold(), column
+
+def _adjust_top(result, limit, key, count, dropped):
+    """
+    A ranked result with one value's count changed, or None if it has to be
+    ranked again from the array.
+
+    Every other count is unchanged, so a rising value only competes with the
+    listed ones, and unlisted values all rank below the last listed one. A
+    falling value that still ranks above that last entry keeps its place;
+    otherwise only a fresh scan can tell what replaces it.
+    """
+    rest = [suggestion for suggestion in result if suggestion[:2] != key]
+    listed = len(rest) < len(result)
+    if dropped:
+        if not listed:
+            return result
+        if len(result) == limit and (result[-1][:2] == key or not count or
+                                     _rank((key[0], key[1], count)) > _rank(result[-1])):
+            return None
+    if count:
+        rest.append((key[0], key[1], count))
+        rest.sort(key=_rank)
+    return rest[:limit]
+
+def _rank_by_prefix(entries, counts, length, limit):
+    """Cache entries for every prefix of the given length, from one pass."""
+    results = {}
+    start = 0
+    while start < len(entries):
+        prefix = entries[start][0][:length]
+        end = bisect.bisect_left(entries, (prefix + '\U0010ffff',), start)
+        if len(prefix) == length:
+            results[prefix] = {limit: _top(entries[start:end], counts, limit)}
+        start = end
+    return results
+
+#######################################################
+##### PROCESS-WIDE INDEX
+#######################################################
+
+suggest_index = SuggestIndex()
+
+def _sync_with_snapshot(snapshot, changed_codes):
+    """inventory_cache listener: rebuild fully or recount changed records."""
+    if changed_codes is None:
+        suggest_index.rebuild(snapshot.by_code.items())
+        return
+    for code in changed_codes:
+        item = snapshot.by_code.get(code)
+        if item is None:
+            suggest_index.remove(code)
+        else:
+            suggest_index.add(code, item)
+
+_registered = False
+_register_lock = threading.Lock()
+
+def get_suggest_index():
+    """Return the index, hooking it up to the inventory snapshot on first use."""
+    global _registered
+    if not _registered:
+        with _register_lock:
+            if not _registered:
+                from inventory_cache import add_listener
+                add_listener(_sync_with_snapshot)
+                _registered = True
+    return suggest_index
@@ -0,0 +1,448 @@
+"""
+Seeded synthetic equipment_inventory data for scaling tests.
+
+Rows are generated a chunk at a time with vectorised NumPy, so millions
+of rows stream to a CSV file or straight into the database in bounded
+memory. The same seed and chunk size always give the same rows.
+
+    python synthetic_inventory.py csv 1000000 data/synthetic.csv
+    python synthetic_inventory.py csv 200 data/stock_like.csv --layout stock
+    python synthetic_inventory.py load 100000 --start-code 100000
+    python synthetic_inventory.py images 1000000 data/image_manifest.json
+"""
+import csv
+import sys
+import time
+
+import numpy as np
+
+from models import EQUIPMENT_COLUMNS
+from image_manifest import IMAGE_PREFIX
+
+DEFAULT_SEED = 0
+DEFAULT_CHUNK_ROWS = 100000
+DEFAULT_LOAD_BATCH = 5000
+
+#######################################################
+##### VOCABULARY
+#######################################################
+
+# Category -> Sub_Category -> qualifiers; the description is "<qualifier> <sub category>",
+# the way data/Stock.csv names items ("Ball Valve", "Pipe Wrench")
+CATEGORY_TREE = {
+    'Mechanical': {
+        'Valve': ('Ball', 'Gate', 'Butterfly', 'Solenoid', 'Needle', 'Globe', 'Relief'),
+        'Check': ('Swing', 'Piston', 'Dual Plate', 'Lift'),
+        'Pipe': ('Copper', 'Steel', 'PVC', 'Stainless'),
+        'Pump': ('Hydraulic', 'Centrifugal', 'Diaphragm', 'Gear'),
+        'Regulator': ('Pressure', 'Flow'),
+        'Meter': ('Flow', 'Pressure'),
+        'Cylinder': ('Hydraulic', 'Pneumatic'),
+        'Bearing': ('Ball', 'Roller', 'Thrust'),
+        'Seal': ('Shaft', 'O-Ring', 'Lip'),
+        'Actuator': ('Electric', 'Pneumatic', 'Hydraulic'),
+    },
+    'Electrical': {
+        'Cable': ('Armoured', 'Flexible', 'Data', 'Power'),
+        'Wire': ('Copper', 'Earth', 'Tinned'),
+        'Breaker': ('Circuit', 'Miniature Circuit', 'Residual Current'),
+        'Motor': ('AC', 'DC', 'Stepper', 'Servo'),
+        'Meter': ('Digital', 'Clamp', 'Insulation'),
+        'Transformer': ('Step Down', 'Isolation', 'Current'),
+        'Connector': ('Cable', 'Terminal', 'Crimp'),
+        'Lamp': ('LED', 'Halogen', 'Inspection'),
+        'Supply': ('Power', 'Bench'),
+        'Panel': ('Control', 'Distribution'),
+    },
+    'Tools': {
+        'Drill': ('Cordless', 'Power', 'Hammer', 'Pillar'),
+        'Wrench': ('Pipe', 'Socket', 'Torque', 'Adjustable'),
+        'Screwdriver': ('Flat', 'Phillips', 'Insulated'),
+        'Saw': ('Hack', 'Circular', 'Reciprocating'),
+        'Grinder': ('Angle', 'Bench', 'Die'),
+        'Cutter': ('Bolt', 'Pipe', 'Cable'),
+        'Set': ('Socket', 'Screwdriver', 'Spanner'),
+        'Level': ('Laser', 'Spirit'),
+        'Knife': ('Utility', 'Cable'),
+        'Measure': ('Tape', 'Laser'),
+    },
+    'Safety': {
+        'Gloves': ('Safety', 'Insulated', 'Cut Resistant'),
+        'Mask': ('Welding', 'Dust', 'Respirator'),
+        'Harness': ('Fall Arrest', 'Rescue'),
+        'Helmet': ('Safety', 'Climbing'),
+        'Goggles': ('Safety', 'Welding'),
+    },
+}
+
+# Share of the catalogue in each category (renormalised over CATEGORY_TREE)
+CATEGORY_WEIGHTS = {'Mechanical': 0.4, 'Electrical': 0.3, 'Tools': 0.22, 'Safety': 0.08}
+
+# Median price per category; each sub category and item spreads around it log-normally
+PRICE_MEDIANS = {'Mechanical': 250.0, 'Electrical': 120.0, 'Tools': 80.0, 'Safety': 35.0}
+
+# Units used in the free-text specification, per category
+SPEC_UNITS = {
+    'Mechanical': ('bar', 'mm', 'PSI', 'DN'),
+    'Electrical': ('V', 'A', 'W', 'mm2'),
+    'Tools': ('mm', 'V', 'Nm', 'kg'),
+    'Safety': ('EN', 'size'),
+}
+SPEC_MATERIALS = ('stainless steel', 'brass', 'cast iron', 'copper', 'PVC', 'aluminium',
+                  'carbon steel', 'nylon', 'rubber')
+SPEC_NOTES = ('', '', 'heavy duty', 'compact', 'IP67 rated', 'for outdoor use',
+              'quick release', 'low maintenance', 'ATEX zone 1', 'self-aligning')
+
+CERTIFICATIONS = ('CE', 'UKCA', 'ATEX', 'ISO 9001', 'WRAS')
+CERTIFICATION_SHARE = 0.7
+
+LOCATIONS = ('Leeds', 'Sheffield', 'Hull', 'York', 'Bradford', 'Doncaster', 'Wakefield',
+             'Middlesbrough')
+LOCATION_WEIGHTS = (0.3, 0.2, 0.12, 0.1, 0.1, 0.08, 0.06, 0.04)
+
+# Makes are ranked and drawn with probability proportional to 1 / rank ** exponent
+MAKE_COUNT = 2000
+ZIPF_EXPONENT = 1.1
+
+_SYLLABLES = ('ar', 'bel', 'cor', 'dan', 'ek', 'fal', 'gor', 'hal', 'in', 'jor', 'kel', 'lum',
+              'mar', 'nor', 'os', 'pra', 'quin', 'ros', 'sta', 'tor', 'ul', 'vex', 'wen',
+              'xer', 'yor', 'zan')
+_MAKE_SUFFIXES = ('', '', '', ' Industrial', ' Engineering', ' Tools', ' Controls', ' Ltd')
+
+# Rows without a price, and items with images (1 to MAX_IMAGES each)
+MISSING_PRICE_SHARE = 0.02
+IMAGE_SHARE = 0.6
+MAX_IMAGES = 4
+
+_MATERIALS = np.array(SPEC_MATERIALS)
+_NOTES = np.array(SPEC_NOTES)
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    """Normalised probabilities 1/rank**exponent for ranks 1..count."""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+def make_names(count, rng):
+    """count distinct manufacturer names built from syllables, in rank order."""
+    names = []
+    seen = set()
+    while len(names) < count:
+        parts = rng.integers(0, len(_SYLLABLES), size=(count, 3))
+        lengths = rng.integers(2, 4, size=count)
+        suffixes = rng.integers(0, len(_MAKE_SUFFIXES), size=count)
+        for row, length, suffix in zip(parts, lengths, suffixes):
+            name = ''.join(_SYLLABLES[i] for i in row[:length]).capitalize() + _MAKE_SUFFIXES[suffix]
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+                if len(names) == count:
+                    break
+    return np.array(names, dtype=object)
+
+#######################################################
+##### GENERATOR
+#######################################################
+
+class InventoryGenerator:
+    """
+    Produces equipment_inventory rows as column arrays.
+
+    Everything drawn once per catalogue (make names, the weight of each
+    leaf of the category tree, per-leaf price levels) comes from the seed;
+    chunk i then draws from its own generator seeded with (seed, i), so any
+    chunk can be produced on its own and the output does not depend on how
+    many chunks were generated before it.
+
+    Args:
+        seed (int): Reproducibility seed
+        makes (int): Number of distinct makes
+        zipf_exponent (float): Skew of the make distribution
+        start_code (int): Item_Code of the first row
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, makes=MAKE_COUNT, zipf_exponent=ZIPF_EXPONENT,
+                 start_code=1):
+        self.seed = seed
+        self.start_code = start_code
+        rng = np.random.default_rng([seed, 0xCA7])
+
+        leaves = [(category, sub, qualifier)
+                  for category, subs in CATEGORY_TREE.items()
+                  for sub, qualifiers in subs.items()
+                  for qualifier in qualifiers]
+        self.leaf_category = np.array([leaf[0] for leaf in leaves], dtype=object)
+        self.leaf_sub = np.array([leaf[1] for leaf in leaves], dtype=object)
+        self.leaf_description = np.array([f"{leaf[2]} {leaf[1]}" for leaf in leaves], dtype=object)
+        # Within a category some items are far more common than others
+        weights = np.array([CATEGORY_WEIGHTS[leaf[0]] for leaf in leaves])
+        weights *= rng.lognormal(0.0, 0.75, size=len(leaves))
+        for category in CATEGORY_TREE:
+            in_category = self.leaf_category == category
+            weights[in_category] *= CATEGORY_WEIGHTS[category] / weights[in_category].sum()
+        self.leaf_weights = weights / weights.sum()
+        self.leaf_price = (np.array([PRICE_MEDIANS[leaf[0]] for leaf in leaves])
+                           * rng.lognormal(0.0, 0.8, size=len(leaves)))
+
+        self.leaf_units = np.array([SPEC_UNITS[leaf[0]][i % len(SPEC_UNITS[leaf[0]])]
+                                    for i, leaf in enumerate(leaves)])
+
+        self.makes = make_names(makes, rng)
+        self.make_weights = zipf_weights(makes, zipf_exponent)
+        self.make_prefixes = np.array([name[:3].upper() for name in self.makes])
+
+    def chunk(self, index, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        Rows index * chunk_rows onwards (at most rows of them) as a dict of
+        column name -> array, in equipment_inventory column order. Missing
+        values are None.
+        """
+        rng = np.random.default_rng([self.seed, index + 1])
+        first = self.start_code + index * chunk_rows
+        codes = np.arange(first, first + rows, dtype=np.int64)
+
+        leaf = rng.choice(len(self.leaf_weights), size=rows, p=self.leaf_weights)
+        make = rng.choice(len(self.makes), size=rows, p=self.make_weights)
+
+        # Fixed-width string arrays, so the concatenations run in C
+        model = np.char.add(np.char.add(self.make_prefixes[make], '-'),
+                            rng.integers(100, 10000, size=rows).astype('U4'))
+        spec = np.char.add(np.char.add(rng.integers(1, 400, size=rows).astype('U3'), ' '),
+                           self.leaf_units[leaf])
+        spec = np.char.add(np.char.add(spec, ', '),
+                           _MATERIALS[rng.integers(0, len(_MATERIALS), rows)])
+        note = _NOTES[rng.integers(0, len(_NOTES), rows)]
+        spec = np.where(note != '', np.char.add(np.char.add(spec, ', '), note), spec)
+
+        certification = np.array(CERTIFICATIONS, dtype=object)[
+            rng.integers(0, len(CERTIFICATIONS), rows)]
+        certification[rng.random(rows) >= CERTIFICATION_SHARE] = None
+
+        location = np.array(LOCATIONS, dtype=object)[
+            rng.choice(len(LOCATIONS), size=rows, p=np.array(LOCATION_WEIGHTS) / sum(LOCATION_WEIGHTS))]
+
+        price = np.round(self.leaf_price[leaf] * rng.lognormal(0.0, 0.35, size=rows), 2)
+        price = price.astype(object)
+        price[rng.random(rows) < MISSING_PRICE_SHARE] = None
+
+        return {
+            'Item_Code': codes,
+            'Category': self.leaf_category[leaf],
+            'Sub_Category': self.leaf_sub[leaf],
+            'Category_Description': self.leaf_description[leaf],
+            'Make': self.makes[make],
+            'Model': model,
+            'Certification': certification,
+            'Specification': spec,
+            'Location': location,
+            'Price': price,
+        }
+
+    def iter_chunks(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Yield column dicts covering rows rows in total."""
+        for index, start in enumerate(range(0, rows, chunk_rows)):
+            yield self.chunk(index, min(chunk_rows, rows - start), chunk_rows)
+
+    def iter_rows(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Yield one tuple per row, in equipment_inventory column order."""
+        for columns in self.iter_chunks(rows, chunk_rows):
+            yield from zip(*(column.tolist() for column in columns.values()))
+
+    def image_keys(self, codes):
+        """
+        Fake S3 keys for a share of the given item codes: 1 to MAX_IMAGES
+        images under engineer-inventory/product_id/<code>/.
+
+        Returns:
+            dict: str(code) -> list of keys, in the layout ImageManifest saves
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        rng = np.random.default_rng([self.seed, 0x1A6E5, int(codes[0]) if len(codes) else 0])
+        with_images = codes[rng.random(len(codes)) < IMAGE_SHARE]
+        counts = rng.integers(1, MAX_IMAGES + 1, size=len(with_images))
+        return {str(code): [f"{IMAGE_PREFIX}{code}/image_{n}.jpg" for n in range(count)]
+                for code, count in zip(with_images.tolist(), counts.tolist())}
+
+#######################################################
+##### OUTPUT
+#######################################################
+
+# data/Stock.csv layout: the description repeats the item name, its parts and category
+STOCK_HEADERS = ['Unique Code Identifier', 'Description', 'Quantity', 'Type']
+
+def _stock_columns(columns, rng):
+    description = columns['Category_Description']
+    qualifier = np.array([text.rsplit(' ', 1)[0] for text in description.tolist()], dtype=object)
+    full = (description + ', ' + columns['Sub_Category'] + ', ' + qualifier + ', '
+            + columns['Category'])
+    quantity = np.minimum(rng.geometric(0.01, size=len(description)), 5000)
+    return [columns['Item_Code'], full, quantity, columns['Category']]
+
+def _csv_chunk(task):
+    """CSV text for one chunk; runs in a worker process when writing in parallel."""
+    import io
+    generator, index, rows, chunk_rows, layout = task
+    columns = generator.chunk(index, rows, chunk_rows)
+    if layout == 'stock':
+        values = _stock_columns(columns, np.random.default_rng([generator.seed, 0x570C, index]))
+    else:
+        values = list(columns.values())
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(zip(*(column.tolist() for column in values)))
+    return buffer.getvalue()
+
+def write_csv(path, rows, generator=None, chunk_rows=DEFAULT_CHUNK_ROWS, layout='table',
+              workers=None):
+    """
+    Write rows synthetic items to a CSV file.
+
+    Chunks are independent, so with several workers they are generated and
+    formatted in parallel processes and written in order; at most two
+    chunks per worker are held in memory at once.
+
+    Args:
+        path (str): Output file
+        rows (int): Number of items
+        generator (InventoryGenerator): Source of rows (default: seed 0)
+        layout (str): 'table' for equipment_inventory columns (what export.py
+            writes and bulk_import.py reads), 'stock' for the data/Stock.csv layout
+        workers (int): Worker processes (default: CPU count; 1 runs in-process)
+
+    Returns:
+        float: Seconds taken
+    """
+    import os
+    generator = generator or InventoryGenerator()
+    workers = workers or os.cpu_count() or 1
+    tasks = [(generator, index, min(chunk_rows, rows - start), chunk_rows, layout)
+             for index, start in enumerate(range(0, rows, chunk_rows))]
+    started = time.perf_counter()
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerow(STOCK_HEADERS if layout == 'stock'
+                               else [column for column, _ in EQUIPMENT_COLUMNS])
+        if workers == 1 or len(tasks) == 1:
+            for task in tasks:
+                f.write(_csv_chunk(task))
+        else:
+            from collections import deque
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(workers) as executor:
+                pending = deque()
+                for task in tasks:
+                    pending.append(executor.submit(_csv_chunk, task))
+                    if len(pending) >= workers * 2:
+                        f.write(pending.popleft().result())
+                while pending:
+                    f.write(pending.popleft().result())
+    return time.perf_counter() - started
+
+def write_image_manifest(path, rows, generator=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write fake image keys for the first rows items as an ImageManifest file,
+    usable as IMAGE_MANIFEST_PATH or to seed an S3 stub.
+
+    Returns:
+        int: Number of items given images
+    """
+    import json
+    generator = generator or InventoryGenerator()
+    keys = {}
+    for start in range(0, rows, chunk_rows):
+        first = generator.start_code + start
+        keys.update(generator.image_keys(np.arange(first, first + min(chunk_rows, rows - start))))
+    with open(path, 'w') as f:
+        json.dump({'built_at': time.time(), 'prefix': IMAGE_PREFIX, 'keys': keys}, f)
+    return len(keys)
+
+def load(connect, rows, generator=None, batch_rows=DEFAULT_LOAD_BATCH, chunk_rows=DEFAULT_CHUNK_ROWS,
+         progress=None):
+    """
+    Insert rows synthetic items straight into equipment_inventory with one
+    executemany (a multi-row INSERT under PyMySQL) per batch, committing
+    after each batch.
+
+    Args:
+        connect (callable): Returns a DB connection or None
+        progress (callable): Optional progress(rows_loaded, seconds)
+
+    Returns:
+        int: Rows inserted
+    """
+    generator = generator or InventoryGenerator()
+    columns = [column for column, _ in EQUIPMENT_COLUMNS]
+    sql = (f"INSERT INTO equipment_inventory ({', '.join(columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    conn = connect()
+    if not conn:
+        raise RuntimeError("Failed to connect to database")
+    loaded = 0
+    started = time.perf_counter()
+    batch = []
+    try:
+        with conn.cursor() as cursor:
+            for row in generator.iter_rows(rows, chunk_rows):
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    cursor.executemany(sql, batch)
+                    conn.commit()
+                    loaded += len(batch)
+                    batch = []
+                    if progress:
+                        progress(loaded, time.perf_counter() - started)
+            if batch:
+                cursor.executemany(sql, batch)
+                conn.commit()
+                loaded += len(batch)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return loaded
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate synthetic equipment_inventory data")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--makes', type=int, default=MAKE_COUNT)
+    parser.add_argument('--zipf', type=float, default=ZIPF_EXPONENT, help="Make distribution exponent")
+    parser.add_argument('--start-code', type=int, default=1)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    csv_parser = commands.add_parser('csv', help="Write a CSV file")
+    csv_parser.add_argument('rows', type=int)
+    csv_parser.add_argument('path')
+    csv_parser.add_argument('--layout', choices=['table', 'stock'], default='table')
+    csv_parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+
+    load_parser = commands.add_parser('load', help="Insert into the configured database")
+    load_parser.add_argument('rows', type=int)
+    load_parser.add_argument('--batch-rows', type=int, default=DEFAULT_LOAD_BATCH)
+
+    images_parser = commands.add_parser('images', help="Write a fake image manifest")
+    images_parser.add_argument('rows', type=int)
+    images_parser.add_argument('path')
+
+    args = parser.parse_args()
+    generator = InventoryGenerator(args.seed, args.makes, args.zipf, args.start_code)
+
+    if args.command == 'csv':
+        seconds = write_csv(args.path, args.rows, generator, args.chunk_rows, args.layout,
+                            args.workers)
+        print(f"Wrote {args.rows} rows to {args.path} in {seconds:.1f}s "
+              f"({args.rows / seconds:.0f} rows/s)")
+    elif args.command == 'load':
+        from db_equipment_inventory import connect_to_db
+
+        def show_progress(loaded, seconds):
+            print(f"{loaded} rows, {loaded / seconds:.0f} rows/s", file=sys.stderr)
+
+        started = time.perf_counter()
+        loaded = load(connect_to_db, args.rows, generator, args.batch_rows, args.chunk_rows,
+                      show_progress)
+        print(f"Loaded {loaded} rows in {time.perf_counter() - started:.1f}s")
+    else:
+        count = write_image_manifest(args.path, args.rows, generator, args.chunk_rows)
+        print(f"Wrote images for {count} of {args.rows} items to {args.path}")
@@ -0,0 +1,147 @@
+"""
+Start-up work for gunicorn workers (see gunicorn.conf.py): code imported
+once in the master before forking, per-process state rebuilt after the
+fork, and cache warm-up before a worker accepts traffic.
+
+    python warmup.py    # time the preload and warm-up in a fresh process
+"""
+import time
+import importlib
+
+#######################################################
+##### MASTER: BEFORE FORKING
+#######################################################
+
+# Imported in the master so workers share the code copy-on-write. None of
+# these open sockets or start threads at import time, so forking after
+# them is safe. pandas stays out: it is only used for offline analytics.
+PRELOAD_MODULES = ('pymysql', 'boto3', 'db_pool', 'db_router', 'catalogue_repository',
+                   'db_equipment_inventory', 'db_products', 'catalogue_replica',
+                   'inventory_cache', 'search_index', 'facet_index', 'suggest_index',
+                   'image_manifest', 's3_utils', 'export', 'bulk_import', 'app')
+
+def preload():
+    """
+    Import PRELOAD_MODULES and compile every template.
+
+    Returns:
+        float: Milliseconds taken
+    """
+    started = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    from app import app
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return round((time.perf_counter() - started) * 1000, 1)
+
+#######################################################
+##### WORKER: AFTER FORKING
+#######################################################
+
+def reinit_after_fork():
+    """
+    Drop connections and clients inherited from the master. Sockets are
+    abandoned, not closed, so the master's connections are left alone.
+    The pools and S3 client also check the pid on use; this makes the
+    reset explicit and immediate.
+    """
+    from db_pool import reset_pools
+    from s3_utils import reset_s3_client
+    reset_pools()
+    reset_s3_client()
+
+def _warm_database():
+    # One pooled connection, so the first request skips the TCP/auth handshake
+    from db_equipment_inventory import connect_to_db
+    conn = connect_to_db()
+    if conn:
+        conn.close()
+
+def _warm_inventory():
+    from inventory_cache import get_snapshot
+    get_snapshot()
+
+def _warm_indexes():
+    # Each derived index is built from the snapshot when first fetched
+    from search_index import get_search_index
+    from facet_index import get_facet_index
+    from suggest_index import get_suggest_index
+    get_search_index()
+    get_facet_index()
+    get_suggest_index()
+
+def _warm_s3():
+    from s3_utils import get_s3_client
+    get_s3_client()
+
+def _warm_images(wait):
+    """
+    Wait (up to wait seconds) for the image manifest, or with the manifest
+    disabled, fill the URL cache for the first page of every category.
+    """
+    from image_manifest import get_manifest
+    manifest = get_manifest()
+    if manifest is not None:
+        deadline = time.time() + wait
+        while not manifest.ready and time.time() < deadline:
+            time.sleep(0.05)
+        return
+    from inventory_cache import get_facet_counts, search_products_page
+    from s3_utils import get_product_image_urls
+    for category, _ in get_facet_counts().get('Category', []):
+        page = search_products_page(category=category)
+        get_product_image_urls(item.Code for item in page.items)
+
+def _warm_replica():
+    from catalogue_replica import get_catalogue_replica
+    replica = get_catalogue_replica()
+    if replica is not None:
+        replica.ready  # opens this thread's connection and starts the syncer
+
+def warm_caches(notify=None, image_wait=None):
+    """
+    Do the work a worker's first requests would otherwise pay for: a
+    database connection, the inventory snapshot and its search, facet and
+    suggest indexes, the S3 client and the image URLs.
+
+    A step that fails is reported and skipped; the worker still serves,
+    just with that cache cold.
+
+    Args:
+        notify (callable): Called after each step (gunicorn's worker.notify,
+            so a long warm-up is not mistaken for a hung worker)
+        image_wait (float): Seconds to wait for the image manifest
+            (default WARMUP_IMAGE_WAIT, or 10)
+
+    Returns:
+        dict: Step name -> milliseconds taken
+    """
+    if image_wait is None:
+        from env_cred import warmup_image_wait
+        image_wait = float(warmup_image_wait) if warmup_image_wait else 10.0
+    steps = [
+        ('database', _warm_database),
+        ('inventory', _warm_inventory),
+        ('indexes', _warm_indexes),
+        ('s3', _warm_s3),
+        ('images', lambda: _warm_images(image_wait)),
+        ('replica', _warm_replica),
+    ]
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Error warming {name}: {e}")
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        if notify is not None:
+            notify()
+    return timings
+
+
+# Run directly to time the preload and warm-up against the configured services
+if __name__ == "__main__":
+    print(f"preload: {preload()} ms")
+    print(f"warm-up: {warm_caches()}")